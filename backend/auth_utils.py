@@ -5,44 +5,254 @@ import secrets
 import json
 import hashlib
 import base64
+import hmac
+import struct
+import time
+from functools import lru_cache
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
 import pyotp
-import qrcode
 from io import BytesIO
 import redis.asyncio as redis
+from redis.asyncio.cluster import RedisCluster
+from redis.exceptions import RedisError
 from jose import JWTError, jwt
 from fastapi import HTTPException, status
-from email_validator import validate_email, EmailNotValidError
 from database import settings
+from metrics import registry, password_hash_duration, jwt_duration, redis_command_duration
+from redis_resilience import BREAKER_ERRORS, CircuitBreaker, LocalTTLStore, redis_fallbacks
+from memory_redis import MemoryRedis
+from qr_service import render_qr
+
+
+@lru_cache(maxsize=None)
+def get_password_hasher() -> PasswordHasher:
+    """Password hashing with Argon2 (built on first use)"""
+    return PasswordHasher(
+        time_cost=2,  # Number of iterations
+        memory_cost=65536,  # Memory usage in KiB
+        parallelism=1,  # Number of parallel threads
+        hash_len=32,  # Hash length
+        salt_len=16  # Salt length
+    )
+
+
+# Hash formats accepted from imports; anything but current Argon2 is rehashed on next login
+ARGON2_PREFIXES = ("$argon2id$", "$argon2i$")
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+redis_breaker = CircuitBreaker(
+    failure_threshold=settings.redis_breaker_failures,
+    reset_timeout=settings.redis_breaker_reset_seconds
+)
+
+# Per-process stand-in used while Redis is unreachable
+local_store = LocalTTLStore()
 
-# Password hashing with Argon2
-ph = PasswordHasher(
-    time_cost=2,  # Number of iterations
-    memory_cost=65536,  # Memory usage in KiB
-    parallelism=1,  # Number of parallel threads
-    hash_len=32,  # Hash length
-    salt_len=16  # Salt length
+session_migrations = registry.counter(
+    "session_legacy_migrations_total", "Legacy JSON sessions rewritten in the compact format"
 )
 
+
+class _InstrumentedCommands:
+    """Records per-command latency and feeds the circuit breaker"""
+
+    async def execute_command(self, *args, **options):
+        redis_breaker.before_call()
+        start = time.perf_counter()
+        try:
+            result = await super().execute_command(*args, **options)
+        except BREAKER_ERRORS:
+            redis_breaker.on_failure()
+            raise
+        except Exception:
+            # Redis answered, just not with what we wanted
+            redis_breaker.on_success()
+            raise
+        finally:
+            redis_command_duration.observe(time.perf_counter() - start, command=str(args[0]).upper())
+        redis_breaker.on_success()
+        return result
+
+
+class InstrumentedRedis(_InstrumentedCommands, redis.Redis):
+    pass
+
+
+class InstrumentedRedisCluster(_InstrumentedCommands, RedisCluster):
+    pass
+
+
+class InstrumentedMemoryRedis(_InstrumentedCommands, MemoryRedis):
+    pass
+
+
+def create_redis_client():
+    """Build the Redis client described by settings (single node, cluster or in-process memory://)"""
+    if settings.redis_url.startswith("memory://"):
+        return InstrumentedMemoryRedis.from_url(settings.redis_url)
+    options = {
+        "decode_responses": True,
+        "socket_timeout": settings.redis_socket_timeout,
+        "socket_connect_timeout": settings.redis_connect_timeout
+    }
+    if settings.redis_cluster:
+        return InstrumentedRedisCluster.from_url(settings.redis_url, **options)
+    return InstrumentedRedis.from_url(settings.redis_url, **options)
+
+
+async def execute_pipeline(pipe) -> list:
+    """Run a non-transactional pipeline (one round trip per node) through the breaker"""
+    redis_breaker.before_call()
+    start = time.perf_counter()
+    try:
+        result = await pipe.execute()
+    except BREAKER_ERRORS:
+        redis_breaker.on_failure()
+        raise
+    except Exception:
+        redis_breaker.on_success()
+        raise
+    finally:
+        redis_command_duration.observe(time.perf_counter() - start, command="PIPELINE")
+    redis_breaker.on_success()
+    return result
+
+
+class RedisKeys:
+    """
+    Key naming. The part in {braces} is the Redis Cluster hash tag, so keys
+    sharing it land in the same slot; all of a user's session keys share one.
+    """
+
+    @staticmethod
+    def user_tag(user_id: str) -> str:
+        # Keyed so tags cannot be mapped back to user ids; 64 bits keeps collisions rare
+        return hashlib.blake2s(
+            str(user_id).encode(), key=settings.secret_key.encode()[:32], digest_size=8
+        ).hexdigest()
+
+    @staticmethod
+    def rate_limit(identifier: str) -> str:
+        return f"rate_limit:{{{identifier}}}"
+
+    @staticmethod
+    def session(session_id: str) -> str:
+        if "." not in session_id:
+            # Legacy untagged session id
+            return f"session:{session_id}"
+        tag, token = session_id.split(".", 1)
+        return f"session:{{{tag}}}:{token}"
+
+    @staticmethod
+    def user_sessions(tag: str) -> str:
+        return f"user_sessions:{{{tag}}}"
+
+    @staticmethod
+    def totp_pending(user_id: str) -> str:
+        return f"totp_pending:{{{RedisKeys.user_tag(user_id)}}}:{user_id}"
+
+    @staticmethod
+    def totp_used(user_id: str, timestep: int) -> str:
+        return f"totp_used:{{{RedisKeys.user_tag(user_id)}}}:{timestep}"
+
+    @staticmethod
+    def idempotency(fingerprint: str) -> str:
+        return f"idempotency:{{{fingerprint}}}"
+
+    # Brute-force detector: all keys of one subject (an email or an IP) share a slot
+
+    @staticmethod
+    def bf_failures(subject: str, bucket: int) -> str:
+        return f"bf_failures:{{{subject}}}:{bucket}"
+
+    @staticmethod
+    def bf_distinct(subject: str, bucket: int) -> str:
+        return f"bf_distinct:{{{subject}}}:{bucket}"
+
+    @staticmethod
+    def bf_decision(subject: str) -> str:
+        return f"bf_decision:{{{subject}}}"
+
+    @staticmethod
+    def bf_challenge_used(subject: str, nonce: str) -> str:
+        return f"bf_challenge_used:{{{subject}}}:{nonce}"
+
+    # Account lockout: the failure streak and the lockout window share the email's slot
+
+    @staticmethod
+    def lockout_failures(subject: str) -> str:
+        return f"lockout_failures:{{{subject}}}"
+
+    @staticmethod
+    def lockout(subject: str) -> str:
+        return f"lockout:{{{subject}}}"
+
+
+_redis = None
+
+
+def get_redis_client():
+    """Return the process-wide Redis client, creating it on first call"""
+    global _redis
+    if _redis is None:
+        _redis = create_redis_client()
+    return _redis
+
+
+async def close_redis_client() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.close()
+    _redis = None
+
+
+def reset_redis_after_fork() -> None:
+    """Drop pooled connections inherited from the parent process"""
+    pool = getattr(_redis, "connection_pool", None)
+    if pool is not None:
+        pool.reset()
+
+
+class _LazyRedisClient:
+    """Module-level handle that defers building the client until it is used"""
+
+    def __getattr__(self, name):
+        return getattr(get_redis_client(), name)
+
+
 # Redis connection
-redis_client = redis.from_url(settings.redis_url, decode_responses=True)
+redis_client = _LazyRedisClient()
 
 
 class SecurityUtils:
     @staticmethod
     def hash_password(password: str) -> str:
         """Hash password using Argon2"""
-        return ph.hash(password)
+        with password_hash_duration.time(operation="hash"):
+            return get_password_hasher().hash(password)
 
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
-        """Verify password against hash"""
-        try:
-            ph.verify(hashed_password, plain_password)
+        """Verify password against hash (Argon2, or bcrypt from imported accounts)"""
+        if hashed_password.startswith(BCRYPT_PREFIXES):
+            import bcrypt
+            with password_hash_duration.time(operation="verify_bcrypt"):
+                # bcrypt only ever looked at the first 72 bytes; newer releases refuse longer input
+                return bcrypt.checkpw(plain_password.encode()[:72], hashed_password.encode())
+        with password_hash_duration.time(operation="verify"):
+            try:
+                get_password_hasher().verify(hashed_password, plain_password)
+                return True
+            except VerifyMismatchError:
+                return False
+
+    @staticmethod
+    def needs_rehash(hashed_password: str) -> bool:
+        """True for non-Argon2 hashes and Argon2 hashes with outdated parameters"""
+        if not hashed_password.startswith(ARGON2_PREFIXES):
             return True
-        except VerifyMismatchError:
-            return False
+        return get_password_hasher().check_needs_rehash(hashed_password)
 
     @staticmethod
     def generate_secure_token(length: int = 32) -> str:
@@ -52,6 +262,8 @@ class SecurityUtils:
     @staticmethod
     def validate_email_format(email: str) -> bool:
         """Validate email format"""
+        from email_validator import validate_email, EmailNotValidError
+
         try:
             validate_email(email)
             return True
@@ -90,7 +302,8 @@ class JWTManager:
             expire = datetime.now(timezone.utc) + timedelta(minutes=settings.access_token_expire_minutes)
 
         to_encode.update({"exp": expire, "type": "access"})
-        return jwt.encode(to_encode, settings.secret_key, algorithm=settings.jwt_algorithm)
+        with jwt_duration.time(operation="encode"):
+            return jwt.encode(to_encode, settings.secret_key, algorithm=settings.jwt_algorithm)
 
     @staticmethod
     def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -101,14 +314,17 @@ class JWTManager:
         else:
             expire = datetime.now(timezone.utc) + timedelta(days=settings.refresh_token_expire_days)
 
-        to_encode.update({"exp": expire, "type": "refresh"})
-        return jwt.encode(to_encode, settings.secret_key, algorithm=settings.jwt_algorithm)
+        # jti keeps two logins within the same second from minting identical (unique-indexed) tokens
+        to_encode.update({"exp": expire, "type": "refresh", "jti": secrets.token_urlsafe(6)})
+        with jwt_duration.time(operation="encode"):
+            return jwt.encode(to_encode, settings.secret_key, algorithm=settings.jwt_algorithm)
 
     @staticmethod
     def verify_token(token: str, token_type: str = "access") -> dict:
         """Verify and decode JWT token"""
         try:
-            payload = jwt.decode(token, settings.secret_key, algorithms=[settings.jwt_algorithm])
+            with jwt_duration.time(operation="decode"):
+                payload = jwt.decode(token, settings.secret_key, algorithms=[settings.jwt_algorithm])
             if payload.get("type") != token_type:
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -122,6 +338,25 @@ class JWTManager:
             )
 
 
+TOTP_INTERVAL = 30
+TOTP_DIGITS = 6
+
+
+@lru_cache(maxsize=4096)
+def _totp_key(secret: str) -> bytes:
+    """Decode a base32 TOTP secret once per secret instead of once per check"""
+    secret = secret.upper()
+    return base64.b32decode(secret + "=" * (-len(secret) % 8))
+
+
+def _totp_code(key: bytes, counter: int) -> str:
+    """RFC 4226 HOTP value for one counter"""
+    digest = hmac.new(key, struct.pack(">Q", counter), hashlib.sha1).digest()
+    offset = digest[-1] & 0x0F
+    code = struct.unpack(">I", digest[offset:offset + 4])[0] & 0x7FFFFFFF
+    return str(code % 10 ** TOTP_DIGITS).zfill(TOTP_DIGITS)
+
+
 class TwoFactorAuth:
     @staticmethod
     def generate_secret() -> str:
@@ -134,36 +369,102 @@ class TwoFactorAuth:
         if app_name is None:
             app_name = settings.app_name
 
-        totp = pyotp.TOTP(secret)
-        provisioning_uri = totp.provisioning_uri(
-            name=email,
-            issuer_name=app_name
-        )
+        provisioning_uri = TwoFactorAuth.provisioning_uri(secret, email, app_name)
+        return BytesIO(render_qr(provisioning_uri, "png"))
+
+    @staticmethod
+    def provisioning_uri(secret: str, email: str, app_name: str = None) -> str:
+        """otpauth:// URI encoded in the enrolment QR code"""
+        return pyotp.TOTP(secret).provisioning_uri(name=email, issuer_name=app_name or settings.app_name)
+
+    @staticmethod
+    async def get_or_create_pending_secret(user_id: str) -> str:
+        """Secret awaiting confirmation; reused across setup-page reloads until it expires"""
+        key = RedisKeys.totp_pending(user_id)
+        secret = TwoFactorAuth.generate_secret()
+        try:
+            # SET NX GET: store a new secret or return the one already pending
+            existing = await redis_client.set(key, secret, nx=True, get=True, ex=settings.totp_setup_ttl_seconds)
+        except RedisError:
+            redis_fallbacks.inc(operation="totp_setup")
+            existing = local_store.get(key)
+            if existing is None:
+                local_store.setex(key, settings.totp_setup_ttl_seconds, secret)
+        return existing or secret
+
+    @staticmethod
+    async def get_pending_secret(user_id: str) -> Optional[str]:
+        key = RedisKeys.totp_pending(user_id)
+        try:
+            secret = await redis_client.get(key)
+        except RedisError:
+            redis_fallbacks.inc(operation="totp_setup")
+            secret = None
+        return secret or local_store.get(key)
 
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(provisioning_uri)
-        qr.make(fit=True)
+    @staticmethod
+    async def clear_pending_secret(user_id: str) -> None:
+        key = RedisKeys.totp_pending(user_id)
+        local_store.delete(key)
+        try:
+            await redis_client.delete(key)
+        except RedisError:
+            redis_fallbacks.inc(operation="totp_setup")
 
-        img = qr.make_image(fill_color="black", back_color="white")
-        img_buffer = BytesIO()
-        img.save(img_buffer, format='PNG')
-        img_buffer.seek(0)
-        return img_buffer
+    @staticmethod
+    def match_totp(secret: str, token: str, window: int = 1, for_time: Optional[float] = None) -> Optional[int]:
+        """Return the timestep a TOTP token is valid for, or None"""
+        token = str(token).strip()
+        if len(token) != TOTP_DIGITS or not token.isdigit():
+            return None
+        key = _totp_key(secret)
+        current = int((time.time() if for_time is None else for_time) // TOTP_INTERVAL)
+        matched = None
+        # Every candidate is computed and compared so timing does not reveal which step matched
+        for counter in range(current - window, current + window + 1):
+            if hmac.compare_digest(_totp_code(key, counter), token) and matched is None:
+                matched = counter
+        return matched
 
     @staticmethod
     def verify_totp(secret: str, token: str, window: int = 1) -> bool:
         """Verify TOTP token"""
-        totp = pyotp.TOTP(secret)
-        return totp.verify(token, valid_window=window)
+        return TwoFactorAuth.match_totp(secret, token, window) is not None
+
+    @staticmethod
+    async def verify_totp_once(user_id: str, secret: str, token: str, window: int = 1) -> bool:
+        """Verify TOTP token and reject replays of an already used (user, timestep)"""
+        timestep = TwoFactorAuth.match_totp(secret, token, window)
+        if timestep is None:
+            return False
+
+        key = RedisKeys.totp_used(user_id, timestep)
+        # Long enough to outlive every window the timestep can still be accepted in
+        ttl = (2 * window + 1) * TOTP_INTERVAL
+        try:
+            return bool(await redis_client.set(key, 1, nx=True, ex=ttl))
+        except RedisError:
+            redis_fallbacks.inc(operation="totp_replay")
+            if local_store.get(key) is not None:
+                return False
+            local_store.setex(key, ttl, 1)
+            return True
 
     @staticmethod
     def generate_backup_codes(count: int = 8) -> list[str]:
         """Generate backup codes for 2FA"""
         return [secrets.token_hex(4).upper() for _ in range(count)]
 
+    @staticmethod
+    def backup_code_hmac(code: str) -> bytes:
+        """Keyed digest stored in BackupCode.code_hmac"""
+        key = (settings.backup_code_secret or settings.secret_key).encode()
+        normalized = code.strip().replace("-", "").upper()
+        return hmac.new(key, normalized.encode(), hashlib.sha256).digest()
+
     @staticmethod
     def hash_backup_codes(codes: list[str]) -> str:
-        """Hash backup codes for storage"""
+        """Hash backup codes for storage (legacy JSON format)"""
         hashed_codes = []
         for code in codes:
             # Use SHA-256 for backup codes (less computationally expensive than Argon2)
@@ -173,7 +474,7 @@ class TwoFactorAuth:
 
     @staticmethod
     def verify_backup_code(stored_codes: str, code: str) -> tuple[bool, str]:
-        """Verify backup code and return updated codes list"""
+        """Verify backup code against the legacy JSON list and return updated codes list"""
         try:
             codes_list = json.loads(stored_codes)
             code_hash = hashlib.sha256(code.upper().encode()).hexdigest()
@@ -190,70 +491,213 @@ class RateLimiter:
     @staticmethod
     async def check_rate_limit(key: str, limit: int, window: int) -> bool:
         """Check if rate limit is exceeded"""
-        current = await redis_client.get(key)
-        if current is None:
-            await redis_client.setex(key, window, 1)
-            return True
-        elif int(current) < limit:
-            await redis_client.incr(key)
+        try:
+            # Single key, single round trip; EXPIRE NX only arms the TTL for a new window
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.incr(key)
+            pipe.expire(key, window, nx=True)
+            current, _ = await execute_pipeline(pipe)
+            return current <= limit
+        except RedisError:
+            # Degraded mode: per-process limit
+            redis_fallbacks.inc(operation="rate_limit")
+            current = local_store.get(key)
+            if current is not None and int(current) >= limit:
+                return False
+            local_store.incr(key, window)
             return True
-        return False
 
     @staticmethod
     async def get_remaining_attempts(key: str, limit: int) -> int:
         """Get remaining attempts for rate limit"""
-        current = await redis_client.get(key)
+        try:
+            current = await redis_client.get(key)
+        except RedisError:
+            redis_fallbacks.inc(operation="rate_limit")
+            current = local_store.get(key)
         if current is None:
             return limit
         return max(0, limit - int(current))
 
 
+# Compact session value: "2|<user_id>|<created_epoch>|<device_info>".
+# No JSON keys or quoting, and an integer timestamp instead of a 32-char ISO string.
+SESSION_FORMAT_VERSION = "2"
+
+
+def _encode_session(user_id: str, created_at: int, device_info: Optional[str]) -> str:
+    return f"{SESSION_FORMAT_VERSION}|{user_id}|{created_at}|{device_info or ''}"
+
+
+def _decode_session(raw: str) -> tuple[dict, bool]:
+    """Decode a stored session; the flag is True for legacy JSON values"""
+    if raw.startswith("{"):
+        data = json.loads(raw)
+        created_at = data.get("created_at")
+        if isinstance(created_at, str):
+            data["created_at"] = int(datetime.fromisoformat(created_at).timestamp())
+        return data, True
+    _, user_id, created_at, device_info = raw.split("|", 3)
+    return {"user_id": user_id, "created_at": int(created_at), "device_info": device_info or None}, False
+
+
 class SessionManager:
+    """
+    Session ids look like "<user tag>.<token>"; the session key and the user's
+    session index share the tag, so per-user operations stay in one cluster slot.
+    """
+
     @staticmethod
     async def create_session(user_id: str, device_info: str = None) -> str:
         """Create user session"""
-        session_id = SecurityUtils.generate_secure_token()
-        session_data = {
-            "user_id": user_id,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "device_info": device_info
-        }
-
-        # Store session for 24 hours
-        await redis_client.setex(
-            f"session:{session_id}",
-            86400,
-            json.dumps(session_data)
-        )
+        tag = RedisKeys.user_tag(user_id)
+        session_id = f"{tag}.{SecurityUtils.generate_secure_token()}"
+        key = RedisKeys.session(session_id)
+        value = _encode_session(user_id, int(time.time()), device_info)
+
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            pipe.setex(key, settings.session_ttl_seconds, value)
+            pipe.sadd(RedisKeys.user_sessions(tag), session_id)
+            pipe.expire(RedisKeys.user_sessions(tag), settings.session_ttl_seconds)
+            await execute_pipeline(pipe)
+        except RedisError:
+            # Degraded mode: the session only lives in this process
+            redis_fallbacks.inc(operation="session")
+            local_store.setex(key, settings.session_ttl_seconds, value)
         return session_id
 
     @staticmethod
     async def get_session(session_id: str) -> Optional[dict]:
-        """Get session data"""
-        session_data = await redis_client.get(f"session:{session_id}")
-        if session_data:
-            return json.loads(session_data)
-        return None
+        """Get session data and slide its expiry forward (created_at is epoch seconds)"""
+        key = RedisKeys.session(session_id)
+        try:
+            if "." in session_id:
+                # GETEX reads and refreshes the TTL; the user's index slides with it
+                tag = session_id.split(".", 1)[0]
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.getex(key, ex=settings.session_ttl_seconds)
+                pipe.expire(RedisKeys.user_sessions(tag), settings.session_ttl_seconds)
+                raw, _ = await execute_pipeline(pipe)
+            else:
+                raw = await redis_client.getex(key, ex=settings.session_ttl_seconds)
+        except RedisError:
+            redis_fallbacks.inc(operation="session")
+            raw = None
+        if raw is None:
+            # Sessions created while Redis was unavailable
+            raw = local_store.getex(key, settings.session_ttl_seconds)
+            if raw is None:
+                return None
+            return _decode_session(raw)[0]
+
+        data, is_legacy = _decode_session(raw)
+        if is_legacy:
+            # Lazy migration: rewrite old JSON sessions in the compact format on first read
+            # and register them in the owner's index so delete_all_user_sessions finds them
+            tag = RedisKeys.user_tag(data["user_id"])
+            try:
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.set(
+                    key,
+                    _encode_session(data["user_id"], data.get("created_at") or int(time.time()),
+                                    data.get("device_info")),
+                    keepttl=True
+                )
+                pipe.sadd(RedisKeys.user_sessions(tag), session_id)
+                pipe.expire(RedisKeys.user_sessions(tag), settings.session_ttl_seconds)
+                await execute_pipeline(pipe)
+                session_migrations.inc()
+            except RedisError:
+                pass
+        return data
 
     @staticmethod
     async def delete_session(session_id: str) -> bool:
         """Delete session"""
-        result = await redis_client.delete(f"session:{session_id}")
-        return result > 0
+        key = RedisKeys.session(session_id)
+        deleted = local_store.delete(key)
+        try:
+            if "." in session_id:
+                tag = session_id.split(".", 1)[0]
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.delete(key)
+                pipe.srem(RedisKeys.user_sessions(tag), session_id)
+                removed, _ = await execute_pipeline(pipe)
+                deleted += removed
+            else:
+                deleted += await redis_client.delete(key)
+        except RedisError:
+            redis_fallbacks.inc(operation="session")
+        return deleted > 0
 
     @staticmethod
     async def delete_all_user_sessions(user_id: str) -> int:
         """Delete all sessions for a user"""
-        pattern = "session:*"
-        keys = await redis_client.keys(pattern)
+        tag = RedisKeys.user_tag(user_id)
         deleted = 0
+        for key in local_store.keys("session:"):
+            raw = local_store.get(key)
+            if raw and _decode_session(raw)[0].get("user_id") == user_id:
+                deleted += local_store.delete(key)
 
-        for key in keys:
-            session_data = await redis_client.get(key)
-            if session_data:
-                data = json.loads(session_data)
-                if data.get("user_id") == user_id:
-                    await redis_client.delete(key)
-                    deleted += 1
+        index_key = RedisKeys.user_sessions(tag)
+        try:
+            session_ids = list(await redis_client.smembers(index_key))
+            if session_ids:
+                # Tagged keys share the index's slot; migrated legacy keys are routed per node
+                pipe = redis_client.pipeline(transaction=False)
+                for session_id in session_ids:
+                    pipe.get(RedisKeys.session(session_id))
+                values = await execute_pipeline(pipe)
+
+                # Only delete sessions that really belong to this user (tags can collide)
+                pipe = redis_client.pipeline(transaction=False)
+                for session_id, raw in zip(session_ids, values):
+                    if raw is None:
+                        pipe.srem(index_key, session_id)
+                    elif _decode_session(raw)[0].get("user_id") == user_id:
+                        pipe.delete(RedisKeys.session(session_id))
+                        pipe.srem(index_key, session_id)
+                        deleted += 1
+                await execute_pipeline(pipe)
+        except RedisError:
+            redis_fallbacks.inc(operation="session")
+
+        if settings.session_legacy_scan:
+            deleted += await SessionManager._delete_legacy_sessions(user_id)
+        return deleted
 
-        return deleted
\ No newline at end of file
+    @staticmethod
+    async def _delete_legacy_sessions(user_id: str) -> int:
+        """Delete a user's untagged legacy sessions that were never read, and so never indexed"""
+        deleted = 0
+        batch = []
+        try:
+            # SCAN walks the keyspace incrementally (every node on a cluster) instead of blocking like KEYS
+            async for key in redis_client.scan_iter(match="session:*", count=settings.session_legacy_scan_count):
+                if "{" not in key:
+                    batch.append(key)
+                if len(batch) >= settings.session_legacy_scan_count:
+                    deleted += await _delete_sessions_of(batch, user_id)
+                    batch = []
+            if batch:
+                deleted += await _delete_sessions_of(batch, user_id)
+        except RedisError:
+            redis_fallbacks.inc(operation="session")
+        return deleted
+
+
+async def _delete_sessions_of(keys: list[str], user_id: str) -> int:
+    """Delete those of `keys` whose session belongs to user_id"""
+    pipe = redis_client.pipeline(transaction=False)
+    for key in keys:
+        pipe.get(key)
+    values = await execute_pipeline(pipe)
+    owned = [key for key, raw in zip(keys, values) if raw and _decode_session(raw)[0].get("user_id") == user_id]
+    if owned:
+        pipe = redis_client.pipeline(transaction=False)
+        for key in owned:
+            pipe.delete(key)
+        await execute_pipeline(pipe)
+    return len(owned)
@@ -0,0 +1,248 @@
+# benchmarks/auth_primitives.py
+"""
+Micro-benchmarks for the hot paths in auth_utils.
+
+Each case is warmed up, calibrated so one repetition lasts at least
+--min-time seconds, then repeated; the report gives mean, median, stdev and
+a 95% confidence interval of the mean per call. The committed baseline in
+benchmarks/baselines/auth_primitives.json was recorded on main against
+REDIS_URL=memory://; --compare with no path checks against it, and the
+process exits non-zero on a regression:
+
+    REDIS_URL=memory:// python -m benchmarks.auth_primitives --compare --threshold 0.10
+
+Timings are machine-specific: on other hardware, save a baseline from main
+first and compare the branch against that file instead:
+
+    python -m benchmarks.auth_primitives --save baseline-auth.json
+    python -m benchmarks.auth_primitives --compare baseline-auth.json
+
+A case counts as a regression when its median is more than --threshold
+slower *and* the confidence intervals do not overlap, so noisy cases do not
+fail the run. Redis-backed cases use REDIS_URL (or --redis-url); when Redis
+is unreachable they measure the local fallback, which the report flags.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import uuid
+from typing import Callable, NamedTuple, Optional
+
+import pyotp
+
+from database import settings
+
+PASSWORD = "Bench-Passw0rd!"
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "auth_primitives.json")
+
+# Two-sided 95% Student t critical values by degrees of freedom
+_T_95 = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+    10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 25: 2.060, 30: 2.042, 60: 2.000, 120: 1.980,
+}
+
+
+class Case(NamedTuple):
+    func: Callable
+    # Called (sync or async) with the batch size before every batch, outside the timed region
+    setup: Optional[Callable] = None
+
+
+def t_critical(df: int) -> float:
+    """Conservative t value: the nearest tabulated df at or below ``df``"""
+    if df > 120:
+        return 1.960
+    return _T_95[max(k for k in _T_95 if k <= df)]
+
+
+def summarize(per_call: list[float]) -> dict:
+    mean = statistics.fmean(per_call)
+    stdev = statistics.stdev(per_call) if len(per_call) > 1 else 0.0
+    half_width = t_critical(len(per_call) - 1) * stdev / math.sqrt(len(per_call)) if len(per_call) > 1 else 0.0
+    return {
+        "mean_us": round(mean * 1e6, 3),
+        "median_us": round(statistics.median(per_call) * 1e6, 3),
+        "min_us": round(min(per_call) * 1e6, 3),
+        "stdev_us": round(stdev * 1e6, 3),
+        "ci95_us": [round((mean - half_width) * 1e6, 3), round((mean + half_width) * 1e6, 3)],
+    }
+
+
+async def _batch(func, number: int, is_async: bool, setup: Optional[Callable] = None) -> float:
+    if setup is not None:
+        prepared = setup(number)
+        if inspect.isawaitable(prepared):
+            await prepared
+    start = time.perf_counter()
+    if is_async:
+        for _ in range(number):
+            await func()
+    else:
+        for _ in range(number):
+            func()
+    return time.perf_counter() - start
+
+
+async def measure(case, warmup: float, min_time: float, repeat: int) -> dict:
+    func, setup = case if isinstance(case, Case) else (case, None)
+    is_async = inspect.iscoroutinefunction(func)
+
+    deadline = time.perf_counter() + warmup
+    while time.perf_counter() < deadline:
+        await _batch(func, 1, is_async, setup)
+
+    # Calibrate like timeit.autorange: grow the batch until it is long enough to time reliably
+    number = 1
+    while await _batch(func, number, is_async, setup) < min_time:
+        number *= 2
+
+    per_call = [await _batch(func, number, is_async, setup) / number for _ in range(repeat)]
+    return {"number": number, "repeat": repeat, **summarize(per_call)}
+
+
+def build_cases() -> dict:
+    """name -> zero-argument callable (sync or async), or a Case with a per-batch setup"""
+    from auth_utils import JWTManager, RateLimiter, RedisKeys, SecurityUtils, SessionManager, TwoFactorAuth
+
+    hashed = SecurityUtils.hash_password(PASSWORD)
+    token_data = {"sub": "00000000-0000-0000-0000-000000000001", "email": "bench@example.com"}
+    access_token = JWTManager.create_access_token(token_data)
+    secret = pyotp.random_base32()
+    backup_codes = TwoFactorAuth.generate_backup_codes()
+    stored_backup_codes = TwoFactorAuth.hash_backup_codes(backup_codes)
+    rate_key = RedisKeys.rate_limit("bench")
+    session_ids: list[str] = []
+    totp = pyotp.TOTP(secret)
+    # The current code and fresh user ids are prepared per batch, so only the verifier is timed
+    totp_state = {"code": totp.now(), "users": iter(())}
+    replay_user = str(uuid.uuid4())
+
+    def current_code(_number: int) -> None:
+        totp_state["code"] = totp.now()
+
+    def fresh_users(number: int) -> None:
+        current_code(number)
+        totp_state["users"] = iter([str(uuid.uuid4()) for _ in range(number)])
+
+    async def spent_code(number: int) -> None:
+        current_code(number)
+        # Spend the current timestep so every timed call is a rejected replay
+        await TwoFactorAuth.verify_totp_once(replay_user, secret, totp_state["code"])
+
+    async def verify_totp_once():
+        await TwoFactorAuth.verify_totp_once(next(totp_state["users"]), secret, totp_state["code"])
+
+    async def verify_totp_once_replay():
+        await TwoFactorAuth.verify_totp_once(replay_user, secret, totp_state["code"])
+
+    async def rate_limit_check():
+        await RateLimiter.check_rate_limit(rate_key, 10 ** 9, 60)
+
+    async def session_lifecycle():
+        session_id = await SessionManager.create_session(token_data["sub"], "bench")
+        await SessionManager.get_session(session_id)
+        await SessionManager.delete_session(session_id)
+
+    async def session_get():
+        if not session_ids:
+            session_ids.append(await SessionManager.create_session(token_data["sub"], "bench"))
+        await SessionManager.get_session(session_ids[0])
+
+    return {
+        "hash_password": lambda: SecurityUtils.hash_password(PASSWORD),
+        "verify_password[valid]": lambda: SecurityUtils.verify_password(PASSWORD, hashed),
+        "verify_password[invalid]": lambda: SecurityUtils.verify_password("wrong-password", hashed),
+        "validate_password_strength": lambda: SecurityUtils.validate_password_strength(PASSWORD),
+        "jwt_create_access_token": lambda: JWTManager.create_access_token(token_data),
+        "jwt_verify_token": lambda: JWTManager.verify_token(access_token, "access"),
+        "verify_totp[current]": Case(lambda: TwoFactorAuth.verify_totp(secret, totp_state["code"]), current_code),
+        "verify_totp[invalid]": lambda: TwoFactorAuth.verify_totp(secret, "000000"),
+        # The login path: TOTP match plus the replay-cache SET NX
+        "verify_totp_once[current]": Case(verify_totp_once, fresh_users),
+        "verify_totp_once[replay]": Case(verify_totp_once_replay, spent_code),
+        "backup_code_hmac": lambda: TwoFactorAuth.backup_code_hmac(backup_codes[-1]),
+        "verify_backup_code[legacy]": lambda: TwoFactorAuth.verify_backup_code(stored_backup_codes, backup_codes[-1]),
+        "rate_limit_check": rate_limit_check,
+        "session_get": session_get,
+        "session_create_get_delete": session_lifecycle,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    for name, result in report["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        ratio = result["median_us"] / base["median_us"] if base["median_us"] else 1.0
+        result["vs_baseline"] = round(ratio, 3)
+        if ratio > 1 + threshold and result["ci95_us"][0] > base["ci95_us"][1]:
+            regressions.append(f"{name}: {base['median_us']} us -> {result['median_us']} us ({ratio:.2f}x)")
+    return regressions
+
+
+async def run(args) -> dict:
+    from auth_utils import close_redis_client, redis_breaker
+
+    if args.redis_url:
+        settings.redis_url = args.redis_url
+
+    cases = build_cases()
+    results = {}
+    for name, func in cases.items():
+        if args.filter and not any(part in name for part in args.filter):
+            continue
+        results[name] = await measure(func, args.warmup, args.min_time, args.repeat)
+        print(f"{name}: {results[name]['median_us']} us", file=sys.stderr)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "redis_url": settings.redis_url.split("@")[-1],
+        # "open" means Redis-backed cases measured the in-process fallback
+        "redis_circuit": redis_breaker.state,
+        "results": results,
+    }
+    await close_redis_client()
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=15, help="timed repetitions per case")
+    parser.add_argument("--warmup", type=float, default=0.2, help="warm-up seconds per case")
+    parser.add_argument("--min-time", type=float, default=0.05, help="minimum seconds per repetition")
+    parser.add_argument("--filter", nargs="*", help="only run cases whose name contains one of these")
+    parser.add_argument("--redis-url", help="override REDIS_URL for the Redis-backed cases")
+    parser.add_argument("--save", help="write the report to this file")
+    parser.add_argument("--compare", nargs="?", const=BASELINE,
+                        help="baseline report to compare against (default: the committed baseline)")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed relative slowdown of the median")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(report, json.load(fh), args.threshold)
+
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    if regressions:
+        print("Regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
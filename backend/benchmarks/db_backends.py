@@ -0,0 +1,251 @@
+# benchmarks/db_backends.py
+"""
+SQLite vs PostgreSQL on the statements the auth flow actually runs.
+
+Each database gets its own throwaway tables (a temporary schema on
+PostgreSQL, a temporary file for SQLite) and the same workload: bulk user
+inserts, COPY where available, indexed point lookups, backup-code consume
+with UPDATE ... RETURNING vs SELECT + UPDATE, single-row committed inserts
+(log_login_attempt) and a time-range count over login_attempts.
+
+    python -m benchmarks.db_backends                          # SQLite + DATABASE_URL
+    python -m benchmarks.db_backends --url sqlite+aiosqlite:///bench.db --rows 50000
+
+The "features" section records which PostgreSQL-specific paths each backend
+has, so the timings can be read as "what we lose on SQLite".
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, insert, select, text, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+import database
+from database import Base, BackupCode, LoginAttempt, User, settings
+
+FAKE_HASH = "$argon2id$v=19$m=65536,t=2,p=1$" + "A" * 22 + "$" + "B" * 43
+
+
+def _users(count: int, run_id: str) -> list[dict]:
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "id": uuid.uuid4(), "email": f"bench-{run_id}-{i}@example.com", "username": f"bench_{run_id}_{i}",
+            "hashed_password": FAKE_HASH, "is_active": True, "is_verified": True, "is_superuser": False,
+            "is_2fa_enabled": False, "created_at": now, "updated_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+async def timed(coro) -> float:
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
+
+
+async def bench_backend(url: str, rows: int, lookups: int, batch: int) -> dict:
+    settings.database_url = url
+    await database.dispose_engine()
+    engine = database.get_engine()
+    dialect = engine.dialect
+    schema = None
+    if dialect.name == "postgresql":
+        schema = f"bench_{secrets.token_hex(4)}"
+        async with engine.begin() as conn:
+            await conn.execute(text(f'CREATE SCHEMA "{schema}"'))
+        engine = engine.execution_options(schema_translate_map={None: schema})
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    results: dict = {}
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        run_id = secrets.token_hex(3)
+        users = _users(rows, run_id)
+
+        async def bulk_insert(data: list[dict]):
+            async with sessions() as db:
+                for start in range(0, len(data), batch):
+                    await db.execute(insert(User), data[start:start + batch])
+                await db.commit()
+
+        seconds = await timed(bulk_insert(users))
+        results["bulk_insert_executemany"] = {"rows": rows, "seconds": round(seconds, 3), "rows_per_s": round(rows / seconds)}
+
+        if dialect.name == "postgresql" and dialect.driver == "asyncpg":
+            copy_users = _users(rows, run_id + "c")
+            columns = list(copy_users[0])
+
+            async def copy_in():
+                async with engine.connect() as conn:
+                    raw = await conn.get_raw_connection()
+                    await raw.driver_connection.copy_records_to_table(
+                        "users", schema_name=schema, columns=columns,
+                        records=[tuple(user[c] for c in columns) for user in copy_users]
+                    )
+
+            seconds = await timed(copy_in())
+            results["bulk_insert_copy"] = {"rows": rows, "seconds": round(seconds, 3), "rows_per_s": round(rows / seconds)}
+        else:
+            results["bulk_insert_copy"] = {"skipped": f"COPY is not available on {dialect.name}"}
+
+        emails = [random.choice(users)["email"] for _ in range(lookups)]
+
+        async def point_lookups():
+            async with sessions() as db:
+                for email in emails:
+                    (await db.execute(select(User).where(User.email == email))).scalar_one()
+
+        seconds = await timed(point_lookups())
+        results["point_lookup_by_email"] = {"ops": lookups, "seconds": round(seconds, 3), "ops_per_s": round(lookups / seconds)}
+
+        # Backup codes: one UPDATE ... RETURNING vs the SELECT-then-UPDATE it replaced
+        owners = random.sample(users, min(lookups, rows))
+        codes = [
+            {"id": uuid.uuid4(), "user_id": user["id"], "code_hmac": secrets.token_bytes(32), "created_at": datetime.now(timezone.utc)}
+            for user in owners for _ in range(2)
+        ]
+        async with sessions() as db:
+            await db.execute(insert(BackupCode), codes)
+            await db.commit()
+
+        async def consume_returning(targets):
+            async with sessions() as db:
+                for code in targets:
+                    result = await db.execute(
+                        update(BackupCode)
+                        .where(BackupCode.user_id == code["user_id"], BackupCode.code_hmac == code["code_hmac"],
+                               BackupCode.used_at.is_(None))
+                        .values(used_at=datetime.now(timezone.utc))
+                        .returning(BackupCode.id)
+                    )
+                    result.scalar_one()
+                    await db.commit()
+
+        async def consume_select_update(targets):
+            async with sessions() as db:
+                for code in targets:
+                    row = (await db.execute(
+                        select(BackupCode.id).where(BackupCode.user_id == code["user_id"],
+                                                    BackupCode.code_hmac == code["code_hmac"],
+                                                    BackupCode.used_at.is_(None))
+                    )).scalar_one()
+                    await db.execute(update(BackupCode).where(BackupCode.id == row)
+                                     .values(used_at=datetime.now(timezone.utc)))
+                    await db.commit()
+
+        if dialect.update_returning:
+            seconds = await timed(consume_returning(codes[0::2]))
+            results["consume_code_returning"] = {"ops": len(codes) // 2, "seconds": round(seconds, 3),
+                                                 "ops_per_s": round(len(codes) / 2 / seconds)}
+        else:
+            results["consume_code_returning"] = {"skipped": f"UPDATE ... RETURNING is not supported by {dialect.name}"}
+        seconds = await timed(consume_select_update(codes[1::2]))
+        results["consume_code_select_update"] = {"ops": len(codes) // 2, "seconds": round(seconds, 3),
+                                                 "ops_per_s": round(len(codes) / 2 / seconds)}
+
+        async def log_attempts():
+            async with sessions() as db:
+                for i in range(lookups):
+                    db.add(LoginAttempt(email=emails[i], ip_address="10.0.0.1", user_agent="bench", success=bool(i % 4)))
+                    await db.commit()  # one commit per attempt, as log_login_attempt does
+
+        seconds = await timed(log_attempts())
+        results["single_row_commit"] = {"ops": lookups, "seconds": round(seconds, 3), "ops_per_s": round(lookups / seconds)}
+
+        now = datetime.now(timezone.utc)
+        history = [
+            {"id": uuid.uuid4(), "email": random.choice(users)["email"], "ip_address": "10.0.0.2", "user_agent": "bench",
+             "success": random.random() > 0.2, "created_at": now - timedelta(seconds=random.randrange(30 * 86400))}
+            for _ in range(rows)
+        ]
+        async with sessions() as db:
+            for start in range(0, len(history), batch):
+                await db.execute(insert(LoginAttempt), history[start:start + batch])
+            await db.commit()
+
+        async def range_count():
+            async with sessions() as db:
+                for _ in range(20):
+                    await db.execute(
+                        select(func.count()).select_from(LoginAttempt)
+                        .where(LoginAttempt.created_at >= now - timedelta(hours=24), LoginAttempt.success == False)
+                    )
+
+        seconds = await timed(range_count())
+        results["attempts_last_24h_count"] = {"rows_scanned_table": rows + lookups, "ops": 20, "seconds": round(seconds, 3),
+                                              "ms_per_op": round(seconds / 20 * 1000, 2)}
+    finally:
+        if schema is not None:
+            async with database.get_engine().begin() as conn:
+                await conn.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+        await database.dispose_engine()
+
+    return {
+        "dialect": dialect.name,
+        "driver": dialect.driver,
+        "server_version": ".".join(map(str, dialect.server_version_info or ())),
+        "features": {
+            "update_returning": bool(dialect.update_returning),
+            "copy": dialect.name == "postgresql" and dialect.driver == "asyncpg",
+            "declarative_partitioning": dialect.name == "postgresql",
+            "concurrent_writers": dialect.name != "sqlite",
+        },
+        "results": results,
+    }
+
+
+async def run(urls: list[str], rows: int, lookups: int, batch: int) -> dict:
+    report = {"rows": rows, "lookups": lookups, "backends": {}}
+    for url in urls:
+        label = make_url(url).render_as_string(hide_password=True)
+        try:
+            report["backends"][label] = await bench_backend(url, rows, lookups, batch)
+        except Exception as e:  # an unreachable server should not sink the whole report
+            report["backends"][label] = {"error": f"{type(e).__name__}: {e}"}
+    report["notes"] = [
+        "COPY and declarative partitioning exist only on PostgreSQL; on SQLite bulk loads use executemany "
+        "in one transaction and login_attempts range scans cannot prune old partitions.",
+        "SQLite has a single writer: the engine uses one pooled connection, so concurrent requests queue "
+        "for it instead of failing with 'database is locked'.",
+        "UPDATE ... RETURNING needs SQLite >= 3.35; consume_backup_code relies on it for atomic single-use codes.",
+    ]
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", action="append", help="database URL to benchmark (repeatable)")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    urls = args.url
+    if not urls:
+        sqlite_path = os.path.join(tempfile.mkdtemp(prefix="echowerk-db-"), "bench.db")
+        urls = [f"sqlite+aiosqlite:///{sqlite_path}"]
+        if not database.is_sqlite(settings.database_url):
+            urls.append(settings.database_url)
+
+    report = asyncio.run(run(urls, args.rows, args.lookups, args.batch))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
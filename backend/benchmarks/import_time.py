@@ -0,0 +1,93 @@
+# benchmarks/import_time.py
+"""
+Cold-start benchmark: `python -X importtime -c "import main"` broken down per module.
+
+Each run is a fresh interpreter. The report lists total wall time and the
+top-level modules with the largest cumulative import time (median across
+runs), as JSON. Save a baseline and compare later runs against it:
+
+    python -m benchmarks.import_time --save baseline-import.json
+    python -m benchmarks.import_time --compare baseline-import.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    """Map module name -> cumulative microseconds for every imported module"""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, self_us, cumulative_us, name = (part.strip() for part in line.replace("import time:", "|").split("|"))
+        timings[name.strip()] = int(cumulative_us)
+    return timings
+
+
+def run_once(target: str) -> tuple[float, dict[str, int]]:
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    return time.perf_counter() - start, parse_importtime(proc.stderr)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="main", help="module to import")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--save", help="write the report to this file")
+    parser.add_argument("--compare", help="baseline report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args()
+
+    run_once(args.target)  # warm the bytecode cache so runs measure imports, not compilation
+    walls, per_module = [], defaultdict(list)
+    for _ in range(args.runs):
+        wall, timings = run_once(args.target)
+        walls.append(wall)
+        for name, cumulative in timings.items():
+            per_module[name].append(cumulative)
+
+    medians = {name: statistics.median(values) for name, values in per_module.items()}
+    # Our own modules plus the heaviest third-party ones
+    own = sorted(name[:-3] for name in os.listdir(BACKEND_DIR) if name.endswith(".py"))
+    report = {
+        "target": args.target,
+        "runs": args.runs,
+        "wall_ms_median": round(statistics.median(walls) * 1000, 1),
+        "import_ms_total": round(medians.get(args.target, 0) / 1000, 1),
+        "project_modules_ms": {name: round(medians[name] / 1000, 1) for name in own if name in medians},
+        "top_modules_ms": {
+            name: round(value / 1000, 1)
+            for name, value in sorted(medians.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        }
+    }
+    print(json.dumps(report, indent=2))
+
+    if args.save:
+        with open(args.save, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            baseline = json.load(fh)
+        allowed = baseline["import_ms_total"] * (1 + args.threshold)
+        if report["import_ms_total"] > allowed:
+            print(f"Import time regressed: {report['import_ms_total']} ms > {allowed:.1f} ms allowed",
+                  file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
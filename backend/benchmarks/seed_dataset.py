@@ -0,0 +1,306 @@
+# benchmarks/seed_dataset.py
+"""
+Synthetic dataset for index and query studies at scale.
+
+Fills users, email_verifications, refresh_tokens and login_attempts with
+realistic volume. Argon2 hashes are real: a small pool of distinct hashes is
+computed once in a process pool and reused. User i's password is
+"Seed-Passw0rd-<i % hash_pool>!", so seeded accounts can log in.
+
+Rows come from generators and stream straight into COPY on PostgreSQL with
+asyncpg. Memory stays constant whatever --users is. Other backends (SQLite)
+fall back to batched executemany.
+
+    python -m benchmarks.seed_dataset --users 1000000 --attempts-per-user 8
+    python -m benchmarks.seed_dataset --url sqlite+aiosqlite:///seed.db --users 100000
+
+Login attempts are written in created_at order, like an append-only log.
+Their owners follow a power law (--skew): a few hot accounts get most of the
+traffic. A share of attempts (--attack-ratio) comes from a small set of
+hostile IPs trying mostly unknown emails.
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import os
+import random
+import secrets
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert, text
+from sqlalchemy.engine import make_url
+
+import database
+from database import Base, EmailVerification, LoginAttempt, RefreshToken, User, settings
+
+PASSWORD_TEMPLATE = "Seed-Passw0rd-{}!"
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_2) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+    "EchoWerk/1.4 (Android 14)",
+]
+ATTACK_USER_AGENTS = ["python-requests/2.31.0", "curl/8.4.0", "Go-http-client/1.1"]
+FAILURE_REASONS = [("invalid_credentials", 0.85), ("invalid_2fa", 0.08), ("email_unverified", 0.05), ("account_inactive", 0.02)]
+
+USER_COLUMNS = ["id", "email", "username", "hashed_password", "is_active", "is_verified", "is_superuser",
+                "totp_secret", "is_2fa_enabled", "created_at", "updated_at", "last_login", "first_name", "last_name"]
+VERIFICATION_COLUMNS = ["id", "user_id", "token", "expires_at", "is_used", "created_at"]
+REFRESH_COLUMNS = ["id", "user_id", "token", "expires_at", "is_revoked", "created_at", "device_info"]
+ATTEMPT_COLUMNS = ["id", "email", "ip_address", "user_agent", "success", "created_at", "failure_reason"]
+
+
+def _hash(password: str) -> str:
+    """Runs in a worker process"""
+    from auth_utils import SecurityUtils
+    return SecurityUtils.hash_password(password)
+
+
+def build_hash_pool(size: int, workers: int) -> list[str]:
+    """``size`` distinct Argon2 hashes, PASSWORD_TEMPLATE.format(k) for k in range(size)"""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_hash, [PASSWORD_TEMPLATE.format(k) for k in range(size)]))
+
+
+class Dataset:
+    """Deterministic per-row attributes, so each table's generator can be replayed independently"""
+
+    def __init__(self, args, hashes: list[str]):
+        self.args = args
+        self.hashes = hashes
+        self.run_id = args.run_id
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+        self.id_prefix = random.Random(f"{args.seed}:{self.run_id}").getrandbits(64) << 64
+
+    def _mix(self, i: int, salt: int) -> float:
+        """Cheap stable hash of (i, salt) in [0, 1)"""
+        h = ((i + 1) * 0x9E3779B97F4A7C15 ^ salt * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        h = (h ^ (h >> 31)) * 0x94D049BB133111EB & 0xFFFFFFFFFFFFFFFF
+        return (h >> 11) / float(1 << 53)
+
+    def user_id(self, i: int) -> uuid.UUID:
+        return uuid.UUID(int=self.id_prefix | i, version=4)
+
+    def email(self, i: int) -> str:
+        return f"seed-{self.run_id}-{i}@example.com"
+
+    def is_verified(self, i: int) -> bool:
+        return self._mix(i, 1) >= self.args.unverified_ratio
+
+    def has_2fa(self, i: int) -> bool:
+        return self._mix(i, 2) < self.args.twofa_ratio
+
+    def created_at(self, i: int) -> datetime:
+        # Sign-ups spread over --days, index order == sign-up order
+        return self.now - timedelta(days=self.args.days) * (1 - i / self.args.users)
+
+    def home_ip(self, i: int) -> str:
+        return f"100.{64 + (i >> 16) % 64}.{(i >> 8) & 255}.{i & 255}"
+
+    def users(self):
+        rng = random.Random(f"{self.args.seed}:{self.run_id}:users")
+        pool = len(self.hashes)
+        for i in range(self.args.users):
+            created = self.created_at(i)
+            verified = self.is_verified(i)
+            totp = base64.b32encode(rng.getrandbits(160).to_bytes(20, "big")).decode()[:32] if self.has_2fa(i) else None
+            last_login = created + (self.now - created) * rng.random() if verified and rng.random() < 0.8 else None
+            yield (
+                self.user_id(i), self.email(i), f"seed_{self.run_id}_{i}", self.hashes[i % pool],
+                rng.random() >= 0.01, verified, False, totp, totp is not None,
+                created, last_login or created, last_login, "Seed", f"User{i}",
+            )
+
+    def email_verifications(self):
+        """One row per user: consumed for verified accounts, pending for the rest"""
+        rng = random.Random(f"{self.args.seed}:{self.run_id}:verifications")
+        for i in range(self.args.users):
+            created = self.created_at(i)
+            verified = self.is_verified(i)
+            yield (
+                uuid.UUID(int=rng.getrandbits(128), version=4), self.user_id(i), _token(rng, 32),
+                created + timedelta(hours=settings.email_verification_expire_hours), verified, created,
+            )
+
+    def refresh_tokens(self):
+        """Exponentially distributed sessions per verified user; older ones mostly revoked or expired"""
+        rng = random.Random(f"{self.args.seed}:{self.run_id}:refresh")
+        mean = self.args.refresh_per_user
+        ttl = timedelta(days=settings.refresh_token_expire_days)
+        for i in range(self.args.users):
+            if mean <= 0 or not self.is_verified(i):
+                continue
+            created_user = self.created_at(i)
+            for _ in range(int(rng.expovariate(1 / mean) + 0.5)):
+                created = created_user + (self.now - created_user) * rng.random()
+                yield (
+                    uuid.UUID(int=rng.getrandbits(128), version=4), self.user_id(i), _token(rng, 128),
+                    created + ttl, rng.random() < 0.3, created, rng.choice(USER_AGENTS),
+                )
+
+    def login_attempts(self):
+        """--attempts-per-user * --users rows in created_at order over the last --attempt-days"""
+        rng = random.Random(f"{self.args.seed}:{self.run_id}:attempts")
+        total = int(self.args.users * self.args.attempts_per_user)
+        if total <= 0:
+            return
+        span = timedelta(days=self.args.attempt_days)
+        start = self.now - span
+        step = span / total
+        attackers = [f"203.0.113.{1 + k % 254}" for k in range(self.args.attacker_ips)]
+        reasons, weights = zip(*FAILURE_REASONS)
+        for k in range(total):
+            created = start + step * (k + rng.random())
+            if rng.random() < self.args.attack_ratio:
+                # Credential stuffing: mostly unknown emails, always failing
+                if rng.random() < 0.7:
+                    email = f"leak{rng.getrandbits(40):x}@example.net"
+                else:
+                    email = self.email(rng.randrange(self.args.users))
+                yield (uuid.UUID(int=rng.getrandbits(128), version=4), email, rng.choice(attackers),
+                       rng.choice(ATTACK_USER_AGENTS), False, created, "invalid_credentials")
+                continue
+            i = int(self.args.users * rng.random() ** self.args.skew)
+            success = self.is_verified(i) and rng.random() >= self.args.failure_ratio
+            ip = self.home_ip(i) if rng.random() < 0.8 else self.home_ip(rng.randrange(self.args.users))
+            yield (uuid.UUID(int=rng.getrandbits(128), version=4), self.email(i), ip, rng.choice(USER_AGENTS),
+                   success, created, None if success else rng.choices(reasons, weights)[0])
+
+
+def _token(rng: random.Random, nbytes: int) -> str:
+    """Opaque URL-safe token of roughly the stored width (refresh JWTs are ~170 chars)"""
+    return base64.urlsafe_b64encode(rng.getrandbits(nbytes * 8).to_bytes(nbytes, "big")).rstrip(b"=").decode()
+
+
+class Progress:
+    def __init__(self, table: str, every: int):
+        self.table = table
+        self.every = every
+        self.rows = 0
+        self.start = time.perf_counter()
+
+    def tick(self, count: int = 1) -> None:
+        before = self.rows
+        self.rows += count
+        if self.rows // self.every != before // self.every:
+            rate = self.rows / (time.perf_counter() - self.start)
+            print(f"{self.table}: {self.rows:,} rows ({rate:,.0f}/s)", file=sys.stderr)
+
+    def result(self) -> dict:
+        seconds = time.perf_counter() - self.start
+        return {"rows": self.rows, "seconds": round(seconds, 2), "rows_per_s": round(self.rows / seconds) if seconds else None}
+
+
+async def copy_table(engine, table, columns: list[str], rows, progress: Progress) -> None:
+    """One COPY per table fed from an async generator; asyncpg pulls rows as it sends them"""
+    async def records():
+        for row in rows:
+            progress.tick()
+            yield row
+
+    async with engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        await raw.execute("SET synchronous_commit = off")
+        await raw.copy_records_to_table(table.name, columns=columns, records=records(), schema_name=table.schema)
+
+
+async def insert_table(engine, table, columns: list[str], rows, batch: int, progress: Progress) -> None:
+    """executemany in --batch chunks, one transaction per chunk"""
+    while chunk := [dict(zip(columns, row)) for row in itertools.islice(rows, batch)]:
+        async with engine.begin() as conn:
+            await conn.execute(insert(table), chunk)
+        progress.tick(len(chunk))
+
+
+async def seed(args) -> dict:
+    if args.url:
+        settings.database_url = args.url
+    await database.dispose_engine()
+    engine = database.get_engine()
+    dialect = engine.dialect
+    use_copy = dialect.name == "postgresql" and dialect.driver == "asyncpg"
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    start = time.perf_counter()
+    hashes = build_hash_pool(args.hash_pool, args.workers)
+    report = {
+        "database": make_url(settings.database_url).render_as_string(hide_password=True),
+        "method": "copy" if use_copy else "executemany",
+        "run_id": args.run_id,
+        "password": PASSWORD_TEMPLATE.format(f"<i % {args.hash_pool}>"),
+        "email": f"seed-{args.run_id}-<i>@example.com",
+        "hash_pool": {"size": args.hash_pool, "workers": args.workers, "seconds": round(time.perf_counter() - start, 2)},
+        "tables": {},
+    }
+
+    data = Dataset(args, hashes)
+    plan = [
+        (User.__table__, USER_COLUMNS, data.users),
+        (EmailVerification.__table__, VERIFICATION_COLUMNS, data.email_verifications),
+        (RefreshToken.__table__, REFRESH_COLUMNS, data.refresh_tokens),
+        (LoginAttempt.__table__, ATTEMPT_COLUMNS, data.login_attempts),
+    ]
+    try:
+        for table, columns, rows in plan:
+            if args.tables and table.name not in args.tables:
+                continue
+            progress = Progress(table.name, args.progress_every)
+            if use_copy:
+                await copy_table(engine, table, columns, rows(), progress)
+            else:
+                await insert_table(engine, table, columns, rows(), args.batch, progress)
+            report["tables"][table.name] = progress.result()
+
+        if args.analyze:
+            async with engine.begin() as conn:
+                await conn.execute(text("ANALYZE"))
+    finally:
+        await database.dispose_engine()
+
+    report["seconds"] = round(time.perf_counter() - start, 2)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="database URL (default: DATABASE_URL)")
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--attempts-per-user", type=float, default=5.0, help="mean login attempts per user")
+    parser.add_argument("--refresh-per-user", type=float, default=1.5, help="mean refresh tokens per verified user")
+    parser.add_argument("--unverified-ratio", type=float, default=0.05)
+    parser.add_argument("--twofa-ratio", type=float, default=0.10)
+    parser.add_argument("--failure-ratio", type=float, default=0.08, help="failed share of ordinary login attempts")
+    parser.add_argument("--attack-ratio", type=float, default=0.05, help="share of attempts from hostile IPs")
+    parser.add_argument("--attacker-ips", type=int, default=16)
+    parser.add_argument("--skew", type=float, default=3.0, help="power-law exponent for attempt owners; 1 is uniform")
+    parser.add_argument("--days", type=int, default=365, help="sign-ups are spread over this many days")
+    parser.add_argument("--attempt-days", type=int, default=90, help="login attempts cover this many days")
+    parser.add_argument("--hash-pool", type=int, default=64, help="distinct Argon2 hashes to compute and reuse")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes hashing the pool")
+    parser.add_argument("--batch", type=int, default=5000, help="rows per executemany batch (non-COPY backends)")
+    parser.add_argument("--tables", nargs="*", help="only seed these tables")
+    parser.add_argument("--no-analyze", dest="analyze", action="store_false", help="skip ANALYZE after loading")
+    parser.add_argument("--progress-every", type=int, default=250000)
+    parser.add_argument("--seed", type=int, default=0, help="RNG seed; same seed and run id give the same rows")
+    parser.add_argument("--run-id", default=secrets.token_hex(3), help="tag in emails and ids, so runs do not collide")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(seed(args))
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
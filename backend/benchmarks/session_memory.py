@@ -0,0 +1,99 @@
+# benchmarks/session_memory.py
+"""
+Memory-per-session report: legacy JSON encoding vs the compact format.
+
+Writes N sessions in each encoding under a throwaway prefix, asks Redis for
+MEMORY USAGE of every key and prints the averages as JSON. With --offline
+only the encoded value sizes are compared.
+
+    python -m benchmarks.session_memory --sessions 10000
+"""
+import argparse
+import asyncio
+import json
+import secrets
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+
+from auth_utils import _encode_session, create_redis_client
+from database import settings
+
+DEVICE = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0"
+
+
+def legacy_value(user_id: str) -> str:
+    return json.dumps({
+        "user_id": user_id,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "device_info": DEVICE
+    })
+
+
+def compact_value(user_id: str) -> str:
+    return _encode_session(user_id, int(time.time()), DEVICE)
+
+
+async def measure(client, prefix: str, encoder, count: int) -> dict:
+    keys = []
+    pipe = client.pipeline(transaction=False)
+    for _ in range(count):
+        key = f"{prefix}:session:{secrets.token_urlsafe(32)}"
+        keys.append(key)
+        pipe.setex(key, 600, encoder(str(uuid.uuid4())))
+    await pipe.execute()
+
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.execute_command("MEMORY", "USAGE", key, "SAMPLES", "0")
+    usage = await pipe.execute()
+
+    pipe = client.pipeline(transaction=False)
+    for key in keys:
+        pipe.delete(key)
+    await pipe.execute()
+
+    return {
+        "sessions": count,
+        "mean_bytes": round(statistics.mean(usage), 1),
+        "total_bytes": sum(usage)
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--redis-url", default=settings.redis_url)
+    parser.add_argument("--offline", action="store_true", help="compare encoded value sizes only")
+    args = parser.parse_args()
+
+    user_id = str(uuid.uuid4())
+    report = {
+        "value_bytes": {
+            "legacy_json": len(legacy_value(user_id).encode()),
+            "compact": len(compact_value(user_id).encode())
+        }
+    }
+
+    if not args.offline:
+        settings.redis_url = args.redis_url
+        client = create_redis_client()
+        prefix = f"bench:{secrets.token_hex(4)}"
+        try:
+            report["redis_memory_usage"] = {
+                "legacy_json": await measure(client, prefix, legacy_value, args.sessions),
+                "compact": await measure(client, prefix, compact_value, args.sessions)
+            }
+        finally:
+            await client.close()
+        legacy = report["redis_memory_usage"]["legacy_json"]["mean_bytes"]
+        compact = report["redis_memory_usage"]["compact"]["mean_bytes"]
+        report["saving_per_session_bytes"] = round(legacy - compact, 1)
+        report["saving_ratio"] = round(1 - compact / legacy, 3)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,57 @@
+# benchmarks/totp_bench.py
+"""
+Micro-benchmark: pyotp.TOTP(...).verify vs TwoFactorAuth.verify_totp.
+
+    python -m benchmarks.totp_bench --number 20000 --repeat 7
+"""
+import argparse
+import json
+import statistics
+import time
+import timeit
+
+import pyotp
+
+from auth_utils import TwoFactorAuth
+
+
+def legacy_verify(secret: str, token: str, window: int = 1) -> bool:
+    """The implementation verify_totp replaced"""
+    return pyotp.TOTP(secret).verify(token, valid_window=window)
+
+
+def run(label: str, func, number: int, repeat: int) -> dict:
+    timings = timeit.repeat(func, number=number, repeat=repeat)
+    per_call_us = [t / number * 1e6 for t in timings]
+    return {
+        "name": label,
+        "best_us": round(min(per_call_us), 3),
+        "median_us": round(statistics.median(per_call_us), 3),
+        "stdev_us": round(statistics.stdev(per_call_us), 3) if repeat > 1 else 0.0
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="calls per repetition")
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    secret = pyotp.random_base32()
+    totp = pyotp.TOTP(secret)
+    valid = totp.now()
+    previous = totp.at(time.time() - 30)
+    invalid = str((int(valid) + 1) % 1000000).zfill(6)
+
+    results = []
+    for case, token in (("current", valid), ("previous_step", previous), ("invalid", invalid)):
+        legacy = run(f"pyotp_verify[{case}]", lambda: legacy_verify(secret, token), args.number, args.repeat)
+        new = run(f"verify_totp[{case}]", lambda: TwoFactorAuth.verify_totp(secret, token), args.number, args.repeat)
+        new["speedup"] = round(legacy["median_us"] / new["median_us"], 2)
+        results.extend([legacy, new])
+
+    print(json.dumps({"number": args.number, "repeat": args.repeat, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
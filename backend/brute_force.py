@@ -0,0 +1,275 @@
+# brute_force.py
+"""
+Brute-force and credential-stuffing detection.
+
+log_login_attempt feeds every failed credential check in. For each email
+and each client IP, Redis keeps:
+
+- a sliding-window failure count: two fixed-window counters (current and
+  previous), the previous one weighted by how much of it the sliding
+  window still covers
+- a HyperLogLog per window of the distinct counterparts: IPs per email
+  (one account sprayed from a botnet) and emails per IP (one host stuffing
+  many accounts); at most 12 KB each, ~0.8% error
+
+Memory is bounded per subject, and every key expires after two windows.
+When a failure puts an IP over a threshold, the decision is written to its
+own key:
+- challenge: the next login must carry a solved proof-of-work; while
+  settings.brute_force_challenge_enabled is off (no client solves them
+  yet) it is a delay of brute_force_base_delay_ms instead
+- delay: a cooldown before the next attempt is accepted
+- block: rejected for the rest of the window
+
+Email decisions are only reported (brute_force_decisions_total): anyone can
+fail logins against any email, so enforcing them would hand the owner's
+account to whoever sprays it. Per-account guessing is capped instead by a
+failure streak that only a successful login resets. From
+settings.account_lockout_threshold failures on, every further failure locks
+the account for an exponentially growing, capped period, after which the
+owner's correct password works again. That bounds the password verifies an
+attacker rotating IPs can cost per account. login_user reads the IP's
+decision and the account's lockout in one round trip before any password
+hashing.
+"""
+import hashlib
+import hmac
+import math
+import secrets
+import time
+from typing import NamedTuple, Optional
+
+from redis.exceptions import RedisError
+
+from auth_utils import RedisKeys, execute_pipeline, local_store, redis_client
+from database import settings
+from metrics import registry
+from redis_resilience import redis_fallbacks
+
+# Failure reasons where a wrong secret was presented; unverified or inactive accounts had the right password
+COUNTED_REASONS = frozenset({"invalid_credentials", "invalid_2fa", "invalid_backup_code"})
+SEVERITY = {"challenge": 1, "delay": 2, "lockout": 3, "block": 4}
+# Subjects whose detector decisions gate logins; the others are advisory
+ENFORCED_SUBJECTS = frozenset({"ip"})
+
+decisions_issued = registry.counter(
+    "brute_force_decisions_total", "Decisions reached by the brute-force detector", ("subject", "action")
+)
+decisions_enforced = registry.counter(
+    "brute_force_enforced_total", "Login attempts stopped or challenged by a detector decision", ("action",)
+)
+
+
+class Decision(NamedTuple):
+    action: str  # "challenge", "delay", "lockout" or "block"
+    subject: str  # "email" or "ip"
+    retry_after: int = 0  # seconds until a delayed, locked out or blocked subject may try again
+
+
+def _subjects(email: str, ip: str) -> tuple[tuple[str, str], tuple[str, str]]:
+    """(kind, hashed key tag) for the email and the IP; neither appears in key names in the clear"""
+    return ("email", f"email:{RedisKeys.user_tag(email.lower())}"), ("ip", f"ip:{RedisKeys.user_tag(ip)}")
+
+
+def _evaluate(kind: str, failures: float, distinct: int) -> Optional[tuple[str, float]]:
+    """(action, not-before unix time) for a subject's current counts"""
+    challenge, delay, block = settings.brute_force_failure_thresholds[kind]
+    distinct_challenge, distinct_block = settings.brute_force_distinct_thresholds[kind]
+    now = time.time()
+    if failures >= block or (distinct_block and distinct >= distinct_block):
+        return "block", now + settings.brute_force_window_seconds
+    if failures >= delay:
+        # Doubles with every failure past the threshold
+        delay_ms = min(settings.brute_force_max_delay_ms,
+                       settings.brute_force_base_delay_ms * 2 ** min(int(failures - delay), 30))
+        return "delay", now + delay_ms / 1000
+    if failures >= challenge or (distinct_challenge and distinct >= distinct_challenge):
+        if not settings.brute_force_challenge_enabled:
+            return "delay", now + settings.brute_force_base_delay_ms / 1000
+        return "challenge", 0.0
+    return None
+
+
+def _lockout_until(failures: int) -> Optional[float]:
+    """End of the lockout earned by a streak of `failures`, if any"""
+    threshold = settings.account_lockout_threshold
+    if not threshold or failures < threshold:
+        return None
+    seconds = min(settings.account_lockout_max_seconds,
+                  settings.account_lockout_base_seconds * 2 ** min(failures - threshold, 30))
+    return time.time() + seconds
+
+
+def _decode(raw: Optional[str], kind: str) -> Optional[Decision]:
+    if not raw:
+        return None
+    action, _, until = raw.partition("|")
+    retry_after = math.ceil(float(until or 0) - time.time())
+    if action == "delay" and retry_after <= 0:
+        # Cooldown over; the subject is still past the challenge threshold
+        return Decision("challenge", kind) if settings.brute_force_challenge_enabled else None
+    if action == "lockout" and retry_after <= 0:
+        return None
+    return Decision(action, kind, max(retry_after, 0))
+
+
+class BruteForceDetector:
+    @staticmethod
+    async def record_failure(email: str, ip: str) -> None:
+        """Count a failed credential check and refresh the email's and the IP's decisions"""
+        if not settings.brute_force_enabled:
+            return
+        window = settings.brute_force_window_seconds
+        now = time.time()
+        bucket = int(now // window)
+        overlap = 1 - (now % window) / window
+        subjects = _subjects(email, ip)
+        # Distinct IPs per email, distinct emails (as digests) per IP
+        counterparts = (ip, subjects[0][1])
+
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for (_, subject), counterpart in zip(subjects, counterparts):
+                current, previous = RedisKeys.bf_failures(subject, bucket), RedisKeys.bf_failures(subject, bucket - 1)
+                sketch, previous_sketch = RedisKeys.bf_distinct(subject, bucket), RedisKeys.bf_distinct(subject, bucket - 1)
+                pipe.incr(current)
+                pipe.expire(current, 2 * window, nx=True)
+                pipe.get(previous)
+                pipe.pfadd(sketch, counterpart)
+                pipe.expire(sketch, 2 * window, nx=True)
+                pipe.pfcount(sketch, previous_sketch)
+            streak = RedisKeys.lockout_failures(subjects[0][1])
+            pipe.incr(streak)
+            pipe.expire(streak, settings.account_lockout_reset_seconds)
+            results = await execute_pipeline(pipe)
+        except RedisError:
+            # Degraded mode: per-process fixed-window counts, no cardinality
+            redis_fallbacks.inc(operation="brute_force")
+            for kind, subject in subjects:
+                failures = local_store.incr(RedisKeys.bf_failures(subject, bucket), window)
+                decision = _evaluate(kind, failures, 0)
+                if decision is not None:
+                    if kind in ENFORCED_SUBJECTS:
+                        local_store.setex(RedisKeys.bf_decision(subject), window, f"{decision[0]}|{decision[1]}")
+                    decisions_issued.inc(subject=kind, action=decision[0])
+            failures = local_store.incr(RedisKeys.lockout_failures(subjects[0][1]), settings.account_lockout_reset_seconds)
+            until = _lockout_until(failures)
+            if until is not None:
+                local_store.setex(RedisKeys.lockout(subjects[0][1]), math.ceil(until - now), f"lockout|{until}")
+                decisions_issued.inc(subject="email", action="lockout")
+            return
+
+        # (key, value, ttl) writes
+        writes = []
+        for i, (kind, subject) in enumerate(subjects):
+            current, _, previous, _, _, distinct = results[i * 6:(i + 1) * 6]
+            decision = _evaluate(kind, current + int(previous or 0) * overlap, distinct)
+            if decision is None:
+                continue
+            action, until = decision
+            if kind in ENFORCED_SUBJECTS:
+                writes.append((kind, action, RedisKeys.bf_decision(subject), f"{action}|{until}", window))
+            else:
+                decisions_issued.inc(subject=kind, action=action)
+        until = _lockout_until(results[12])
+        if until is not None:
+            lockout = RedisKeys.lockout(subjects[0][1])
+            writes.append(("email", "lockout", lockout, f"lockout|{until}", math.ceil(until - now)))
+        if not writes:
+            return
+
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for _, _, key, value, ttl in writes:
+                pipe.set(key, value, ex=ttl)
+            await execute_pipeline(pipe)
+        except RedisError:
+            redis_fallbacks.inc(operation="brute_force")
+            for _, _, key, value, ttl in writes:
+                local_store.setex(key, ttl, value)
+        for kind, action, *_ in writes:
+            decisions_issued.inc(subject=kind, action=action)
+
+    @staticmethod
+    async def record_success(email: str) -> None:
+        """Reset the account's failure streak and lockout after a successful login"""
+        if not settings.brute_force_enabled:
+            return
+        subject = _subjects(email, "")[0][1]
+        keys = (RedisKeys.lockout_failures(subject), RedisKeys.lockout(subject))
+        try:
+            await redis_client.delete(*keys)
+        except RedisError:
+            redis_fallbacks.inc(operation="brute_force")
+        # Also clear any copy written while Redis was unavailable
+        for key in keys:
+            local_store.delete(key)
+
+    @staticmethod
+    async def check(email: str, ip: str) -> Optional[Decision]:
+        """The more severe of the IP's standing decision and the account's lockout (two GETs, one round trip)"""
+        if not settings.brute_force_enabled:
+            return None
+        (_, email_subject), (_, ip_subject) = _subjects(email, ip)
+        keys = (RedisKeys.bf_decision(ip_subject), RedisKeys.lockout(email_subject))
+        try:
+            # GETs rather than MGET: the email's and the IP's keys live in different cluster slots
+            pipe = redis_client.pipeline(transaction=False)
+            for key in keys:
+                pipe.get(key)
+            raw = await execute_pipeline(pipe)
+        except RedisError:
+            redis_fallbacks.inc(operation="brute_force")
+            raw = [local_store.get(key) for key in keys]
+
+        found = [d for d in (_decode(value, kind) for value, kind in zip(raw, ("ip", "email"))) if d is not None]
+        return max(found, key=lambda d: SEVERITY[d.action], default=None)
+
+    @staticmethod
+    def issue_challenge(email: str) -> dict:
+        """
+        Hashcash-style puzzle bound to the email: find `solution` such that
+        sha256(f"{nonce}:{solution}") starts with `difficulty` zero bits
+        """
+        bits = settings.brute_force_challenge_bits
+        payload = f"{int(time.time())}.{secrets.token_hex(8)}.{bits}"
+        return {
+            "nonce": f"{payload}.{_sign_challenge(email, payload)}",
+            "algorithm": "sha256",
+            "difficulty": bits,
+            "expires_in": settings.brute_force_challenge_ttl_seconds,
+        }
+
+    @staticmethod
+    async def verify_challenge(email: str, nonce: Optional[str], solution: Optional[str]) -> bool:
+        """Check a solved challenge; each nonce is accepted once"""
+        if not nonce or solution is None:
+            return False
+        try:
+            issued, salt, bits, signature = nonce.split(".")
+            payload = f"{issued}.{salt}.{bits}"
+            issued, bits = int(issued), int(bits)
+        except ValueError:
+            return False
+        ttl = settings.brute_force_challenge_ttl_seconds
+        if not hmac.compare_digest(signature, _sign_challenge(email, payload)) or time.time() - issued > ttl:
+            return False
+        digest = hashlib.sha256(f"{nonce}:{solution}".encode()).digest()
+        if int.from_bytes(digest, "big") >> (256 - bits):
+            return False
+
+        key = RedisKeys.bf_challenge_used(_subjects(email, "")[0][1], salt)
+        try:
+            return bool(await redis_client.set(key, "1", nx=True, ex=ttl))
+        except RedisError:
+            redis_fallbacks.inc(operation="brute_force")
+            if local_store.get(key) is not None:
+                return False
+            local_store.setex(key, ttl, "1")
+            return True
+
+
+def _sign_challenge(email: str, payload: str) -> str:
+    return hmac.new(
+        settings.secret_key.encode(), f"challenge|{email.lower()}|{payload}".encode(), hashlib.sha256
+    ).hexdigest()[:32]
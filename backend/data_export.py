@@ -0,0 +1,259 @@
+# data_export.py
+"""
+Streaming exports of users and login_attempts for analytics.
+
+Rows come through a server-side cursor in (created_at, id) order,
+`batch_size` at a time, so memory stays flat however large the table is.
+Output is NDJSON or CSV, optionally gzip-compressed. Any export can resume
+from a keyset checkpoint "<created_at ISO 8601>,<id>", which is the last
+row already written. That is why created_at and id are always part of the
+output. Secrets (password hashes, TOTP secrets, backup codes) are never
+exportable.
+
+    python data_export.py users --format csv --gzip -o users.csv.gz
+    python data_export.py login_attempts -o attempts.ndjson --checkpoint attempts.ckpt  # rerun to resume
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import json
+import os
+import sys
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator, NamedTuple, Optional
+
+from sqlalchemy import select, tuple_
+
+from database import LoginAttempt, User, get_engine, settings
+from metrics import registry
+
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+KEYSET = ("created_at", "id")
+
+export_rows = registry.counter("export_rows_total", "Rows written by data exports", ("table",))
+
+
+class ExportSpec(NamedTuple):
+    model: type
+    columns: tuple[str, ...]  # exportable columns, in default output order
+
+
+EXPORTS = {
+    "users": ExportSpec(User, (
+        "id", "email", "username", "first_name", "last_name", "is_active", "is_verified", "is_superuser",
+        "is_2fa_enabled", "created_at", "updated_at", "last_login", "avatar_url",
+    )),
+    "login_attempts": ExportSpec(LoginAttempt, (
+        "id", "email", "ip_address", "user_agent", "success", "failure_reason", "created_at",
+    )),
+}
+
+
+class ExportError(ValueError):
+    """Invalid export request (unknown table, column or checkpoint)"""
+
+
+def parse_checkpoint(value: str) -> tuple[datetime, uuid.UUID]:
+    created_at, _, row_id = value.partition(",")
+    try:
+        timestamp = datetime.fromisoformat(created_at.strip())
+        ident = uuid.UUID(row_id.strip())
+    except ValueError:
+        raise ExportError("Checkpoint must be '<created_at ISO 8601>,<id>'")
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp, ident
+
+
+def format_checkpoint(created_at: datetime, row_id) -> str:
+    return f"{created_at.isoformat()},{row_id}"
+
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return _json_value(value)
+
+
+class ExportPlan:
+    """A validated export: what to select, in which order, and how to encode it"""
+
+    def __init__(self, table: str, fmt: str = "ndjson", columns: Optional[list[str]] = None,
+                 after: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 limit: Optional[int] = None, batch_size: int = None):
+        if table not in EXPORTS:
+            raise ExportError(f"Unknown table '{table}'; exportable: {', '.join(EXPORTS)}")
+        if fmt not in EXPORT_FORMATS:
+            raise ExportError(f"Unknown format '{fmt}'; use {' or '.join(EXPORT_FORMATS)}")
+        if limit is not None and limit <= 0:
+            raise ExportError("limit must be positive")
+        spec = EXPORTS[table]
+        if columns:
+            unknown = [name for name in columns if name not in spec.columns]
+            if unknown:
+                raise ExportError(f"Unknown or non-exportable columns: {', '.join(unknown)}")
+            # The keyset columns ride along so the last row is always a usable checkpoint
+            columns = list(dict.fromkeys([*columns, *KEYSET]))
+        self.table = table
+        self.model = spec.model
+        self.fmt = fmt
+        self.columns = columns or list(spec.columns)
+        self.after = parse_checkpoint(after) if after else None
+        self.since = since
+        self.until = until
+        self.limit = limit
+        self.batch_size = batch_size or settings.export_batch_size
+        self._keyset_index = (self.columns.index("created_at"), self.columns.index("id"))
+
+    def statement(self):
+        model = self.model
+        stmt = select(*(getattr(model, name) for name in self.columns)).order_by(model.created_at, model.id)
+        if self.after is not None:
+            # Row-value comparison, so the (created_at, id) index serves it as one range scan
+            stmt = stmt.where(tuple_(model.created_at, model.id) > tuple_(*self.after))
+        if self.since is not None:
+            stmt = stmt.where(model.created_at >= self.since)
+        if self.until is not None:
+            stmt = stmt.where(model.created_at < self.until)
+        if self.limit is not None:
+            stmt = stmt.limit(self.limit)
+        return stmt
+
+    async def batches(self, conn) -> AsyncIterator[list]:
+        """Row batches from a server-side cursor; only one batch is held at a time"""
+        result = await conn.stream(self.statement().execution_options(yield_per=self.batch_size))
+        async for rows in result.partitions():
+            export_rows.inc(len(rows), table=self.table)
+            yield rows
+
+    def checkpoint(self, row) -> str:
+        created_at, row_id = (row[i] for i in self._keyset_index)
+        return format_checkpoint(created_at, row_id)
+
+    def header(self) -> bytes:
+        """CSV header, or nothing; a resumed export continues without one"""
+        if self.fmt != "csv" or self.after is not None:
+            return b""
+        return (",".join(self.columns) + "\n").encode()
+
+    def encode(self, rows) -> bytes:
+        if self.fmt == "ndjson":
+            return "".join(
+                json.dumps(dict(zip(self.columns, map(_json_value, row))), separators=(",", ":")) + "\n"
+                for row in rows
+            ).encode()
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows([map(_csv_value, row) for row in rows])
+        return buffer.getvalue().encode()
+
+    async def stream(self, compress: bool = False) -> AsyncIterator[bytes]:
+        """Encoded (and optionally gzipped) body for a StreamingResponse"""
+        compressor = zlib.compressobj(wbits=31) if compress else None
+        header = self.header()
+        if header:
+            yield compressor.compress(header) if compressor else header
+        async with get_engine().connect() as conn:
+            async for rows in self.batches(conn):
+                data = self.encode(rows)
+                if compressor:
+                    data = compressor.compress(data)
+                if data:
+                    yield data
+        if compressor:
+            yield compressor.flush()
+
+
+async def export_to_file(plan: ExportPlan, output, compress: bool, checkpoint_path: Optional[str]) -> dict:
+    """Write batches to `output`, recording a checkpoint after each one is flushed"""
+    rows_written = 0
+    last = None
+
+    def write(data: bytes) -> None:
+        # One gzip member per batch: a file cut short by a crash still decompresses up to the last checkpoint
+        output.write(gzip.compress(data) if compress else data)
+        output.flush()
+
+    header = plan.header()
+    if header:
+        await asyncio.to_thread(write, header)
+    async with get_engine().connect() as conn:
+        async for rows in plan.batches(conn):
+            await asyncio.to_thread(write, plan.encode(rows))
+            rows_written += len(rows)
+            last = plan.checkpoint(rows[-1])
+            if checkpoint_path:
+                await asyncio.to_thread(_save_checkpoint, checkpoint_path, last)
+    return {"table": plan.table, "rows": rows_written, "checkpoint": last}
+
+
+def _save_checkpoint(path: str, value: str) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        fh.write(value)
+    os.replace(tmp, path)
+
+
+async def _run_cli(args) -> dict:
+    import database
+
+    if args.url:
+        settings.database_url = args.url
+    after = args.after
+    if args.checkpoint and not after and os.path.exists(args.checkpoint):
+        with open(args.checkpoint) as fh:
+            after = fh.read().strip() or None
+    plan = ExportPlan(
+        args.table, args.format, args.columns.split(",") if args.columns else None, after=after,
+        since=args.since, until=args.until, limit=args.limit, batch_size=args.batch_size
+    )
+    # Resuming appends to what is already there
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, "ab" if after else "wb")
+    try:
+        report = await export_to_file(plan, output, args.gzip, args.checkpoint)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+        await database.dispose_engine()
+    report["resumed_from"] = after
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("table", choices=EXPORTS)
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--columns", help="comma-separated projection (created_at and id are always included)")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("--checkpoint", help="file holding the last exported keyset; read to resume, updated per batch")
+    parser.add_argument("--after", help="explicit checkpoint '<created_at>,<id>' to resume after")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="created_at >= this ISO timestamp")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="created_at < this ISO timestamp")
+    parser.add_argument("--limit", type=int)
+    parser.add_argument("--batch-size", type=int, default=settings.export_batch_size)
+    parser.add_argument("--url", help="database URL (default: DATABASE_URL)")
+    args = parser.parse_args()
+
+    try:
+        report = asyncio.run(_run_cli(args))
+    except ExportError as e:
+        parser.error(str(e))
+    print(json.dumps(report), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
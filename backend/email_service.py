@@ -1,13 +1,19 @@
 # email_service.py
 import aiosmtplib
+import asyncio
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import List, Optional
+from typing import Awaitable, Callable, List, Optional
 import logging
+import time
 from database import settings
+from metrics import registry, smtp_send_duration
 
 logger = logging.getLogger(__name__)
 
+outbox_depth = registry.gauge("email_outbox_depth", "Emails waiting in the outbox")
+outbox_dropped = registry.counter("email_outbox_dropped_total", "Emails not queued because the outbox was full")
+
 
 class EmailService:
     def __init__(self):
@@ -25,6 +31,7 @@ class EmailService:
             text_body: Optional[str] = None
     ) -> bool:
         """Send email using SMTP"""
+        start = time.perf_counter()
         try:
             message = MIMEMultipart("alternative")
             message["Subject"] = subject
@@ -50,11 +57,13 @@ class EmailService:
                 password=self.password,
             )
 
-            logger.info(f"Email sent successfully to {to_email}")
+            smtp_send_duration.observe(time.perf_counter() - start, outcome="sent")
+            logger.info("Email sent successfully to %s", to_email)
             return True
 
         except Exception as e:
-            logger.error(f"Failed to send email to {to_email}: {str(e)}")
+            smtp_send_duration.observe(time.perf_counter() - start, outcome="failed")
+            logger.error("Failed to send email to %s: %s", to_email, e)
             return False
 
     async def send_verification_email(self, to_email: str, verification_link: str) -> bool:
@@ -163,6 +172,10 @@ class EmailService:
 
         return await self.send_email(to_email, subject, html_body, text_body)
 
+    async def send_verification_token(self, to_email: str, token: str) -> bool:
+        """Send the verification email for a stored EmailVerification token"""
+        return await self.send_verification_email(to_email, f"http://localhost:3000/verify-email/{token}")
+
     async def send_password_reset_email(self, to_email: str, reset_link: str) -> bool:
         """Send password reset email"""
         subject = f"Reset your {self.app_name} password"
@@ -355,5 +368,65 @@ class EmailService:
         return await self.send_email(to_email, subject, html_body)
 
 
+class EmailOutbox:
+    """Bounded background queue that paces sends to `rate` per second with `concurrency` in flight"""
+
+    def __init__(self, rate: float, concurrency: int, max_queue: int):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self.concurrency = concurrency
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._workers: list[asyncio.Task] = []
+        self._next_slot = 0.0
+
+    def submit(self, send: Callable[[], Awaitable]) -> bool:
+        """Queue a send; False (and counted as dropped) when the outbox is full"""
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        try:
+            self.queue.put_nowait(send)
+        except asyncio.QueueFull:
+            outbox_dropped.inc()
+            return False
+        return True
+
+    def backlog_seconds(self) -> float:
+        """Roughly how long a send queued now waits before going out"""
+        return self.queue.qsize() * self.interval
+
+    async def _pace(self) -> None:
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _worker(self) -> None:
+        while True:
+            send = await self.queue.get()
+            try:
+                await self._pace()
+                await send()
+            except Exception as e:
+                logger.error("Queued email failed: %s", e)
+            finally:
+                self.queue.task_done()
+
+    async def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Give queued sends up to `timeout` seconds (None: until drained), then cancel the workers"""
+        if self._workers:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Email outbox closed with %d unsent emails", self.queue.qsize())
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
 # Initialize email service
-email_service = EmailService()
\ No newline at end of file
+email_service = EmailService()
+
+# Bulk sends (user import) go through here so they cannot flood the SMTP relay
+email_outbox = EmailOutbox(settings.email_outbox_rate, settings.email_outbox_concurrency, settings.email_outbox_max_queue)
+outbox_depth.set_function(email_outbox.queue.qsize)
\ No newline at end of file
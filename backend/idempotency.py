@@ -0,0 +1,230 @@
+# idempotency.py
+"""
+Idempotency-Key support for write endpoints.
+
+The first request with a given key claims it in Redis (SET NX GET), runs,
+and stores its response for a day. Retries replay that response; duplicates
+arriving while the first is still running wait for it instead of hashing a
+second password. Reusing a key with a different body is rejected.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+from auth_utils import RedisKeys, local_store, redis_client
+from metrics import registry
+from redis_resilience import redis_fallbacks
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+# Transient outcomes a retry should be allowed to re-run
+UNCACHEABLE_STATUS = frozenset({408, 425, 429})
+
+idempotent_requests = registry.counter(
+    "idempotency_requests_total", "Requests carrying an Idempotency-Key by outcome", ("outcome",)
+)
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app, secret: str, paths, ttl: int = 86400, lock_ttl: int = 30,
+                 wait_timeout: float = 10.0, max_body: int = 65536):
+        self.app = app
+        self.secret = secret.encode()
+        self.paths = frozenset(paths)
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.max_body = max_body
+        # Requests this worker is currently running, so local duplicates need not poll Redis
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _digest(self, *parts: bytes) -> str:
+        return hmac.new(self.secret, b"\0".join(parts), hashlib.sha256).hexdigest()
+
+    async def _claim(self, key: str, request_hash: str) -> Optional[dict]:
+        """Claim the key; returns the existing record if someone else already has"""
+        pending = json.dumps({"state": "pending", "request": request_hash})
+        try:
+            existing = await redis_client.set(key, pending, nx=True, get=True, ex=self.lock_ttl)
+        except RedisError:
+            redis_fallbacks.inc(operation="idempotency")
+            existing = local_store.get(key)
+            if existing is None:
+                local_store.setex(key, self.lock_ttl, pending)
+        return json.loads(existing) if existing else None
+
+    async def _load(self, key: str) -> Optional[dict]:
+        try:
+            raw = await redis_client.get(key)
+        except RedisError:
+            redis_fallbacks.inc(operation="idempotency")
+            raw = local_store.get(key)
+        return json.loads(raw) if raw else None
+
+    async def _finish(self, key: str, record: Optional[dict]) -> None:
+        """Store the completed response, or drop the claim so a retry can run again"""
+        try:
+            if record is None:
+                await redis_client.delete(key)
+            else:
+                await redis_client.setex(key, self.ttl, json.dumps(record))
+            return
+        except RedisError:
+            redis_fallbacks.inc(operation="idempotency")
+        if record is None:
+            local_store.delete(key)
+        else:
+            local_store.setex(key, self.ttl, json.dumps(record))
+
+    async def _wait(self, key: str, fingerprint: str) -> Optional[dict]:
+        """Wait for the in-flight owner; None means its claim was released and may be retaken"""
+        deadline = time.monotonic() + self.wait_timeout
+        future = self._inflight.get(fingerprint)
+        if future is not None:
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), self.wait_timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError from None
+
+        # Owned by another worker: poll with backoff
+        delay = 0.02
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.5)
+            record = await self._load(key)
+            if record is None or record["state"] == "done":
+                return record
+        raise TimeoutError
+
+    async def _send_error(self, send, status_code: int, detail: str, error_code: str,
+                          headers: Optional[list] = None) -> None:
+        body = json.dumps({
+            "success": False,
+            "detail": detail,
+            "error_code": error_code,
+            "status_code": status_code
+        }).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *(headers or []),
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _replay(self, send, record: dict) -> None:
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in record["headers"]]
+        headers.append((b"idempotent-replayed", b"true"))
+        await send({"type": "http.response.start", "status": record["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": base64.b64decode(record["body"])})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        raw_key = headers.get(IDEMPOTENCY_HEADER)
+        if raw_key is None:
+            await self.app(scope, receive, send)
+            return
+        if not 1 <= len(raw_key) <= 255:
+            await self._send_error(send, 400, "Idempotency-Key must be 1-255 characters",
+                                   "INVALID_IDEMPOTENCY_KEY")
+            return
+
+        # The body is needed up front to detect a key reused for a different request
+        chunks, size, more_body = [], 0, True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            more_body = message.get("more_body", False)
+        body = b"".join(chunks)
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        if size > self.max_body:
+            await self.app(scope, replay_receive, send)
+            return
+
+        # Scoped to the caller so two users cannot collide on (or probe) each other's keys
+        fingerprint = self._digest(
+            scope["method"].encode(), scope["path"].encode(), headers.get(b"authorization", b""), raw_key
+        )
+        request_hash = self._digest(body)
+        key = RedisKeys.idempotency(fingerprint)
+
+        while True:
+            record = await self._claim(key, request_hash)
+            if record is None:
+                break
+            if not hmac.compare_digest(record["request"], request_hash):
+                idempotent_requests.inc(outcome="mismatch")
+                await self._send_error(send, 422, "Idempotency-Key was already used with a different request",
+                                       "IDEMPOTENCY_KEY_REUSED")
+                return
+            if record["state"] == "pending":
+                try:
+                    record = await self._wait(key, fingerprint)
+                except TimeoutError:
+                    idempotent_requests.inc(outcome="in_progress")
+                    await self._send_error(send, 409, "A request with this Idempotency-Key is still in progress",
+                                           "IDEMPOTENCY_KEY_IN_PROGRESS", [(b"retry-after", b"1")])
+                    return
+                if record is None:
+                    continue  # the first attempt failed; try to run it ourselves
+            idempotent_requests.inc(outcome="replayed")
+            await self._replay(send, record)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[fingerprint] = future
+        response = {"status": None, "headers": [], "body": [], "complete": False}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    [name.decode("latin-1"), value.decode("latin-1")] for name, value in message.get("headers", [])
+                ]
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+                response["complete"] = not message.get("more_body", False)
+            await send(message)
+
+        record = None
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        finally:
+            status_code = response["status"]
+            if response["complete"] and status_code < 500 and status_code not in UNCACHEABLE_STATUS:
+                record = {
+                    "state": "done",
+                    "request": request_hash,
+                    "status": status_code,
+                    "headers": response["headers"],
+                    # The Redis client decodes responses as text, so store base64
+                    "body": base64.b64encode(b"".join(response["body"])).decode(),
+                }
+            await self._finish(key, record)
+            idempotent_requests.inc(outcome="stored" if record else "released")
+            self._inflight.pop(fingerprint, None)
+            future.set_result(record)
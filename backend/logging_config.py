@@ -0,0 +1,138 @@
+# logging_config.py
+"""
+Non-blocking structured logging.
+
+Records are handed to a bounded in-memory queue on the calling thread and
+formatted/written by a QueueListener thread, so the event loop never pays
+for JSON encoding or stream I/O.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+# Attributes every LogRecord has; anything else was passed via ``extra=``
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+class JSONFormatter(logging.Formatter):
+    """Render log records as single-line JSON objects"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of sub-WARNING records for configured loggers"""
+
+    def __init__(self, rates: dict[str, float]):
+        super().__init__()
+        # Longest prefix first so "main.auth" wins over "main"
+        self.rates = sorted(rates.items(), key=lambda item: len(item[0]), reverse=True)
+
+    def _rate_for(self, name: str) -> float:
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                return rate
+        return 1.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate_for(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers formatting and drops records when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener thread formats; the default implementation would
+        # merge msg % args right here on the caller's thread.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level: str = "INFO", json_output: bool = True, queue_size: int = 10000,
+                  sample_rates: Optional[dict[str, float]] = None) -> logging.handlers.QueueListener:
+    """Route the root logger through a background QueueListener"""
+    global _listener, _queue_handler
+
+    if _listener is not None:
+        return _listener
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if json_output:
+        stream_handler.setFormatter(JSONFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter(sample_rates or {}))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(level.upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def dropped_records() -> int:
+    """Number of records discarded because the log queue was full"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def _restart_after_fork() -> None:
+    """The listener thread does not survive fork(); give the child its own"""
+    global _listener
+    if _listener is None:
+        return
+    log_queue: queue.Queue = queue.Queue(maxsize=_listener.queue.maxsize)
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,104 @@
+# loop_monitor.py
+"""
+Event-loop lag monitor and blocking-call detector.
+
+A probe task sleeps for a fixed interval and records how late it wakes up.
+A watchdog thread notices when the probe has not run for longer than the
+threshold and snapshots the loop thread's stack while it is still blocked,
+which points straight at the synchronous call responsible.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+loop_lag = registry.histogram(
+    "event_loop_lag_seconds", "Event-loop scheduling lag",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+loop_stalls = registry.counter(
+    "event_loop_stalls_total", "Loop stalls longer than the threshold, by blocking function", ("function",)
+)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.1, threshold: float = 0.1, max_reports: int = 50):
+        self.interval = interval
+        self.threshold = threshold
+        self.reports: deque = deque(maxlen=max_reports)
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._last_tick = time.monotonic()
+
+    async def _probe(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            loop_lag.observe(max(0.0, loop.time() - start - self.interval))
+            self._last_tick = time.monotonic()
+
+    def _watch(self) -> None:
+        reported_tick = None
+        while not self._stop.wait(self.threshold / 2):
+            last_tick = self._last_tick
+            stalled_for = time.monotonic() - last_tick - self.interval
+            if stalled_for < self.threshold or reported_tick == last_tick:
+                continue
+            # One report per stall
+            reported_tick = last_tick
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._report(frame, stalled_for)
+
+    def _report(self, frame, stalled_for: float) -> None:
+        stack = traceback.extract_stack(frame)[-20:]
+        # Innermost frame from our own code, falling back to the innermost frame
+        culprit = next(
+            (entry for entry in reversed(stack) if "site-packages" not in entry.filename),
+            stack[-1]
+        )
+        function = f"{culprit.name} ({culprit.filename.rsplit('/', 1)[-1]}:{culprit.lineno})"
+        loop_stalls.inc(function=function)
+        self.reports.append({
+            "detected_at": datetime.now(timezone.utc).isoformat(),
+            "blocked_for_ms": round(stalled_for * 1000, 1),
+            "function": function,
+            "stack": traceback.format_list(stack)
+        })
+        logger.warning("Event loop blocked for %.0f ms in %s", stalled_for * 1000, function)
+
+    def start(self) -> None:
+        """Start probing the running loop; call from inside the loop (e.g. lifespan)"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            await asyncio.to_thread(self._watchdog.join)
+            self._watchdog = None
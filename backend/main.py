@@ -1,7 +1,7 @@
 # backend/main.py - FIXED VERSION for Pydantic 2.0
 from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.exceptions import RequestValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -17,41 +17,83 @@ import logging
 from contextlib import asynccontextmanager
 
 # Import our modules
-from database import get_db, User, EmailVerification, PasswordReset, RefreshToken, LoginAttempt, settings
+from database import (
+    get_db, get_engine, dispose_engine, User, EmailVerification, PasswordReset, RefreshToken, LoginAttempt,
+    BackupCode, settings, slow_query_log
+)
 from auth_utils import (
     SecurityUtils, JWTManager, TwoFactorAuth, RateLimiter,
-    SessionManager, redis_client
+    SessionManager, RedisKeys, redis_client, redis_breaker, get_redis_client, close_redis_client
+)
+from email_service import email_service, email_outbox
+from logging_config import setup_logging, shutdown_logging
+from metrics import registry, MetricsMiddleware, CONTENT_TYPE_LATEST, rate_limit_rejections, api_errors
+from profiling import ProfilingMiddleware, ProfileStore, PROFILE_HEADER, sign_profile_token
+from loop_monitor import LoopLagMonitor
+from qr_service import QRCodeService, MEDIA_TYPES
+from admission import AdmissionControlMiddleware, RouteLimit
+from idempotency import IdempotencyMiddleware
+from user_import import IMPORT_FORMATS, UserImporter, detect_format, shutdown_hash_pool
+from data_export import EXPORT_FORMATS, ExportError, ExportPlan
+from pagination import CursorError, keyset_page
+from brute_force import COUNTED_REASONS, BruteForceDetector, decisions_enforced
+
+# Configure logging - records are formatted and written off the event loop
+setup_logging(
+    level=settings.log_level,
+    json_output=settings.log_json,
+    queue_size=settings.log_queue_size,
+    sample_rates=settings.log_sample_rates
 )
-from email_service import email_service
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+# Per-request auth chatter; sample it via LOG_SAMPLE_RATES='{"main.auth": 0.1}'
+auth_logger = logging.getLogger(f"{__name__}.auth")
 
 # Security
 security = HTTPBearer()
 
+# 2FA enrolment QR codes: rendered off-loop, cached per pending secret
+qr_service = QRCodeService(redis_client, settings.secret_key, settings.totp_setup_ttl_seconds)
+
+# Event-loop lag / blocking-call detection
+loop_monitor = LoopLagMonitor(
+    interval=settings.loop_monitor_interval_ms / 1000,
+    threshold=settings.loop_lag_threshold_ms / 1000
+)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
     # Startup
     logger.info("🚀 Starting EchoWerk Authentication API")
+
+    # Per-process resources are built here (after any fork), not at import
+    get_engine()
+    get_redis_client()
     try:
         # Test Redis connection
         await redis_client.ping()
         logger.info("✅ Redis connection established")
     except Exception as e:
-        logger.error(f"❌ Redis connection failed: {e}")
+        logger.error("❌ Redis connection failed: %s", e)
+
+    if settings.loop_monitor_enabled:
+        loop_monitor.start()
 
     yield
 
     # Shutdown
     logger.info("🛑 Shutting down EchoWerk API")
+    await loop_monitor.stop()
+    await email_outbox.close()
+    shutdown_hash_pool()
     try:
-        await redis_client.close()
+        await close_redis_client()
     except:
         pass
+    await dispose_engine()
+    shutdown_logging()
 
 
 # FastAPI app
@@ -62,7 +104,44 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Per-route concurrency limits; installed inside metrics so shed requests are still counted under their route
+if settings.admission_enabled:
+    app.add_middleware(
+        AdmissionControlMiddleware,
+        limits={route: RouteLimit(*limit) for route, limit in settings.admission_limits.items()}
+    )
+
+# Retried writes with an Idempotency-Key replay the stored response without taking an admission slot
+if settings.idempotency_enabled:
+    app.add_middleware(
+        IdempotencyMiddleware,
+        secret=settings.secret_key,
+        paths=settings.idempotency_paths,
+        ttl=settings.idempotency_ttl_seconds,
+        lock_ttl=settings.idempotency_lock_seconds,
+        wait_timeout=settings.idempotency_wait_seconds,
+        max_body=settings.idempotency_max_body_bytes
+    )
+
+# Request latency histograms per route template and status
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+# Request profiling - not installed at all unless enabled
+profile_store = ProfileStore(settings.profiling_dir, settings.profiling_max_files)
+if settings.profiling_enabled:
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        secret=settings.secret_key,
+        sample_rate=settings.profiling_sample_rate,
+        interval=settings.profiling_interval_ms / 1000,
+        output_format=settings.profiling_format
+    )
+
 # CORS Configuration - FIXED with more permissive settings
+# Added last so it is outermost: responses built by the middleware above (admission 503,
+# idempotency 409/422) must carry CORS headers too, or browsers cannot read them
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -74,6 +153,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["Retry-After"],  # not CORS-safelisted; the frontend needs it to back off
 )
 
 
@@ -128,6 +208,9 @@ class UserLogin(BaseModel):
     # FIXED: Optional fields with explicit None defaults for Pydantic 2.0
     totp_code: Optional[str] = None
     backup_code: Optional[str] = None
+    # Proof-of-work answer when a previous attempt returned requires_challenge
+    challenge: Optional[str] = None
+    challenge_solution: Optional[str] = None
 
     @field_validator('totp_code', 'backup_code', mode='before')
     @classmethod
@@ -166,6 +249,18 @@ class PasswordResetConfirm(BaseModel):
     new_password: str
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+class TwoFactorSetupRequest(BaseModel):
+    password: str
+
+
+class TwoFactorEnableRequest(BaseModel):
+    totp_code: str
+
+
 class UserResponse(BaseModel):
     id: str
     email: str
@@ -177,6 +272,36 @@ class UserResponse(BaseModel):
     created_at: datetime
     last_login: Optional[datetime] = None
 
+    @field_validator('id', mode='before')
+    @classmethod
+    def uuid_to_str(cls, v):
+        """The ORM hands out uuid.UUID; the API exposes strings"""
+        return str(v)
+
+    class Config:
+        from_attributes = True
+
+
+class AdminUserResponse(UserResponse):
+    is_active: bool
+    is_superuser: bool
+    updated_at: Optional[datetime] = None
+
+
+class LoginAttemptResponse(BaseModel):
+    id: str
+    email: str
+    ip_address: str
+    user_agent: Optional[str] = None
+    success: bool
+    failure_reason: Optional[str] = None
+    created_at: datetime
+
+    @field_validator('id', mode='before')
+    @classmethod
+    def uuid_to_str(cls, v):
+        return str(v)
+
     class Config:
         from_attributes = True
 
@@ -187,6 +312,8 @@ class LoginResponse(BaseModel):
     refresh_token: Optional[str] = None
     user: Optional[UserResponse] = None
     requires_2fa: Optional[bool] = None
+    requires_challenge: Optional[bool] = None
+    challenge: Optional[dict] = None
     message: str
 
 
@@ -201,14 +328,16 @@ class StandardResponse(BaseModel):
 # ================================
 
 class APIError(Exception):
-    def __init__(self, status_code: int, detail: str, error_code: str = None):
+    def __init__(self, status_code: int, detail: str, error_code: str = None, headers: Optional[dict] = None):
         self.status_code = status_code
         self.detail = detail
         self.error_code = error_code
+        self.headers = headers
 
 
 @app.exception_handler(APIError)
 async def api_error_handler(request: Request, exc: APIError):
+    api_errors.inc(error_code=exc.error_code or "UNKNOWN", status=exc.status_code)
     return JSONResponse(
         status_code=exc.status_code,
         content={
@@ -216,7 +345,8 @@ async def api_error_handler(request: Request, exc: APIError):
             "detail": exc.detail,
             "error_code": exc.error_code,
             "status_code": exc.status_code
-        }
+        },
+        headers=exc.headers
     )
 
 
@@ -243,8 +373,7 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         errors.append(f"{field}: {message}")
 
     error_message = "; ".join(errors)
-    logger.error(f"Validation error: {error_message}")
-    logger.error(f"Full validation errors: {exc.errors()}")
+    logger.warning("Validation error on %s: %s", request.url.path, error_message)
 
     return JSONResponse(
         status_code=422,
@@ -271,7 +400,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled exception: {exc}")
+    logger.error("Unhandled exception: %s", exc, exc_info=exc)
     return JSONResponse(
         status_code=500,
         content={
@@ -316,7 +445,7 @@ async def get_current_user(
         return user
 
     except Exception as e:
-        logger.error(f"Authentication error: {e}")
+        logger.error("Authentication error: %s", e)
         raise APIError(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -324,12 +453,24 @@ async def get_current_user(
         )
 
 
+async def get_current_superuser(current_user: User = Depends(get_current_user)) -> User:
+    """Require an authenticated superuser"""
+    if not current_user.is_superuser:
+        raise APIError(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator privileges required",
+            error_code="FORBIDDEN"
+        )
+    return current_user
+
+
 async def rate_limit_check(request: Request, limit: int = 5, window: int = 300):
     """Rate limiting dependency"""
     client_ip = request.client.host
-    key = f"rate_limit:{client_ip}"
+    key = RedisKeys.rate_limit(client_ip)
 
     if not await RateLimiter.check_rate_limit(key, limit, window):
+        rate_limit_rejections.inc(route=request.url.path)
         remaining = await RateLimiter.get_remaining_attempts(key, limit)
         raise APIError(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -338,6 +479,13 @@ async def rate_limit_check(request: Request, limit: int = 5, window: int = 300):
         )
 
 
+def rate_limited(limit: int, window: int):
+    """Dependency applying rate_limit_check with a per-route limit"""
+    async def dependency(request: Request) -> None:
+        await rate_limit_check(request, limit, window)
+    return dependency
+
+
 # ================================
 # UTILITY FUNCTIONS
 # ================================
@@ -355,6 +503,9 @@ async def log_login_attempt(db: AsyncSession, email: str, ip_address: str,
     db.add(attempt)
     await db.commit()
 
+    if not success and failure_reason in COUNTED_REASONS:
+        await BruteForceDetector.record_failure(email, ip_address)
+
 
 async def create_verification_token(db: AsyncSession, user_id: str) -> str:
     """Create email verification token"""
@@ -372,10 +523,53 @@ async def create_verification_token(db: AsyncSession, user_id: str) -> str:
     return token
 
 
+async def store_backup_codes(db: AsyncSession, user: User, codes: list[str]):
+    """Replace a user's backup codes with keyed digests of ``codes``"""
+    await db.execute(delete(BackupCode).where(BackupCode.user_id == user.id))
+    db.add_all([
+        BackupCode(user_id=user.id, code_hmac=TwoFactorAuth.backup_code_hmac(code)) for code in codes
+    ])
+    user.backup_codes = None
+
+
+async def consume_backup_code(db: AsyncSession, user: User, code: str) -> bool:
+    """Atomically mark a backup code as used; concurrent logins cannot both succeed"""
+    result = await db.execute(
+        update(BackupCode)
+        .where(
+            BackupCode.user_id == user.id,
+            BackupCode.code_hmac == TwoFactorAuth.backup_code_hmac(code),
+            BackupCode.used_at.is_(None)
+        )
+        .values(used_at=datetime.now(timezone.utc))
+        .returning(BackupCode.id)
+    )
+    if result.scalar_one_or_none() is not None:
+        await db.commit()
+        return True
+
+    if not user.backup_codes:
+        return False
+
+    # Legacy JSON blob: compare-and-swap so only one concurrent login can remove the code
+    is_valid, updated_codes = TwoFactorAuth.verify_backup_code(user.backup_codes, code)
+    if not is_valid:
+        return False
+    result = await db.execute(
+        update(User)
+        .where(User.id == user.id, User.backup_codes == user.backup_codes)
+        .values(backup_codes=updated_codes)
+        .returning(User.id)
+        .execution_options(synchronize_session=False)
+    )
+    swapped = result.scalar_one_or_none() is not None
+    await db.commit()
+    return swapped
+
+
 async def send_verification_email_async(email: str, token: str):
     """Send verification email in background"""
-    verification_link = f"http://localhost:3000/verify-email/{token}"
-    await email_service.send_verification_email(email, verification_link)
+    await email_service.send_verification_token(email, token)
 
 
 # ================================
@@ -411,10 +605,12 @@ async def health_check():
         await redis_client.ping()
         redis_status = "healthy"
     except:
-        redis_status = "unhealthy"
+        # Rate limiting and sessions keep working on the local fallback
+        redis_status = "degraded"
 
     return {
-        "status": "healthy",
+        "status": "healthy" if redis_status == "healthy" else "degraded",
+        "redis_circuit": redis_breaker.state,
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "services": {
             "api": "healthy",
@@ -424,18 +620,40 @@ async def health_check():
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus scrape endpoint"""
+    if not settings.metrics_enabled:
+        raise APIError(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Metrics are disabled",
+            error_code="NOT_FOUND"
+        )
+    if settings.metrics_token:
+        supplied = request.headers.get("authorization", "")
+        allowed = secrets.compare_digest(supplied.encode(), f"Bearer {settings.metrics_token}".encode())
+    else:
+        allowed = request.client is not None and request.client.host in ("127.0.0.1", "::1")
+    if not allowed:
+        raise APIError(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not allowed to read metrics",
+            error_code="FORBIDDEN"
+        )
+    return PlainTextResponse(registry.generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.post("/auth/register", response_model=StandardResponse)
 async def register_user(
         user_data: UserRegister,
         background_tasks: BackgroundTasks,
         request: Request,
         db: AsyncSession = Depends(get_db),
-        _: None = Depends(lambda r: rate_limit_check(r, 3, 300))
+        _: None = Depends(rate_limited(3, 300))
 ):
     """Register new user with email verification"""
 
-    logger.info(f"Registration attempt for email: {user_data.email}")
-    logger.info(f"Registration data: {user_data.model_dump(exclude={'password'})}")
+    auth_logger.info("Registration attempt", extra={"email": user_data.email, "username": user_data.username})
 
     try:
         # Check if user already exists
@@ -475,7 +693,7 @@ async def register_user(
         # Send verification email in background
         background_tasks.add_task(send_verification_email_async, user.email, token)
 
-        logger.info(f"✅ User registered successfully: {user.email}")
+        auth_logger.info("✅ User registered successfully: %s", user.email)
 
         return StandardResponse(
             success=True,
@@ -486,7 +704,7 @@ async def register_user(
     except APIError:
         raise
     except Exception as e:
-        logger.error(f"Registration error: {e}")
+        logger.error("Registration error: %s", e)
         raise APIError(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Registration failed due to server error",
@@ -499,17 +717,43 @@ async def login_user(
         login_data: UserLogin,
         request: Request,
         db: AsyncSession = Depends(get_db),
-        _: None = Depends(lambda r: rate_limit_check(r, 5, 300))
+        _: None = Depends(rate_limited(5, 300))
 ):
     """Authenticate user with optional 2FA"""
 
     client_ip = request.client.host
     user_agent = request.headers.get("user-agent", "")
 
-    logger.info(f"Login attempt for email: {login_data.email}")
-    logger.info(f"Login data: {login_data.model_dump(exclude={'password'})}")
+    auth_logger.info("Login attempt", extra={
+        "email": login_data.email,
+        "has_totp": login_data.totp_code is not None,
+        "has_backup_code": login_data.backup_code is not None
+    })
 
     try:
+        # Standing brute-force decisions and account lockout, checked before any password hashing
+        decision = await BruteForceDetector.check(login_data.email, client_ip)
+        if decision is not None and decision.action != "challenge":
+            decisions_enforced.inc(action=decision.action)
+            # Logged but not counted as a failure: no password was checked
+            await log_login_attempt(db, login_data.email, client_ip, user_agent, False, f"brute_force_{decision.action}")
+            retry_after = max(decision.retry_after, 1)
+            raise APIError(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Too many failed login attempts. Try again in {retry_after} seconds.",
+                error_code={"delay": "LOGIN_DELAYED", "lockout": "ACCOUNT_LOCKED"}.get(decision.action, "LOGIN_BLOCKED"),
+                headers={"Retry-After": str(retry_after)}
+            )
+        if decision is not None and not await BruteForceDetector.verify_challenge(
+                login_data.email, login_data.challenge, login_data.challenge_solution):
+            decisions_enforced.inc(action="challenge")
+            return LoginResponse(
+                success=False,
+                requires_challenge=True,
+                challenge=BruteForceDetector.issue_challenge(login_data.email),
+                message="Solve the challenge and retry"
+            )
+
         # Find user
         result = await db.execute(select(User).where(User.email == login_data.email))
         user = result.scalar_one_or_none()
@@ -549,7 +793,7 @@ async def login_user(
 
             # Verify 2FA
             if login_data.totp_code:
-                if not TwoFactorAuth.verify_totp(user.totp_secret, login_data.totp_code):
+                if not await TwoFactorAuth.verify_totp_once(str(user.id), user.totp_secret, login_data.totp_code):
                     await log_login_attempt(db, login_data.email, client_ip, user_agent, False, "invalid_2fa")
                     raise APIError(
                         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -557,17 +801,8 @@ async def login_user(
                         error_code="INVALID_2FA"
                     )
             elif login_data.backup_code:
-                if not user.backup_codes:
-                    await log_login_attempt(db, login_data.email, client_ip, user_agent, False, "no_backup_codes")
-                    raise APIError(
-                        status_code=status.HTTP_401_UNAUTHORIZED,
-                        detail="No backup codes available",
-                        error_code="NO_BACKUP_CODES"
-                    )
-
-                # Verify and remove used backup code
-                is_valid, updated_codes = TwoFactorAuth.verify_backup_code(user.backup_codes, login_data.backup_code)
-                if not is_valid:
+                # Verify and consume the backup code in a single UPDATE ... RETURNING
+                if not await consume_backup_code(db, user, login_data.backup_code):
                     await log_login_attempt(db, login_data.email, client_ip, user_agent, False, "invalid_backup_code")
                     raise APIError(
                         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -575,10 +810,6 @@ async def login_user(
                         error_code="INVALID_BACKUP_CODE"
                     )
 
-                # Update user's backup codes
-                user.backup_codes = updated_codes
-                await db.commit()
-
         # Successful login - create tokens
         token_data = {"sub": str(user.id), "email": user.email}
         access_token = JWTManager.create_access_token(token_data)
@@ -593,13 +824,18 @@ async def login_user(
         )
         db.add(refresh_token_obj)
 
+        # Imported bcrypt hashes and outdated Argon2 parameters are upgraded while we have the plaintext
+        if SecurityUtils.needs_rehash(user.hashed_password):
+            user.hashed_password = SecurityUtils.hash_password(login_data.password)
+
         # Update last login
         user.last_login = datetime.now(timezone.utc)
         await db.commit()
 
         await log_login_attempt(db, login_data.email, client_ip, user_agent, True)
+        await BruteForceDetector.record_success(login_data.email)
 
-        logger.info(f"✅ User logged in successfully: {user.email}")
+        auth_logger.info("✅ User logged in successfully: %s", user.email)
 
         return LoginResponse(
             success=True,
@@ -612,7 +848,7 @@ async def login_user(
     except APIError:
         raise
     except Exception as e:
-        logger.error(f"Login error: {e}")
+        logger.error("Login error: %s", e)
         raise APIError(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Login failed due to server error",
@@ -659,7 +895,7 @@ async def verify_email(token: str, db: AsyncSession = Depends(get_db)):
     verification.is_used = True
     await db.commit()
 
-    logger.info(f"✅ Email verified for user: {verification.user_id}")
+    logger.info("✅ Email verified for user: %s", verification.user_id)
 
     # Return success HTML page
     return HTMLResponse(content=f"""
@@ -726,19 +962,391 @@ async def verify_email(token: str, db: AsyncSession = Depends(get_db)):
     """, status_code=200)
 
 
+@app.post("/auth/refresh", response_model=LoginResponse)
+async def refresh_access_token(refresh_data: RefreshRequest, db: AsyncSession = Depends(get_db)):
+    """Rotate a stored, unrevoked refresh token: the old one is revoked and a new pair issued"""
+    try:
+        payload = JWTManager.verify_token(refresh_data.refresh_token, "refresh")
+    except HTTPException:
+        payload = None
+
+    rotated = None
+    if payload is not None:
+        # Revoke in the same statement that checks it, so a token can only be used once
+        result = await db.execute(
+            update(RefreshToken)
+            .where(
+                RefreshToken.token == refresh_data.refresh_token,
+                RefreshToken.is_revoked == False,
+                RefreshToken.expires_at > datetime.now(timezone.utc)
+            )
+            .values(is_revoked=True)
+            .returning(RefreshToken.user_id, RefreshToken.device_info)
+        )
+        rotated = result.one_or_none()
+
+    if rotated is None:
+        raise APIError(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            error_code="INVALID_REFRESH_TOKEN"
+        )
+
+    token_data = {"sub": payload["sub"], "email": payload.get("email")}
+    access_token = JWTManager.create_access_token(token_data)
+    refresh_token = JWTManager.create_refresh_token(token_data)
+    db.add(RefreshToken(
+        user_id=rotated.user_id,
+        token=refresh_token,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=settings.refresh_token_expire_days),
+        device_info=rotated.device_info
+    ))
+    await db.commit()
+
+    return LoginResponse(
+        success=True,
+        access_token=access_token,
+        refresh_token=refresh_token,
+        message="Token refreshed"
+    )
+
+
 @app.get("/auth/me", response_model=UserResponse)
 async def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Get current user information"""
     return UserResponse.model_validate(current_user)
 
 
+# ================================
+# TWO-FACTOR ENROLMENT
+# ================================
+
+@app.post("/auth/2fa/setup", response_model=StandardResponse)
+async def setup_2fa(setup_data: TwoFactorSetupRequest, current_user: User = Depends(get_current_user)):
+    """Start 2FA enrolment; reloading the setup page reuses the pending secret"""
+    if current_user.is_2fa_enabled:
+        raise APIError(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Two-factor authentication is already enabled",
+            error_code="2FA_ALREADY_ENABLED"
+        )
+
+    if not SecurityUtils.verify_password(setup_data.password, current_user.hashed_password):
+        raise APIError(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid password",
+            error_code="INVALID_CREDENTIALS"
+        )
+
+    secret = await TwoFactorAuth.get_or_create_pending_secret(str(current_user.id))
+    return StandardResponse(
+        success=True,
+        message="Scan the QR code with your authenticator app, then confirm with a code",
+        data={
+            "secret": secret,
+            "provisioning_uri": TwoFactorAuth.provisioning_uri(secret, current_user.email),
+            "qr_code_url": "/auth/2fa/qr?format=svg",
+            "expires_in": settings.totp_setup_ttl_seconds
+        }
+    )
+
+
+@app.get("/auth/2fa/qr")
+async def get_2fa_qr_code(request: Request, format: str = "svg", current_user: User = Depends(get_current_user)):
+    """QR code for the pending 2FA secret (SVG by default, PNG on request)"""
+    if format not in MEDIA_TYPES:
+        raise APIError(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Format must be 'svg' or 'png'",
+            error_code="INVALID_FORMAT"
+        )
+
+    secret = await TwoFactorAuth.get_pending_secret(str(current_user.id))
+    if not secret:
+        raise APIError(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No pending 2FA setup; start again",
+            error_code="NO_PENDING_2FA"
+        )
+
+    provisioning_uri = TwoFactorAuth.provisioning_uri(secret, current_user.email)
+    etag = qr_service.etag(provisioning_uri, format)
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={settings.totp_setup_ttl_seconds}"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    image, _ = await qr_service.render(provisioning_uri, format)
+    return Response(content=image, media_type=MEDIA_TYPES[format], headers=headers)
+
+
+@app.post("/auth/2fa/enable", response_model=StandardResponse)
+async def enable_2fa(
+        enable_data: TwoFactorEnableRequest,
+        current_user: User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    """Confirm the pending secret with a TOTP code and turn 2FA on"""
+    user_id = str(current_user.id)
+    secret = await TwoFactorAuth.get_pending_secret(user_id)
+    if not secret:
+        raise APIError(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No pending 2FA setup; start again",
+            error_code="NO_PENDING_2FA"
+        )
+
+    if not await TwoFactorAuth.verify_totp_once(user_id, secret, enable_data.totp_code):
+        raise APIError(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid 2FA code",
+            error_code="INVALID_2FA"
+        )
+
+    backup_codes = TwoFactorAuth.generate_backup_codes()
+    current_user.totp_secret = secret
+    current_user.is_2fa_enabled = True
+    db.add(current_user)
+    await store_backup_codes(db, current_user, backup_codes)
+    await db.commit()
+
+    await TwoFactorAuth.clear_pending_secret(user_id)
+    await qr_service.invalidate(TwoFactorAuth.provisioning_uri(secret, current_user.email))
+
+    return StandardResponse(
+        success=True,
+        message="Two-factor authentication enabled. Store your backup codes safely.",
+        data={"backup_codes": backup_codes}
+    )
+
+
+# ================================
+# ADMIN ROUTES
+# ================================
+
+@app.get("/admin/loop-stalls")
+async def list_loop_stalls(admin: User = Depends(get_current_superuser)):
+    """Recent event-loop stalls with the stack that was blocking"""
+    return StandardResponse(
+        success=True,
+        message=f"{len(loop_monitor.reports)} stalls recorded",
+        data={
+            "threshold_ms": settings.loop_lag_threshold_ms,
+            "stalls": list(reversed(loop_monitor.reports))
+        }
+    )
+
+
+@app.get("/admin/slow-queries")
+async def list_slow_queries(limit: int = 50, admin: User = Depends(get_current_superuser)):
+    """Slowest statements by total time, with captured EXPLAIN plans"""
+    entries = slow_query_log.report(limit)
+    return StandardResponse(
+        success=True,
+        message=f"{len(entries)} slow statements",
+        data={
+            "threshold_ms": settings.slow_query_threshold_ms,
+            "explain_enabled": settings.slow_query_explain,
+            "statements": entries
+        }
+    )
+
+
+@app.post("/admin/users/import")
+async def import_users(
+        request: Request,
+        format: Optional[str] = None,
+        send_verification: bool = True,
+        db: AsyncSession = Depends(get_db),
+        admin: User = Depends(get_current_superuser)
+):
+    """Bulk-create users from a streamed CSV or NDJSON body"""
+    import_format = format or detect_format(request.headers.get("content-type", ""))
+    if import_format not in IMPORT_FORMATS:
+        raise APIError(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson",
+            error_code="UNSUPPORTED_FORMAT"
+        )
+
+    importer = UserImporter(
+        db,
+        send_verification=send_verification_email_async if send_verification else None
+    )
+    report = await importer.run(request.stream(), import_format)
+    logger.info("User import by %s: %d received, %d inserted, %d conflicts, %d invalid",
+                admin.email, report.received, report.inserted, report.conflicts, report.invalid)
+    return StandardResponse(
+        success=True,
+        message=f"{report.inserted} of {report.received} users imported",
+        data=report.to_dict()
+    )
+
+
+async def admin_page(db: AsyncSession, stmt, model, response_model, cursor: Optional[str], limit: int) -> StandardResponse:
+    """Run a keyset page query and wrap it with its cursor and timing"""
+    limit = max(1, min(limit, settings.admin_page_max_rows))
+    try:
+        page = await keyset_page(db, stmt, model, cursor, limit)
+    except CursorError as e:
+        raise APIError(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+            error_code="INVALID_CURSOR"
+        )
+    return StandardResponse(
+        success=True,
+        message=f"{len(page.items)} rows",
+        data={
+            "items": [response_model.model_validate(item).model_dump(mode="json") for item in page.items],
+            "next_cursor": page.next_cursor,
+            "limit": limit,
+            "query_ms": page.query_ms
+        }
+    )
+
+
+@app.get("/admin/users")
+async def list_users(
+        email: Optional[EmailStr] = None,
+        is_active: Optional[bool] = None,
+        is_verified: Optional[bool] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        db: AsyncSession = Depends(get_db),
+        admin: User = Depends(get_current_superuser)
+):
+    """Users newest first; follow data.next_cursor for the next page"""
+    stmt = select(User)
+    if email is not None:
+        stmt = stmt.where(User.email == email)
+    if is_active is not None:
+        stmt = stmt.where(User.is_active == is_active)
+    if is_verified is not None:
+        stmt = stmt.where(User.is_verified == is_verified)
+    if since is not None:
+        stmt = stmt.where(User.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(User.created_at < until)
+    return await admin_page(db, stmt, User, AdminUserResponse, cursor, limit)
+
+
+@app.get("/admin/login-attempts")
+async def list_login_attempts(
+        email: Optional[str] = None,
+        ip: Optional[str] = None,
+        success: Optional[bool] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        limit: int = 50,
+        db: AsyncSession = Depends(get_db),
+        admin: User = Depends(get_current_superuser)
+):
+    """Login attempts newest first, by email and/or source IP; follow data.next_cursor for the next page"""
+    stmt = select(LoginAttempt)
+    if email is not None:
+        stmt = stmt.where(LoginAttempt.email == email)
+    if ip is not None:
+        stmt = stmt.where(LoginAttempt.ip_address == ip)
+    if success is not None:
+        stmt = stmt.where(LoginAttempt.success == success)
+    if since is not None:
+        stmt = stmt.where(LoginAttempt.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(LoginAttempt.created_at < until)
+    return await admin_page(db, stmt, LoginAttempt, LoginAttemptResponse, cursor, limit)
+
+
+@app.get("/admin/export/{table}")
+async def export_table(
+        table: str,
+        format: str = "ndjson",
+        columns: Optional[str] = None,
+        after: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        gzip: bool = False,
+        db: AsyncSession = Depends(get_db),
+        admin: User = Depends(get_current_superuser)
+):
+    """Stream users or login_attempts in (created_at, id) order; resume with ?after=<created_at>,<id>"""
+    try:
+        plan = ExportPlan(
+            table, format, columns.split(",") if columns else None,
+            after=after, since=since, until=until, limit=limit
+        )
+    except ExportError as e:
+        raise APIError(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+            error_code="INVALID_EXPORT"
+        )
+
+    logger.info("Export of %s started by %s", table, admin.email)
+    # The body is produced after this handler returns, on its own connection;
+    # give back the one the superuser lookup holds (SQLite has only one)
+    await db.close()
+
+    filename = f"{table}-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.{format}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        plan.stream(compress=gzip),
+        media_type="application/gzip" if gzip else EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+class ProfileTokenRequest(BaseModel):
+    path: str
+    ttl: int = Field(default=300, gt=0, le=3600)
+
+
+@app.get("/admin/profiles")
+async def list_profiles(admin: User = Depends(get_current_superuser)):
+    """List stored request profiles, newest first"""
+    entries = await asyncio.to_thread(profile_store.entries)
+    return StandardResponse(
+        success=True,
+        message=f"{len(entries)} profiles stored",
+        data={"enabled": settings.profiling_enabled, "profiles": entries}
+    )
+
+
+@app.get("/admin/profiles/{name}")
+async def get_profile(name: str, admin: User = Depends(get_current_superuser)):
+    """Download a stored profile (collapsed stacks or speedscope JSON)"""
+    content = await asyncio.to_thread(profile_store.read, name)
+    if content is None:
+        raise APIError(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found",
+            error_code="NOT_FOUND"
+        )
+    media_type = "application/json" if name.endswith(".json") else "text/plain"
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}"'}
+    )
+
+
+@app.post("/admin/profiles/token")
+async def create_profile_token(token_request: ProfileTokenRequest, admin: User = Depends(get_current_superuser)):
+    """Mint a signed header value that forces profiling of one path"""
+    return StandardResponse(
+        success=True,
+        message=f"Send the token in the {PROFILE_HEADER} header",
+        data={
+            "header": PROFILE_HEADER,
+            "token": sign_profile_token(settings.secret_key, token_request.path, token_request.ttl)
+        }
+    )
+
+
 if __name__ == "__main__":
-    import uvicorn
-
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True,
-        log_level="info"
-    )
\ No newline at end of file
+    # Production launcher; use `python server.py --reload` for development
+    from server import main as run_server
+
+    run_server()
\ No newline at end of file
@@ -0,0 +1,450 @@
+# memory_redis.py
+"""
+In-process stand-in for redis.asyncio, selected with REDIS_URL=memory://.
+
+Implements the commands the backend uses (strings, counters, sets,
+HyperLogLogs (exact), expiry, KEYS/SCAN, pipelines) with Redis reply
+semantics, on top of redis-py's own command mixins so call signatures are
+identical. Clients built from the same URL share one store per process;
+the data does not leave the process, so with more than one worker every
+worker sees its own keyspace.
+
+    memory://                       default store, no latency
+    memory://bench?latency_ms=0.5&jitter_ms=0.2
+
+Latency, when configured, is charged once per round trip (per command or
+per pipeline), like a network hop to a real server.
+"""
+import asyncio
+import fnmatch
+import heapq
+import random
+import sys
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from redis.commands.core import AsyncCoreCommands
+from redis.exceptions import ResponseError
+
+WRONGTYPE = "WRONGTYPE Operation against a key holding the wrong kind of value"
+NOT_AN_INTEGER = "ERR value is not an integer or out of range"
+
+_stores: dict[str, "MemoryStore"] = {}
+
+
+def _decode(value) -> str:
+    if isinstance(value, bytes):
+        return value.decode()
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+class _HyperLogLog:
+    """PFADD/PFCOUNT value; kept exact here, since memory:// keyspaces are small"""
+    __slots__ = ("members",)
+
+    def __init__(self):
+        self.members: set[str] = set()
+
+
+class MemoryStore:
+    """Keyspace with Redis expiry semantics; every command runs without yielding, so each is atomic"""
+
+    def __init__(self):
+        self._data: dict[str, object] = {}
+        self._expires: dict[str, float] = {}  # key -> unix time
+        self._expiry_heap: list[tuple[float, str]] = []
+        self._scans: OrderedDict[int, list[str]] = OrderedDict()
+        self._next_cursor = 1
+        self._commands = {
+            "PING": self._ping,
+            "GET": self._get,
+            "MGET": lambda *keys: [value if isinstance(value, str) else None for value in map(self._lookup, keys)],
+            "SET": self._set,
+            "SETEX": self._setex,
+            "GETEX": self._getex,
+            "INCR": lambda key: self._incrby(key, 1),
+            "INCRBY": self._incrby,
+            "DECR": lambda key: self._incrby(key, -1),
+            "DECRBY": lambda key, amount: self._incrby(key, -int(amount)),
+            "DEL": self._delete,
+            "UNLINK": self._delete,
+            "EXISTS": self._exists,
+            "EXPIRE": lambda key, seconds, *flags: self._expire(key, float(seconds), flags),
+            "PEXPIRE": lambda key, millis, *flags: self._expire(key, float(millis) / 1000, flags),
+            "PERSIST": self._persist,
+            "TTL": lambda key: self._ttl(key, 1),
+            "PTTL": lambda key: self._ttl(key, 1000),
+            "TYPE": self._type,
+            "KEYS": self._keys,
+            "SCAN": self._scan,
+            "SADD": self._sadd,
+            "SREM": self._srem,
+            "SMEMBERS": self._smembers,
+            "SCARD": lambda key: len(self._lookup_set(key)),
+            "SISMEMBER": lambda key, member: member in self._lookup_set(key),
+            "PFADD": self._pfadd,
+            "PFCOUNT": lambda *keys: len(set().union(*(self._lookup_hll(key).members for key in keys))),
+            "DBSIZE": self._dbsize,
+            "FLUSHDB": self._flush,
+            "FLUSHALL": self._flush,
+            "MEMORY USAGE": self._memory_usage,
+        }
+
+    # -- dispatch ---------------------------------------------------------
+
+    def call(self, *args, **options):
+        """Run one command; arguments are what redis-py would put on the wire"""
+        name = _decode(args[0]).upper()
+        args = [_decode(arg) for arg in args[1:]]
+        if name == "MEMORY" and args:
+            name = f"{name} {args.pop(0).upper()}"
+        handler = self._commands.get(name)
+        if handler is None:
+            raise ResponseError(f"ERR unknown command '{name}' for memory:// backend")
+        self._expire_due()
+        return handler(*args)
+
+    # -- expiry -----------------------------------------------------------
+
+    def _expire_due(self) -> None:
+        """Active expiry of keys whose deadline has passed"""
+        now = time.time()
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            deadline, key = heapq.heappop(heap)
+            if self._expires.get(key) == deadline:
+                self._remove(key)
+        # Sliding TTLs leave stale heap entries behind; rebuild once they dominate
+        if len(heap) > 2 * len(self._expires) + 1024:
+            self._expiry_heap = [(deadline, key) for key, deadline in self._expires.items()]
+            heapq.heapify(self._expiry_heap)
+
+    def _set_expiry(self, key: str, deadline: Optional[float]) -> None:
+        if deadline is None:
+            self._expires.pop(key, None)
+            return
+        self._expires[key] = deadline
+        heapq.heappush(self._expiry_heap, (deadline, key))
+
+    def _remove(self, key: str) -> bool:
+        self._expires.pop(key, None)
+        return self._data.pop(key, None) is not None
+
+    def _lookup(self, key: str):
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.time():
+            self._remove(key)
+            return None
+        return self._data.get(key)
+
+    def _lookup_str(self, key: str) -> Optional[str]:
+        value = self._lookup(key)
+        if value is not None and not isinstance(value, str):
+            raise ResponseError(WRONGTYPE)
+        return value
+
+    def _lookup_set(self, key: str) -> set:
+        value = self._lookup(key)
+        if value is None:
+            return set()
+        if not isinstance(value, set):
+            raise ResponseError(WRONGTYPE)
+        return value
+
+    def _lookup_hll(self, key: str) -> _HyperLogLog:
+        value = self._lookup(key)
+        if value is None:
+            return _HyperLogLog()
+        if not isinstance(value, _HyperLogLog):
+            raise ResponseError(WRONGTYPE)
+        return value
+
+    @staticmethod
+    def _parse_expiry(options: list[str]) -> tuple[Optional[float], list[str]]:
+        """Pull EX/PX/EXAT/PXAT out of an option list; returns (unix deadline, remaining flags)"""
+        deadline, flags = None, []
+        options = iter(options)
+        for option in options:
+            upper = option.upper()
+            if upper in ("EX", "PX", "EXAT", "PXAT"):
+                value = float(next(options))
+                if value <= 0 and upper in ("EX", "PX"):
+                    raise ResponseError("ERR invalid expire time in 'set' command")
+                if upper.startswith("P"):
+                    value /= 1000
+                deadline = value if upper.endswith("AT") else time.time() + value
+            else:
+                flags.append(upper)
+        return deadline, flags
+
+    # -- commands ---------------------------------------------------------
+
+    def _ping(self, *_):
+        return True
+
+    def _get(self, key):
+        return self._lookup_str(key)
+
+    def _set(self, key, value, *options):
+        deadline, flags = self._parse_expiry(list(options))
+        existing = self._lookup(key)
+        if "GET" in flags and existing is not None and not isinstance(existing, str):
+            raise ResponseError(WRONGTYPE)
+        reply = existing if "GET" in flags else True
+        if ("NX" in flags and existing is not None) or ("XX" in flags and existing is None):
+            return existing if "GET" in flags else None
+        keep = self._expires.get(key) if "KEEPTTL" in flags else None
+        self._data[key] = value
+        self._set_expiry(key, deadline if deadline is not None else keep)
+        return reply
+
+    def _setex(self, key, seconds, value):
+        return self._set(key, value, "EX", seconds)
+
+    def _getex(self, key, *options):
+        value = self._lookup_str(key)
+        if value is not None and options:
+            deadline, flags = self._parse_expiry(list(options))
+            if deadline is not None or "PERSIST" in flags:
+                self._set_expiry(key, deadline)
+        return value
+
+    def _incrby(self, key, amount):
+        current = self._lookup_str(key)
+        try:
+            value = int(current or 0) + int(amount)
+        except ValueError:
+            raise ResponseError(NOT_AN_INTEGER) from None
+        self._data[key] = str(value)  # the TTL, if any, is kept
+        return value
+
+    def _delete(self, *keys):
+        return sum(1 for key in keys if self._lookup(key) is not None and self._remove(key))
+
+    def _exists(self, *keys):
+        return sum(1 for key in keys if self._lookup(key) is not None)
+
+    def _expire(self, key, seconds, flags):
+        if self._lookup(key) is None:
+            return False
+        current = self._expires.get(key)
+        deadline = time.time() + seconds
+        flags = {flag.upper() for flag in flags}
+        if ("NX" in flags and current is not None) or ("XX" in flags and current is None):
+            return False
+        if "GT" in flags and (current is None or deadline <= current):
+            return False
+        if "LT" in flags and current is not None and deadline >= current:
+            return False
+        if seconds <= 0:
+            self._remove(key)
+        else:
+            self._set_expiry(key, deadline)
+        return True
+
+    def _persist(self, key):
+        if self._lookup(key) is None or key not in self._expires:
+            return False
+        self._set_expiry(key, None)
+        return True
+
+    def _ttl(self, key, scale):
+        if self._lookup(key) is None:
+            return -2
+        deadline = self._expires.get(key)
+        if deadline is None:
+            return -1
+        return max(0, round((deadline - time.time()) * scale))
+
+    def _type(self, key):
+        value = self._lookup(key)
+        if value is None:
+            return "none"
+        return "set" if isinstance(value, set) else "string"
+
+    def _live_keys(self, pattern: str = "*", type_name: Optional[str] = None) -> list[str]:
+        keys = [key for key in list(self._data) if self._lookup(key) is not None]
+        if pattern != "*":
+            keys = [key for key in keys if fnmatch.fnmatchcase(key, pattern)]
+        if type_name:
+            keys = [key for key in keys if self._type(key) == type_name.lower()]
+        return keys
+
+    def _keys(self, pattern="*"):
+        return self._live_keys(pattern)
+
+    def _scan(self, cursor, *options):
+        """
+        Cursor over a snapshot of the keyspace taken at cursor 0: keys present
+        for the whole iteration are returned exactly once, as Redis guarantees.
+        """
+        pattern, count, type_name = "*", 10, None
+        options = iter(options)
+        for option in options:
+            upper = option.upper()
+            if upper == "MATCH":
+                pattern = next(options)
+            elif upper == "COUNT":
+                count = int(next(options))
+            elif upper == "TYPE":
+                type_name = next(options)
+
+        cursor = int(cursor)
+        if cursor == 0:
+            remaining = list(self._data)
+        else:
+            remaining = self._scans.pop(cursor, [])
+        batch, remaining = remaining[:count], remaining[count:]
+
+        keys = [
+            key for key in batch
+            if self._lookup(key) is not None
+            and (pattern == "*" or fnmatch.fnmatchcase(key, pattern))
+            and (type_name is None or self._type(key) == type_name.lower())
+        ]
+        if not remaining:
+            return 0, keys
+        next_cursor = self._next_cursor
+        self._next_cursor += 1
+        self._scans[next_cursor] = remaining
+        while len(self._scans) > 256:  # abandoned iterations
+            self._scans.popitem(last=False)
+        return next_cursor, keys
+
+    def _sadd(self, key, *members):
+        current = self._lookup_set(key)
+        if key not in self._data:
+            self._data[key] = current
+        before = len(current)
+        current.update(members)
+        return len(current) - before
+
+    def _srem(self, key, *members):
+        current = self._lookup_set(key)
+        before = len(current)
+        current.difference_update(members)
+        if not current:
+            self._remove(key)  # Redis deletes empty sets
+        return before - len(current)
+
+    def _smembers(self, key):
+        return set(self._lookup_set(key))
+
+    def _pfadd(self, key, *elements):
+        hll = self._lookup_hll(key)
+        created = key not in self._data
+        if created:
+            self._data[key] = hll
+        before = len(hll.members)
+        hll.members.update(elements)
+        return int(created or len(hll.members) != before)
+
+    def _dbsize(self):
+        return len(self._live_keys())
+
+    def _flush(self, *_):
+        self._data.clear()
+        self._expires.clear()
+        self._expiry_heap.clear()
+        self._scans.clear()
+        return True
+
+    def _memory_usage(self, key, *_):
+        value = self._lookup(key)
+        if value is None:
+            return None
+        size = sys.getsizeof(key) + sys.getsizeof(value)
+        if isinstance(value, set):
+            size += sum(sys.getsizeof(member) for member in value)
+        elif isinstance(value, _HyperLogLog):
+            size = 12304  # a dense Redis HLL: fixed size whatever the cardinality
+        return size
+
+
+class MemoryRedis(AsyncCoreCommands):
+    """redis.asyncio.Redis look-alike backed by a MemoryStore"""
+
+    def __init__(self, store: Optional[MemoryStore] = None, latency: float = 0.0, jitter: float = 0.0):
+        self.store = store if store is not None else MemoryStore()
+        self.latency = latency
+        self.jitter = jitter
+
+    @classmethod
+    def from_url(cls, url: str, **_options) -> "MemoryRedis":
+        """Build a client for memory://[name][?latency_ms=..&jitter_ms=..]; socket options are ignored"""
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        name = parsed.netloc or parsed.path.strip("/") or "default"
+        store = _stores.setdefault(name, MemoryStore())
+        return cls(
+            store,
+            latency=float(query.get("latency_ms", ["0"])[0]) / 1000,
+            jitter=float(query.get("jitter_ms", ["0"])[0]) / 1000
+        )
+
+    async def round_trip(self) -> None:
+        """Charge the configured network latency"""
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+    async def execute_command(self, *args, **options):
+        await self.round_trip()
+        return self.store.call(*args, **options)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> "MemoryPipeline":
+        return MemoryPipeline(self)
+
+    async def close(self, close_connection_pool: Optional[bool] = None) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+class MemoryPipeline(AsyncCoreCommands):
+    """Queues commands and runs them in one round trip; no other command can interleave"""
+
+    def __init__(self, client: MemoryRedis):
+        self.client = client
+        self.command_stack: list[tuple[tuple, dict]] = []
+
+    def execute_command(self, *args, **options) -> "MemoryPipeline":
+        self.command_stack.append((args, options))
+        return self
+
+    async def execute(self, raise_on_error: bool = True) -> list:
+        stack, self.command_stack = self.command_stack, []
+        await self.client.round_trip()
+        results = []
+        for args, options in stack:
+            try:
+                results.append(self.client.store.call(*args, **options))
+            except ResponseError as e:
+                results.append(e)
+        if raise_on_error:
+            for result in results:
+                if isinstance(result, ResponseError):
+                    raise result
+        return results
+
+    def reset(self) -> None:
+        self.command_stack = []
+
+    def __len__(self) -> int:
+        return len(self.command_stack)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.reset()
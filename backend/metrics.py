@@ -0,0 +1,283 @@
+# metrics.py
+"""
+Minimal Prometheus-compatible metrics.
+
+Counters and histograms write into per-thread shards, so recording a sample
+never takes a lock - not on the event loop and not in executor threads.
+Shards are only merged when /metrics is scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4"  # charset is appended by the response class
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: list[dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        """Return the calling thread's private series dict"""
+        try:
+            return self._local.values
+        except AttributeError:
+            values: dict = {}
+            with self._shards_lock:  # once per thread, never on the hot path
+                self._shards.append(values)
+            self._local.values = values
+            return values
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def expose(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0.0) + amount
+
+    def collect(self) -> dict[tuple, float]:
+        totals: dict[tuple, float] = {}
+        for shard in list(self._shards):
+            for key, value in list(shard.items()):
+                totals[key] = totals.get(key, 0.0) + value
+        return totals
+
+    def expose(self) -> list[str]:
+        lines = self.header()
+        for key, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Last-write-wins gauge; values may also be computed at scrape time"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+        self._callbacks: dict[tuple, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, func: Callable[[], float], **labels) -> None:
+        self._callbacks[self._key(labels)] = func
+
+    def expose(self) -> list[str]:
+        lines = self.header()
+        values = dict(self._values)
+        for key, func in list(self._callbacks.items()):
+            try:
+                values[key] = float(func())
+            except Exception:
+                continue
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        series = shard.get(key)
+        if series is None:
+            # [count per bucket..., +Inf bucket, sum]
+            series = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self) -> dict[tuple, list]:
+        totals: dict[tuple, list] = {}
+        for shard in list(self._shards):
+            for key, series in list(shard.items()):
+                merged = totals.get(key)
+                if merged is None:
+                    totals[key] = list(series)
+                else:
+                    for i, value in enumerate(series):
+                        merged[i] += value
+        return totals
+
+    def expose(self) -> list[str]:
+        lines = self.header()
+        bounds = self.buckets + (float("inf"),)
+        for key, series in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, series):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def generate_latest(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        lines: list[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# HTTP
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route and status",
+    ("method", "route", "status")
+)
+
+# Internal stages
+password_hash_duration = registry.histogram(
+    "auth_password_hash_seconds", "Argon2 hash/verify time", ("operation",)
+)
+jwt_duration = registry.histogram(
+    "auth_jwt_seconds", "JWT encode/decode time", ("operation",),
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01)
+)
+db_statement_duration = registry.histogram(
+    "db_statement_duration_seconds", "Database time per statement", ("operation",)
+)
+redis_command_duration = registry.histogram(
+    "redis_command_duration_seconds", "Redis command round-trip latency", ("command",)
+)
+smtp_send_duration = registry.histogram(
+    "smtp_send_duration_seconds", "SMTP send time", ("outcome",)
+)
+
+# Errors
+rate_limit_rejections = registry.counter(
+    "rate_limit_rejections_total", "Requests rejected by the rate limiter", ("route",)
+)
+api_errors = registry.counter(
+    "api_errors_total", "APIError responses by error code", ("error_code", "status")
+)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency per route template and status"""
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Optional[dict] = None
+        self._static_paths: set[str] = set()
+
+    def _route_for(self, scope) -> str:
+        if self._route_paths is None:
+            routes = scope["app"].routes
+            self._route_paths = {getattr(route, "endpoint", None): route.path for route in routes}
+            # Requests answered before routing (shed by admission control) still match a parameterless path
+            self._static_paths = {route.path for route in routes if "{" not in route.path}
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return scope["path"] if scope["path"] in self._static_paths else "<unmatched>"
+        return self._route_paths.get(endpoint, "<unmatched>")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_request_duration.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=self._route_for(scope),
+                status=status_code
+            )
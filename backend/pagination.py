@@ -0,0 +1,57 @@
+# pagination.py
+"""
+Keyset pagination over (created_at, id), newest first.
+
+A cursor is the last row's keyset in URL-safe base64, opaque to clients.
+Each page is one index range scan that starts at the cursor, so page 1,000
+costs the same as page 1; OFFSET would read and discard every earlier row.
+"""
+import base64
+import binascii
+import time
+import uuid
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+class CursorError(ValueError):
+    """Cursor that was not produced by encode_cursor"""
+
+
+class Page(NamedTuple):
+    items: list
+    next_cursor: Optional[str]
+    query_ms: float
+
+
+def encode_cursor(created_at: datetime, row_id) -> str:
+    raw = f"{created_at.isoformat()},{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, _, row_id = raw.partition(",")
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise CursorError("Invalid cursor")
+
+
+async def keyset_page(db: AsyncSession, stmt, model, cursor: Optional[str], limit: int) -> Page:
+    """One page of `stmt` (a select of `model` with filters applied), newest first"""
+    if cursor:
+        stmt = stmt.where(tuple_(model.created_at, model.id) < tuple_(*decode_cursor(cursor)))
+    # One extra row says whether another page exists without a COUNT
+    stmt = stmt.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+    start = time.perf_counter()
+    rows = (await db.execute(stmt)).scalars().all()
+    query_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1].created_at, items[-1].id) if len(rows) > limit else None
+    return Page(items, next_cursor, query_ms)
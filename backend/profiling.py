@@ -0,0 +1,190 @@
+# profiling.py
+"""
+On-demand statistical profiling of live requests.
+
+A sampled request gets a background thread that snapshots the event-loop
+thread's stack at a fixed interval. Because every coroutine shares that
+thread, samples include whatever else the loop runs meanwhile; profile a
+quiet instance or look for the frames under the request's endpoint.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+PROFILE_HEADER = "x-profile-token"
+_NAME_RE = re.compile(r"^[\w.-]+\.(collapsed|speedscope\.json)$")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Collect collapsed stacks of one thread by periodic sampling"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        """Brendan Gregg collapsed-stack format (flamegraph.pl, speedscope, inferno)"""
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def speedscope(self, name: str) -> str:
+        """Speedscope 'sampled' profile document"""
+        frame_index: dict[str, int] = {}
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            samples.append([frame_index.setdefault(label, len(frame_index)) for label in stack])
+            weights.append(count * self.interval)
+        return json.dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": label} for label in frame_index]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights
+            }],
+            "name": name,
+            "exporter": "echowerk-profiler"
+        })
+
+
+class ProfileStore:
+    """Bounded on-disk ring of profile files; oldest files are evicted first"""
+
+    def __init__(self, directory: str, max_files: int = 50):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def save(self, name: str, content: str) -> str:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / name).write_text(content)
+        for stale in self._files()[self.max_files:]:
+            stale.unlink(missing_ok=True)
+        return name
+
+    def _files(self) -> list[Path]:
+        if not self.directory.exists():
+            return []
+        files = [path for path in self.directory.iterdir() if _NAME_RE.match(path.name)]
+        return sorted(files, key=lambda path: path.stat().st_mtime, reverse=True)
+
+    def entries(self) -> list[dict]:
+        return [
+            {"name": path.name, "size": path.stat().st_size, "created_at": path.stat().st_mtime}
+            for path in self._files()
+        ]
+
+    def read(self, name: str) -> Optional[str]:
+        if not _NAME_RE.match(name):
+            return None
+        path = self.directory / name
+        return path.read_text() if path.is_file() else None
+
+
+def sign_profile_token(secret: str, path: str, ttl: int = 300) -> str:
+    """Create a header value that forces profiling of ``path`` until it expires"""
+    expires = int(time.time()) + ttl
+    signature = hmac.new(secret.encode(), f"{expires}:{path}".encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_profile_token(secret: str, path: str, token: str) -> bool:
+    """Check a profile token signature and expiry"""
+    try:
+        expires, signature = token.split(".", 1)
+        if int(expires) < time.time():
+            return False
+    except ValueError:
+        return False
+    expected = hmac.new(secret.encode(), f"{expires}:{path}".encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling a random fraction of requests or signed ones"""
+
+    def __init__(self, app, store: ProfileStore, secret: str, sample_rate: float = 0.0,
+                 interval: float = 0.005, output_format: str = "speedscope"):
+        self.app = app
+        self.store = store
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.output_format = output_format
+        # One profiled request at a time keeps the overhead bounded
+        self._busy = False
+
+    def _should_profile(self, scope) -> bool:
+        if self._busy:
+            return False
+        for name, value in scope.get("headers", ()):
+            if name == PROFILE_HEADER.encode():
+                return verify_profile_token(self.secret, scope["path"], value.decode("latin-1"))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._busy = True
+        profiler = SamplingProfiler(threading.get_ident(), self.interval)
+        started = time.time()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Joining the sampler and writing the file both happen off the loop
+            await asyncio.to_thread(self._finish, profiler, scope, started)
+            self._busy = False
+
+    def _finish(self, profiler: SamplingProfiler, scope, started: float) -> None:
+        profiler.stop()
+        slug = re.sub(r"[^\w]+", "_", scope["path"]).strip("_") or "root"
+        base = f"{int(started * 1000)}-{scope['method']}-{slug}-{uuid.uuid4().hex[:8]}"
+        if self.output_format == "collapsed":
+            self.store.save(f"{base}.collapsed", profiler.collapsed())
+        else:
+            self.store.save(f"{base}.speedscope.json", profiler.speedscope(f"{scope['method']} {scope['path']}"))
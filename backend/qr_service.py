@@ -0,0 +1,82 @@
+# qr_service.py
+"""
+QR code rendering for 2FA enrolment.
+
+Rendering runs in a worker thread and the result is cached in Redis per
+pending secret, so setup-page reloads cost one GET (or nothing at all when
+the browser revalidates with If-None-Match).
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+from io import BytesIO
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+MEDIA_TYPES = {"svg": "image/svg+xml", "png": "image/png"}
+
+
+def render_qr(data: str, fmt: str = "png") -> bytes:
+    """Render ``data`` as a QR code image (CPU bound - call from a worker thread)"""
+    import qrcode  # imported lazily: qrcode/PIL are only needed during enrolment
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    if fmt == "svg":
+        from qrcode.image.svg import SvgPathImage
+        return qr.make_image(image_factory=SvgPathImage).to_string()
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    img_buffer = BytesIO()
+    img.save(img_buffer, format='PNG')
+    return img_buffer.getvalue()
+
+
+class QRCodeService:
+    def __init__(self, redis_client, signing_key: str, ttl: int = 600):
+        self.redis = redis_client
+        self.signing_key = signing_key.encode()
+        self.ttl = ttl
+
+    def etag(self, provisioning_uri: str, fmt: str) -> str:
+        """Strong ETag derived from the content inputs; keyed so it does not leak the secret"""
+        digest = hmac.new(self.signing_key, f"{fmt}:{provisioning_uri}".encode(), hashlib.sha256).hexdigest()
+        return f'"{digest[:32]}"'
+
+    def _cache_key(self, etag: str) -> str:
+        return f"qr:{etag.strip(chr(34))}"
+
+    async def render(self, provisioning_uri: str, fmt: str = "svg") -> tuple[bytes, str]:
+        """Return (image bytes, ETag), rendering off the event loop on a cache miss"""
+        if fmt not in MEDIA_TYPES:
+            raise ValueError(f"Unsupported QR format: {fmt}")
+
+        etag = self.etag(provisioning_uri, fmt)
+        cache_key = self._cache_key(etag)
+        cached: Optional[str] = None
+        try:
+            cached = await self.redis.get(cache_key)
+        except RedisError:
+            pass
+        if cached is not None:
+            return base64.b64decode(cached), etag
+
+        image = await asyncio.to_thread(render_qr, provisioning_uri, fmt)
+        try:
+            # The client decodes responses as text, so store base64
+            await self.redis.setex(cache_key, self.ttl, base64.b64encode(image).decode())
+        except RedisError:
+            pass
+        return image, etag
+
+    async def invalidate(self, provisioning_uri: str) -> None:
+        for fmt in MEDIA_TYPES:
+            try:
+                # One key at a time: the keys hash to different cluster slots
+                await self.redis.delete(self._cache_key(self.etag(provisioning_uri, fmt)))
+            except RedisError:
+                pass
@@ -0,0 +1,146 @@
+# redis_resilience.py
+"""
+Circuit breaker around Redis plus a per-process fallback store.
+
+When Redis errors or times out repeatedly the breaker opens and calls fail
+fast with CircuitOpenError instead of waiting on sockets. RateLimiter and
+SessionManager catch Redis errors and continue against LocalTTLStore, so a
+Redis outage degrades limits to per-process accuracy instead of failing
+every login.
+"""
+import logging
+import time
+from typing import Optional
+
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+breaker_state = registry.gauge(
+    "redis_circuit_state", "Redis circuit breaker state (0=closed, 1=half-open, 2=open)"
+)
+breaker_transitions = registry.counter(
+    "redis_circuit_transitions_total", "Redis circuit breaker state changes", ("state",)
+)
+redis_fallbacks = registry.counter(
+    "redis_fallback_total", "Operations served by the local fallback store", ("operation",)
+)
+
+# Errors that say something about Redis availability; ResponseError etc. do not
+BREAKER_ERRORS = (RedisConnectionError, RedisTimeoutError, OSError)
+
+
+class CircuitOpenError(RedisConnectionError):
+    """Raised instead of calling Redis while the circuit is open"""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 5.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        breaker_state.set(_STATE_VALUES[CLOSED])
+
+    def _transition(self, state: str) -> None:
+        if state != self.state:
+            logger.warning("Redis circuit %s -> %s", self.state, state)
+            self.state = state
+            breaker_state.set(_STATE_VALUES[state])
+            breaker_transitions.inc(state=state)
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go through"""
+        if self.state == CLOSED:
+            return
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError("Redis circuit is open")
+            self._transition(HALF_OPEN)
+        # Half-open: a single probe call at a time (a cancelled probe expires)
+        now = time.monotonic()
+        if self._probe_started is not None and now - self._probe_started < self.reset_timeout:
+            raise CircuitOpenError("Redis circuit is half-open")
+        self._probe_started = now
+
+    def on_success(self) -> None:
+        self._probe_started = None
+        self.failures = 0
+        self._transition(CLOSED)
+
+    def on_failure(self) -> None:
+        self._probe_started = None
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != CLOSED
+
+
+class LocalTTLStore:
+    """Small in-process key/value store with expiry, used while Redis is unavailable"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._data: dict[str, tuple[str, float]] = {}
+
+    def _live(self, key: str) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _make_room(self) -> None:
+        if len(self._data) < self.max_keys:
+            return
+        now = time.monotonic()
+        for key in [key for key, (_, expires_at) in self._data.items() if expires_at <= now]:
+            del self._data[key]
+        while len(self._data) >= self.max_keys:
+            # Dicts keep insertion order: drop the oldest entry
+            del self._data[next(iter(self._data))]
+
+    def get(self, key: str) -> Optional[str]:
+        return self._live(key)
+
+    def getex(self, key: str, ttl: int) -> Optional[str]:
+        """Get a value and reset its expiry"""
+        value = self._live(key)
+        if value is not None:
+            self._data[key] = (value, time.monotonic() + ttl)
+        return value
+
+    def setex(self, key: str, ttl: int, value) -> None:
+        self._make_room()
+        self._data[key] = (str(value), time.monotonic() + ttl)
+
+    def incr(self, key: str, ttl: int) -> int:
+        """Increment a counter, starting a new TTL window if it does not exist"""
+        current = self._live(key)
+        if current is None:
+            self.setex(key, ttl, 1)
+            return 1
+        expires_at = self._data[key][1]
+        value = int(current) + 1
+        self._data[key] = (str(value), expires_at)
+        return value
+
+    def delete(self, key: str) -> int:
+        return 1 if self._data.pop(key, None) is not None else 0
+
+    def keys(self, prefix: str) -> list[str]:
+        return [key for key in list(self._data) if key.startswith(prefix) and self._live(key) is not None]
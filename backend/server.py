@@ -0,0 +1,116 @@
+# server.py
+"""
+Production entry point.
+
+    python server.py              # gunicorn + uvicorn workers, app preloaded
+    python server.py --reload     # single-process development server
+
+Workers default to the number of usable CPU cores. uvloop and httptools are
+used when installed. SIGTERM stops accepting connections, drains in-flight
+requests for up to SERVER_GRACEFUL_TIMEOUT seconds and runs the lifespan
+shutdown (log flush, Redis close) in every worker.
+"""
+import argparse
+import importlib.util
+import logging
+import os
+
+from database import settings
+
+logger = logging.getLogger(__name__)
+
+
+def default_workers() -> int:
+    if settings.server_workers > 0:
+        return settings.server_workers
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:  # not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+def _has(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def run_gunicorn(workers: int, host: str, port: int) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    class EchoWerkApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                "bind": f"{host}:{port}",
+                "workers": workers,
+                # Picks uvloop/httptools automatically when they are installed
+                "worker_class": "uvicorn.workers.UvicornWorker",
+                "preload_app": True,
+                "graceful_timeout": settings.server_graceful_timeout,
+                "timeout": settings.server_worker_timeout,
+                "keepalive": settings.server_keepalive,
+                "post_fork": _post_fork,
+                "worker_exit": _worker_exit,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from main import app
+            return app
+
+    EchoWerkApplication().run()
+
+
+def _post_fork(server, worker) -> None:
+    """Drop anything the preloading master may have opened; each worker builds its own"""
+    from database import reset_engine_after_fork
+    from auth_utils import reset_redis_after_fork
+
+    reset_engine_after_fork()
+    reset_redis_after_fork()
+
+
+def _worker_exit(server, worker) -> None:
+    from logging_config import shutdown_logging
+    shutdown_logging()
+
+
+def run_uvicorn(workers: int, host: str, port: int, reload: bool) -> None:
+    import uvicorn
+
+    uvicorn.run(
+        "main:app",
+        host=host,
+        port=port,
+        workers=None if reload else workers,
+        reload=reload,
+        loop="uvloop" if _has("uvloop") else "asyncio",
+        http="httptools" if _has("httptools") else "h11",
+        timeout_graceful_shutdown=settings.server_graceful_timeout,
+        timeout_keep_alive=settings.server_keepalive,
+        log_config=None,  # keep the queue-based logging set up in main
+        log_level=settings.log_level.lower()
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the EchoWerk API")
+    parser.add_argument("--host", default=settings.server_host)
+    parser.add_argument("--port", type=int, default=settings.server_port)
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--reload", action="store_true", help="development mode with file watching")
+    args = parser.parse_args()
+
+    if settings.redis_url.startswith("memory://") and args.workers > 1:
+        # memory:// lives inside one process; more workers would each get their own sessions and limits
+        logger.warning("REDIS_URL is memory://, running a single worker instead of %d", args.workers)
+        args.workers = 1
+
+    if args.reload or not _has("gunicorn") or os.name == "nt":
+        # gunicorn is POSIX-only; uvicorn's own supervisor cannot preload
+        run_uvicorn(args.workers, args.host, args.port, args.reload)
+    else:
+        run_gunicorn(args.workers, args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+# slow_query.py
+"""
+Slow-query log with optional EXPLAIN capture.
+
+Statements slower than the threshold are aggregated per statement text with
+their bound parameters redacted. Once a SELECT has been slow often enough its
+plan is captured out of band with EXPLAIN (ANALYZE, BUFFERS) on a separate
+connection, so the request that tripped it never waits for the plan.
+"""
+import asyncio
+import logging
+import re
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+slow_queries = registry.counter(
+    "db_slow_queries_total", "Statements slower than the slow-query threshold", ("operation",)
+)
+explains_captured = registry.counter(
+    "db_explain_plans_total", "EXPLAIN plans captured for repeat slow statements", ("outcome",)
+)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+
+
+def redact_parameters(parameters: Any) -> Any:
+    """Replace bound values with their type names"""
+    if isinstance(parameters, dict):
+        return {key: f"<{type(value).__name__}>" for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            # executemany - one redacted row is enough
+            return [redact_parameters(parameters[0]), f"... {len(parameters)} rows"]
+        return [f"<{type(value).__name__}>" for value in parameters]
+    return None
+
+
+class SlowQueryLog:
+    def __init__(self, threshold: float = 0.2, explain: bool = False, explain_after: int = 5,
+                 max_entries: int = 200, max_plans: int = 50):
+        self.threshold = threshold
+        self.explain = explain
+        self.explain_after = explain_after
+        self.max_entries = max_entries
+        self.max_plans = max_plans
+        self.entries: OrderedDict[str, dict] = OrderedDict()
+        self.plans: OrderedDict[str, dict] = OrderedDict()
+        self._engine = None
+        self._pending_explains: set[str] = set()
+
+    def attach(self, engine) -> None:
+        """Give the log an AsyncEngine to run EXPLAIN on"""
+        self._engine = engine
+
+    def record(self, statement: str, parameters: Any, elapsed: float) -> None:
+        """Called for every statement at or above the threshold"""
+        fingerprint = _WHITESPACE_RE.sub(" ", statement).strip()
+        operation = fingerprint.split(" ", 1)[0].upper()
+        if operation == "EXPLAIN":
+            return
+        slow_queries.inc(operation=operation)
+
+        entry = self.entries.pop(fingerprint, None)
+        if entry is None:
+            entry = {"statement": fingerprint, "count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            if len(self.entries) >= self.max_entries:
+                self.entries.popitem(last=False)
+        self.entries[fingerprint] = entry  # most recently seen last
+
+        elapsed_ms = elapsed * 1000
+        entry["count"] += 1
+        entry["total_ms"] += elapsed_ms
+        entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+        entry["last_seen"] = datetime.now(timezone.utc).isoformat()
+        entry["parameters"] = redact_parameters(parameters)
+
+        logger.warning("Slow query (%.1f ms): %s", elapsed_ms, fingerprint[:500],
+                       extra={"parameters": entry["parameters"]})
+
+        if (self.explain and self._engine is not None
+                and entry["count"] >= self.explain_after
+                and operation == "SELECT"
+                and fingerprint not in self.plans
+                and fingerprint not in self._pending_explains):
+            self._schedule_explain(fingerprint, statement, parameters)
+
+    def _schedule_explain(self, fingerprint: str, statement: str, parameters: Any) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._pending_explains.add(fingerprint)
+        # The real parameters live only as long as this task
+        loop.create_task(self._explain(fingerprint, statement, parameters))
+
+    async def _explain(self, fingerprint: str, statement: str, parameters: Any) -> None:
+        try:
+            if self._engine.dialect.name != "postgresql":
+                explains_captured.inc(outcome="unsupported")
+                return
+            async with self._engine.connect() as conn:
+                result = await conn.exec_driver_sql(
+                    f"EXPLAIN (ANALYZE, BUFFERS, FORMAT TEXT) {statement}",
+                    tuple(parameters) if isinstance(parameters, list) else parameters
+                )
+                plan_lines = [_STRING_LITERAL_RE.sub("'?'", row[0]) for row in result]
+                await conn.rollback()
+            if len(self.plans) >= self.max_plans:
+                self.plans.popitem(last=False)
+            self.plans[fingerprint] = {
+                "captured_at": datetime.now(timezone.utc).isoformat(),
+                "plan": plan_lines
+            }
+            explains_captured.inc(outcome="captured")
+        except Exception as e:
+            explains_captured.inc(outcome="failed")
+            logger.warning("EXPLAIN capture failed: %s", e)
+        finally:
+            self._pending_explains.discard(fingerprint)
+
+    def report(self, limit: int = 50) -> list[dict]:
+        """Slow statements ordered by total time, with captured plans"""
+        ranked = sorted(self.entries.values(), key=lambda entry: entry["total_ms"], reverse=True)[:limit]
+        return [
+            {**entry, "total_ms": round(entry["total_ms"], 1), "max_ms": round(entry["max_ms"], 1),
+             "plan": self.plans.get(entry["statement"])}
+            for entry in ranked
+        ]
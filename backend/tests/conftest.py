@@ -0,0 +1,15 @@
+# tests/conftest.py
+"""
+Hermetic test setup: a throw-away SQLite database and the in-process
+memory:// Redis, configured before any backend module loads settings.
+
+    cd backend && python -m pytest
+"""
+import os
+import sys
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="echowerk-tests-")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_workdir}/test.db"
+os.environ["REDIS_URL"] = "memory://"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,62 @@
+# tests/test_admission.py
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+
+import main
+from admission import AdmissionControlMiddleware
+
+
+def _admission() -> AdmissionControlMiddleware:
+    if main.app.middleware_stack is None:
+        main.app.middleware_stack = main.app.build_middleware_stack()
+    layer = main.app.middleware_stack
+    while not isinstance(layer, AdmissionControlMiddleware):
+        layer = layer.app
+    return layer
+
+
+@asynccontextmanager
+async def _saturated(path: str):
+    """Every slot taken and the queue full: the next request to `path` is shed without waiting"""
+    gate = _admission().gates[path]
+    for _ in range(gate.limit.max_concurrency):
+        await gate.semaphore.acquire()
+    gate.waiting = gate.limit.max_queue
+    try:
+        yield
+    finally:
+        gate.waiting = 0
+        for _ in range(gate.limit.max_concurrency):
+            gate.semaphore.release()
+
+
+async def _get(path: str, **kwargs) -> httpx.Response:
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path, **kwargs)
+
+
+def test_shed_response_carries_cors_headers():
+    async def run():
+        async with _saturated("/health"):
+            return await _get("/health", headers={"Origin": "http://localhost:3000"})
+
+    response = asyncio.run(run())
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert response.headers["access-control-allow-origin"] == "http://localhost:3000"
+    assert response.headers["access-control-allow-credentials"] == "true"
+    assert "retry-after" in response.headers["access-control-expose-headers"].lower()
+
+
+def test_shed_requests_are_counted_under_their_route():
+    async def run():
+        async with _saturated("/health"):
+            await _get("/health")
+        return await _get("/metrics")
+
+    scrape = asyncio.run(run()).text
+    assert 'route="/health",status="503"' in scrape
+    assert 'status="503",route="<unmatched>"' not in scrape and 'route="<unmatched>",status="503"' not in scrape
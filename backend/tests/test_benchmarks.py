@@ -0,0 +1,30 @@
+# tests/test_benchmarks.py
+"""
+Regression check of the TOTP verifiers against the committed benchmark
+baseline. Timings depend on the machine, so it only runs when asked:
+
+    RUN_BENCHMARKS=1 python -m pytest tests/test_benchmarks.py
+"""
+import argparse
+import asyncio
+import json
+import os
+
+import pytest
+
+from benchmarks import auth_primitives
+
+pytestmark = pytest.mark.skipif(not os.environ.get("RUN_BENCHMARKS"), reason="set RUN_BENCHMARKS=1 to run")
+
+# Looser than the CLI default: one pytest run gets no second chance to ride out noise
+THRESHOLD = float(os.environ.get("BENCHMARK_THRESHOLD", "0.25"))
+
+
+def test_totp_verifiers_match_the_baseline():
+    args = argparse.Namespace(redis_url=None, filter=["totp"], warmup=0.2, min_time=0.05, repeat=15)
+    report = asyncio.run(auth_primitives.run(args))
+    with open(auth_primitives.BASELINE) as fh:
+        baseline = json.load(fh)
+
+    assert set(report["results"]) <= set(baseline["results"])
+    assert auth_primitives.compare(report, baseline, THRESHOLD) == []
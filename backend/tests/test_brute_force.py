@@ -0,0 +1,182 @@
+# tests/test_brute_force.py
+import asyncio
+import uuid
+
+import httpx
+import pytest
+
+import brute_force
+import main
+from auth_utils import RedisKeys, SecurityUtils, redis_client
+from brute_force import BruteForceDetector, Decision
+from database import Base, User, get_engine, get_sessionmaker, settings
+
+PASSWORD = "Corr3ct-Horse-Battery!"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100_000.0  # the start of a 100-second window
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def detector(monkeypatch):
+    """Detector on a fake clock with a 100-second window and only the thresholds a test sets"""
+    clock = FakeClock()
+    monkeypatch.setattr(brute_force, "time", clock)
+    monkeypatch.setattr(settings, "brute_force_window_seconds", 100)
+    monkeypatch.setattr(settings, "brute_force_failure_thresholds", {"email": (999, 999, 999), "ip": (999, 999, 999)})
+    monkeypatch.setattr(settings, "brute_force_distinct_thresholds", {"email": (0, 0), "ip": (0, 0)})
+    monkeypatch.setattr(settings, "account_lockout_threshold", 0)
+    return clock
+
+
+def _ip() -> str:
+    return f"10.{uuid.uuid4().int % 250}.{uuid.uuid4().int % 250}.{uuid.uuid4().int % 250}"
+
+
+async def _post_login(body: dict, ip: str) -> httpx.Response:
+    transport = httpx.ASGITransport(app=main.app, client=(ip, 40000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post("/auth/login", json=body)
+
+
+def test_owner_can_log_in_after_email_is_sprayed_from_other_ips():
+    email = f"owner-{uuid.uuid4().hex[:8]}@example.com"
+
+    async def run():
+        async with get_engine().begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with get_sessionmaker()() as db:
+            db.add(User(email=email, username=f"owner_{uuid.uuid4().hex[:8]}", is_verified=True,
+                        hashed_password=SecurityUtils.hash_password(PASSWORD)))
+            await db.commit()
+
+        async with main.app.router.lifespan_context(main.app):
+            # Enough failures from other hosts to cross the email's challenge threshold and the lockout threshold
+            for i in range(5):
+                await _post_login({"email": email, "password": "wrong"}, f"203.0.113.{i + 1}")
+
+            owner = {"email": email, "password": PASSWORD}
+            response = await _post_login(owner, "198.51.100.10")
+            if response.status_code == 429:
+                # Locked out for a bounded time: waiting out Retry-After is enough
+                await asyncio.sleep(int(response.headers["retry-after"]))
+                response = await _post_login(owner, "198.51.100.10")
+            return response
+
+    response = asyncio.run(run())
+    assert response.status_code == 200
+    assert response.json()["success"] is True
+    assert response.json()["access_token"]
+    assert not response.json().get("requires_challenge")
+
+
+def test_previous_window_counts_by_how_much_the_sliding_window_still_covers(detector, monkeypatch):
+    monkeypatch.setattr(settings, "brute_force_failure_thresholds", {"email": (999, 999, 999), "ip": (4, 999, 999)})
+    email, ip = "slide@example.com", _ip()
+
+    async def run():
+        detector.now += 50
+        for _ in range(3):
+            await BruteForceDetector.record_failure(email, ip)
+        # Next window, 10% in: the previous window's 3 failures weigh 3 * 0.9 = 2.7
+        detector.now += 60
+        await BruteForceDetector.record_failure(email, ip)
+        below = await BruteForceDetector.check(email, ip)  # 1 + 2.7
+        await BruteForceDetector.record_failure(email, ip)
+        return below, await BruteForceDetector.check(email, ip)  # 2 + 2.7
+
+    below, reached = asyncio.run(run())
+    assert below is None
+    # A challenge is a base delay while no client can solve one
+    assert reached == Decision("delay", "ip", 1)
+
+
+def test_distinct_emails_per_ip_block_the_ip_but_distinct_ips_per_email_do_not(detector, monkeypatch):
+    monkeypatch.setattr(settings, "brute_force_distinct_thresholds", {"email": (2, 3), "ip": (0, 3)})
+    stuffer, sprayed = _ip(), f"sprayed-{uuid.uuid4().hex[:8]}@example.com"
+
+    async def run():
+        for i in range(3):
+            await BruteForceDetector.record_failure(f"victim-{i}@example.com", stuffer)
+            await BruteForceDetector.record_failure(f"victim-{i}@example.com", stuffer)  # repeats count once
+            await BruteForceDetector.record_failure(sprayed, _ip())
+        return (await BruteForceDetector.check("anyone@example.com", stuffer),
+                await BruteForceDetector.check(sprayed, _ip()))
+
+    stuffer_decision, sprayed_decision = asyncio.run(run())
+    assert stuffer_decision == Decision("block", "ip", 100)
+    assert sprayed_decision is None
+
+
+def test_decision_key_expires_with_the_window(detector, monkeypatch):
+    monkeypatch.setattr(settings, "brute_force_failure_thresholds", {"email": (999, 999, 999), "ip": (1, 999, 999)})
+    email, ip = "ttl@example.com", _ip()
+
+    async def run():
+        await BruteForceDetector.record_failure(email, ip)
+        return await redis_client.ttl(RedisKeys.bf_decision(brute_force._subjects(email, ip)[1][1]))
+
+    assert asyncio.run(run()) == 100
+
+
+def test_challenged_ip_is_delayed_then_logs_in(monkeypatch):
+    monkeypatch.setattr(settings, "brute_force_failure_thresholds", {"email": (999, 999, 999), "ip": (2, 999, 999)})
+    monkeypatch.setattr(settings, "account_lockout_threshold", 0)
+    email, ip = f"delayed-{uuid.uuid4().hex[:8]}@example.com", "198.51.100.20"
+
+    async def run():
+        async with get_engine().begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with get_sessionmaker()() as db:
+            db.add(User(email=email, username=f"delayed_{uuid.uuid4().hex[:8]}", is_verified=True,
+                        hashed_password=SecurityUtils.hash_password(PASSWORD)))
+            await db.commit()
+
+        async with main.app.router.lifespan_context(main.app):
+            for _ in range(2):
+                await _post_login({"email": email, "password": "wrong"}, ip)
+            delayed = await _post_login({"email": email, "password": PASSWORD}, ip)
+            await asyncio.sleep(settings.brute_force_base_delay_ms / 1000)
+            return delayed, await _post_login({"email": email, "password": PASSWORD}, ip)
+
+    delayed, retried = asyncio.run(run())
+    assert delayed.status_code == 429
+    assert delayed.json()["error_code"] == "LOGIN_DELAYED"
+    assert delayed.headers["retry-after"] == "1"
+    assert retried.status_code == 200
+    assert retried.json()["access_token"]
+    assert not retried.json().get("requires_challenge")
+
+
+def test_lockout_doubles_per_failure_up_to_the_cap_and_resets_on_success(detector, monkeypatch):
+    monkeypatch.setattr(settings, "account_lockout_threshold", 3)
+    monkeypatch.setattr(settings, "account_lockout_base_seconds", 1)
+    monkeypatch.setattr(settings, "account_lockout_max_seconds", 4)
+    email = f"locked-{uuid.uuid4().hex[:8]}@example.com"
+
+    async def run():
+        lockouts = []
+        for _ in range(6):
+            await BruteForceDetector.record_failure(email, _ip())
+            decision = await BruteForceDetector.check(email, _ip())
+            lockouts.append(decision.retry_after if decision else 0)
+        detector.now += 4
+        expired = await BruteForceDetector.check(email, _ip())
+        await BruteForceDetector.record_failure(email, _ip())
+        streak_kept = await BruteForceDetector.check(email, _ip())
+        await BruteForceDetector.record_success(email)
+        await BruteForceDetector.record_failure(email, _ip())
+        return lockouts, expired, streak_kept, await BruteForceDetector.check(email, _ip())
+
+    lockouts, expired, streak_kept, after_success = asyncio.run(run())
+    assert lockouts == [0, 0, 1, 2, 4, 4]
+    assert expired is None
+    # The streak outlives the lockout: the next failure locks again at the cap
+    assert streak_kept == Decision("lockout", "email", 4)
+    # A successful login starts the streak over
+    assert after_success is None
@@ -0,0 +1,102 @@
+# tests/test_data_export.py
+import asyncio
+import gzip
+import io
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from data_export import ExportPlan, export_to_file
+from database import Base, LoginAttempt, dispose_engine, get_engine, get_sessionmaker
+
+# Rows live in their own month, far from anything other tests write
+SINCE = datetime(2001, 1, 1, tzinfo=timezone.utc)
+UNTIL = datetime(2001, 2, 1, tzinfo=timezone.utc)
+ROWS = 23
+
+
+class CrashingOutput(io.BytesIO):
+    """Fails on the write after `writes_left` writes, like a process killed mid-export"""
+
+    def __init__(self, writes_left: int):
+        super().__init__()
+        self.writes_left = writes_left
+
+    def write(self, data) -> int:
+        if self.writes_left == 0:
+            raise OSError("disk went away")
+        self.writes_left -= 1
+        return super().write(data)
+
+
+def _plan(fmt: str, after: str = None) -> ExportPlan:
+    # batch_size 4 puts the batch boundaries inside runs of equal created_at
+    return ExportPlan("login_attempts", fmt, after=after, since=SINCE, until=UNTIL, batch_size=4)
+
+
+async def _seed() -> None:
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with get_sessionmaker()() as db:
+        if await db.get(LoginAttempt, uuid.UUID(int=1)) is None:
+            db.add_all(
+                LoginAttempt(id=uuid.UUID(int=i + 1), email=f"export-{i}@example.com", ip_address="192.0.2.1",
+                             success=bool(i % 2), created_at=SINCE + timedelta(minutes=i // 3))
+                for i in range(ROWS)
+            )
+            await db.commit()
+
+
+async def _export_with_crash(fmt: str, compress: bool, checkpoint_path: str) -> tuple[bytes, bytes, dict]:
+    """(uninterrupted export, crashed-then-resumed export, resume report)"""
+    await _seed()
+    try:
+        full = io.BytesIO()
+        await export_to_file(_plan(fmt), full, compress, None)
+
+        # Header (CSV) plus two batches reach the file, then the third write fails
+        crashed = CrashingOutput(writes_left=3 if fmt == "csv" else 2)
+        try:
+            await export_to_file(_plan(fmt), crashed, compress, checkpoint_path)
+        except OSError:
+            pass
+        with open(checkpoint_path) as fh:
+            checkpoint = fh.read()
+
+        resumed = io.BytesIO(crashed.getvalue())
+        resumed.seek(0, io.SEEK_END)
+        report = await export_to_file(_plan(fmt, after=checkpoint), resumed, compress, checkpoint_path)
+        return full.getvalue(), resumed.getvalue(), report
+    finally:
+        await dispose_engine()
+
+
+def test_resume_from_checkpoint_matches_an_uninterrupted_export(tmp_path):
+    full, resumed, report = asyncio.run(_export_with_crash("csv", False, str(tmp_path / "export.ckpt")))
+
+    lines = full.decode().splitlines()
+    assert lines[0].startswith("id,email,")
+    assert len(lines) == ROWS + 1
+    assert resumed == full
+    assert report["rows"] == ROWS - 8
+    assert report["checkpoint"].endswith(str(uuid.UUID(int=ROWS)))
+
+
+def test_gzip_export_resumes_and_decompresses_to_the_plain_output(tmp_path):
+    async def plain():
+        await _seed()
+        try:
+            output = io.BytesIO()
+            await export_to_file(_plan("ndjson"), output, False, None)
+            streamed = b"".join([chunk async for chunk in _plan("ndjson").stream(compress=True)])
+            return output.getvalue(), streamed
+        finally:
+            await dispose_engine()
+
+    expected, streamed = asyncio.run(plain())
+    full, resumed, _ = asyncio.run(_export_with_crash("ndjson", True, str(tmp_path / "export.ckpt")))
+
+    assert len(expected.splitlines()) == ROWS
+    # One gzip member per batch on disk, one member for the HTTP stream
+    assert gzip.decompress(full) == expected
+    assert gzip.decompress(resumed) == expected
+    assert gzip.decompress(streamed) == expected
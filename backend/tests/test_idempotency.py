@@ -0,0 +1,98 @@
+# tests/test_idempotency.py
+import asyncio
+import json
+import uuid
+
+import httpx
+
+from idempotency import IdempotencyMiddleware
+
+
+class CountingApp:
+    """Stands in for a slow write endpoint; every call returns a new id"""
+
+    def __init__(self, delay: float = 0.0):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self, scope, receive, send):
+        self.calls += 1
+        request = await receive()
+        await asyncio.sleep(self.delay)
+        body = json.dumps({"id": str(uuid.uuid4()), "echo": json.loads(request["body"])}).encode()
+        await send({"type": "http.response.start", "status": 201,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _middleware(app) -> IdempotencyMiddleware:
+    return IdempotencyMiddleware(app, secret="test-secret", paths=["/write"], wait_timeout=5.0)
+
+
+async def _post(asgi, key: str, body: dict) -> httpx.Response:
+    transport = httpx.ASGITransport(app=asgi)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.post("/write", json=body, headers={"Idempotency-Key": key})
+
+
+def test_retry_with_same_key_and_body_replays_response():
+    app = CountingApp()
+    asgi = _middleware(app)
+    key = uuid.uuid4().hex
+
+    async def run():
+        return await _post(asgi, key, {"n": 1}), await _post(asgi, key, {"n": 1})
+
+    first, retry = asyncio.run(run())
+    assert app.calls == 1
+    assert retry.status_code == first.status_code == 201
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+
+
+def test_same_key_with_different_body_is_rejected():
+    app = CountingApp()
+    asgi = _middleware(app)
+    key = uuid.uuid4().hex
+
+    async def run():
+        return await _post(asgi, key, {"n": 1}), await _post(asgi, key, {"n": 2})
+
+    first, reused = asyncio.run(run())
+    assert first.status_code == 201
+    assert reused.status_code == 422
+    assert reused.json()["error_code"] == "IDEMPOTENCY_KEY_REUSED"
+    assert app.calls == 1
+
+
+def test_concurrent_duplicates_wait_for_the_first_request():
+    app = CountingApp(delay=0.2)
+    asgi = _middleware(app)
+    key = uuid.uuid4().hex
+
+    async def run():
+        return await asyncio.gather(*(_post(asgi, key, {"n": 1}) for _ in range(5)))
+
+    responses = asyncio.run(run())
+    assert app.calls == 1
+    assert {response.status_code for response in responses} == {201}
+    assert len({response.json()["id"] for response in responses}) == 1
+    assert sum(response.headers.get("idempotent-replayed") == "true" for response in responses) == 4
+
+
+def test_duplicate_on_another_worker_polls_for_the_stored_response():
+    app = CountingApp(delay=0.2)
+    # Two middleware instances share Redis but not their in-flight maps, like two workers
+    first_worker, second_worker = _middleware(app), _middleware(app)
+    key = uuid.uuid4().hex
+
+    async def run():
+        first = asyncio.create_task(_post(first_worker, key, {"n": 1}))
+        await asyncio.sleep(0.05)
+        return await first, await _post(second_worker, key, {"n": 1})
+
+    first, duplicate = asyncio.run(run())
+    assert app.calls == 1
+    assert duplicate.json() == first.json()
+    assert duplicate.headers["idempotent-replayed"] == "true"
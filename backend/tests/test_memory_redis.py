@@ -0,0 +1,135 @@
+# tests/test_memory_redis.py
+"""The memory:// backend against the Redis reply semantics the backend relies on"""
+import asyncio
+
+import pytest
+from redis.exceptions import ResponseError
+
+import memory_redis
+from memory_redis import MemoryRedis, MemoryStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(memory_redis, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def client():
+    return MemoryRedis(MemoryStore())
+
+
+def test_set_nx_ex_only_sets_once_and_expires(client, clock):
+    async def run():
+        first = await client.set("lock", "a", nx=True, ex=10)
+        second = await client.set("lock", "b", nx=True, ex=10)
+        value, ttl = await client.get("lock"), await client.ttl("lock")
+        clock.now += 10
+        return first, second, value, ttl, await client.get("lock"), await client.set("lock", "c", nx=True, ex=10)
+
+    assert asyncio.run(run()) == (True, None, "a", 10, None, True)
+
+
+def test_getex_slides_and_persists_the_ttl(client, clock):
+    async def run():
+        await client.set("session", "data", ex=5)
+        clock.now += 4
+        value = await client.getex("session", ex=5)
+        clock.now += 4
+        alive = await client.get("session")
+        await client.getex("session", persist=True)
+        persisted = await client.ttl("session")
+        return value, alive, persisted, await client.getex("missing", ex=5)
+
+    assert asyncio.run(run()) == ("data", "data", -1, None)
+
+
+def test_ttl_replies_and_expire_flags(client, clock):
+    async def run():
+        await client.set("plain", "1")
+        await client.set("timed", "1", ex=30)
+        replies = [await client.ttl("plain"), await client.ttl("timed"), await client.ttl("missing")]
+        replies.append(await client.expire("timed", 60, nx=True))
+        replies.append(await client.expire("plain", 60, nx=True))
+        replies.append(await client.incr("timed"))
+        clock.now += 30
+        replies.append(await client.exists("timed"))
+        replies.append(await client.ttl("plain"))
+        return replies
+
+    # INCR keeps the TTL, so the counter expires on the original deadline
+    assert asyncio.run(run()) == [-1, 30, -2, False, True, 2, 0, 30]
+
+
+def test_pipeline_runs_queued_commands_in_order(client):
+    async def run():
+        await client.set("text", "not a number")
+        pipe = client.pipeline(transaction=False)
+        pipe.incr("counter")
+        pipe.expire("counter", 60, nx=True)
+        pipe.incr("text")
+        pipe.mget("counter", "text", "missing")
+        queued = len(pipe)
+        results = await pipe.execute(raise_on_error=False)
+        with pytest.raises(ResponseError):
+            pipe.incr("text")
+            await pipe.execute()
+        return queued, results
+
+    queued, results = asyncio.run(run())
+    assert queued == 4
+    assert results[:2] == [1, True]
+    assert isinstance(results[2], ResponseError)
+    assert results[3] == ["1", "not a number", None]
+
+
+def test_scan_returns_every_surviving_key_once(client, clock):
+    async def run():
+        for i in range(25):
+            await client.set(f"session:{i}", "x", ex=100 if i % 5 else 1)
+        await client.set("other", "x")
+        cursor, first = await client.scan(0, match="session:*", count=10)
+        clock.now += 1  # every fifth session expires mid-iteration
+        await client.set("session:new", "x")  # added mid-iteration: may or may not be returned
+        seen = list(first)
+        while cursor:
+            cursor, keys = await client.scan(cursor, match="session:*", count=10)
+            seen.extend(keys)
+        return seen
+
+    seen = asyncio.run(run())
+    assert len(seen) == len(set(seen))
+    survivors = {f"session:{i}" for i in range(25) if i % 5}
+    assert survivors <= set(seen) <= survivors | {f"session:{i}" for i in range(0, 25, 5)} | {"session:new"}
+    assert "other" not in seen
+
+
+def test_pfcount_counts_distinct_members_across_keys(client):
+    async def run():
+        assert await client.pfadd("hll:1", "a", "b") == 1
+        assert await client.pfadd("hll:1", "a") == 0
+        await client.pfadd("hll:2", "b", "c")
+        return await client.pfcount("hll:1"), await client.pfcount("hll:1", "hll:2")
+
+    assert asyncio.run(run()) == (2, 3)
+
+
+def test_wrong_type_and_unknown_commands_raise(client):
+    async def run():
+        await client.sadd("members", "a")
+        with pytest.raises(ResponseError, match="WRONGTYPE"):
+            await client.get("members")
+        with pytest.raises(ResponseError, match="unknown command"):
+            await client.execute_command("SCRIPT", "LOAD", "return 1")
+
+    asyncio.run(run())
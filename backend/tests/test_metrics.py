@@ -0,0 +1,29 @@
+# tests/test_metrics.py
+import asyncio
+
+import httpx
+
+import main
+from database import settings
+
+
+def _scrape(client_host: str, headers: dict = None) -> httpx.Response:
+    async def run():
+        transport = httpx.ASGITransport(app=main.app, client=(client_host, 40000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/metrics", headers=headers)
+    return asyncio.run(run())
+
+
+def test_metrics_without_token_are_loopback_only():
+    assert _scrape("127.0.0.1").status_code == 200
+    assert _scrape("203.0.113.5").status_code == 403
+
+
+def test_metrics_token_is_required_when_configured(monkeypatch):
+    monkeypatch.setattr(settings, "metrics_token", "scrape-secret")
+    assert _scrape("127.0.0.1").status_code == 403
+    assert _scrape("10.0.0.9", {"Authorization": "Bearer wrong"}).status_code == 403
+    response = _scrape("10.0.0.9", {"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert "http_request_duration_seconds" in response.text
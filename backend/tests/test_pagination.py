@@ -0,0 +1,58 @@
+# tests/test_pagination.py
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from database import Base, LoginAttempt, dispose_engine, get_engine, get_sessionmaker
+from pagination import CursorError, decode_cursor, keyset_page
+
+# Rows live in their own year, far from anything other tests write
+SINCE = datetime(2002, 1, 1, tzinfo=timezone.utc)
+UNTIL = datetime(2003, 1, 1, tzinfo=timezone.utc)
+
+
+def _attempt(n: int, created_at: datetime) -> LoginAttempt:
+    return LoginAttempt(id=uuid.UUID(int=(2002 << 64) + n), email=f"page-{n}@example.com",
+                        ip_address="192.0.2.2", success=False, created_at=created_at)
+
+
+def test_cursors_walk_ties_on_created_at_without_duplicates_or_gaps():
+    stmt = select(LoginAttempt).where(LoginAttempt.created_at >= SINCE, LoginAttempt.created_at < UNTIL)
+
+    async def run():
+        async with get_engine().begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            async with get_sessionmaker()() as db:
+                # 20 rows in runs of five sharing a created_at; pages of 3 end inside every run
+                db.add_all(_attempt(n, SINCE + timedelta(hours=n // 5)) for n in range(20))
+                await db.commit()
+
+                seen, cursor, pages = [], None, 0
+                while True:
+                    page = await keyset_page(db, stmt, LoginAttempt, cursor, 3)
+                    seen.extend(row.id for row in page.items)
+                    pages += 1
+                    if pages == 2:
+                        # A row written mid-walk sorts before the cursor: it shifts nothing
+                        db.add(_attempt(99, UNTIL - timedelta(seconds=1)))
+                        await db.commit()
+                    if page.next_cursor is None:
+                        return seen, pages
+                    cursor = page.next_cursor
+        finally:
+            await dispose_engine()
+
+    seen, pages = asyncio.run(run())
+    expected = sorted(range(20), key=lambda n: (n // 5, n), reverse=True)
+    assert seen == [uuid.UUID(int=(2002 << 64) + n) for n in expected]
+    assert pages == 7
+
+
+def test_malformed_cursor_is_rejected():
+    for cursor in ("not base64!", "bm8tY29tbWE", "MjAwMi0wMS0wMVQwMDowMDowMCx4"):
+        with pytest.raises(CursorError):
+            decode_cursor(cursor)
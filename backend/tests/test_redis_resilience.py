@@ -0,0 +1,126 @@
+# tests/test_redis_resilience.py
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+import auth_utils
+import redis_resilience
+from auth_utils import InstrumentedMemoryRedis, RateLimiter
+from memory_redis import MemoryStore
+from redis_resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, LocalTTLStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(redis_resilience, "time", fake)
+    return fake
+
+
+def test_breaker_opens_after_threshold_and_fails_fast(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=5.0)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.on_failure()
+    assert breaker.state == CLOSED
+
+    breaker.before_call()
+    breaker.on_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_half_open_probe_closes_or_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5.0)
+    breaker.before_call()
+    breaker.on_failure()
+    assert breaker.state == OPEN
+
+    clock.now += 5.0
+    breaker.before_call()  # the single probe
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # no second call while the probe is out
+    breaker.on_failure()
+    assert breaker.state == OPEN
+
+    clock.now += 5.0
+    breaker.before_call()
+    breaker.on_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+    breaker.before_call()
+
+
+def test_breaker_success_resets_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=5.0)
+    breaker.on_failure()
+    breaker.on_success()
+    breaker.on_failure()
+    assert breaker.state == CLOSED
+
+
+def test_local_store_expiry(clock):
+    store = LocalTTLStore()
+    store.setex("a", 10, "x")
+    assert store.incr("n", 10) == 1
+    clock.now += 5
+    assert store.get("a") == "x"
+    assert store.incr("n", 10) == 2  # same window: the TTL is not extended
+    assert store.getex("a", 10) == "x"  # slides a's expiry to now + 10
+
+    clock.now += 6
+    assert store.get("a") == "x"
+    assert store.get("n") is None
+    assert store.incr("n", 10) == 1
+    assert store.keys("") == ["a", "n"]
+
+    clock.now += 10
+    assert store.get("a") is None
+    assert store.keys("") == []
+
+
+def test_local_store_evicts_oldest_when_full(clock):
+    store = LocalTTLStore(max_keys=2)
+    for key in ("a", "b", "c"):
+        store.setex(key, 10, key)
+    assert store.get("a") is None
+    assert store.get("b") == "b" and store.get("c") == "c"
+
+
+class UnreachableRedis(InstrumentedMemoryRedis):
+    """memory:// client whose every round trip fails like a dead socket"""
+
+    def __init__(self):
+        super().__init__(MemoryStore())
+        self.attempts = 0
+
+    async def round_trip(self) -> None:
+        self.attempts += 1
+        raise RedisConnectionError("connection refused")
+
+
+def test_rate_limiter_falls_back_and_breaker_stops_calling_redis(monkeypatch, clock):
+    client = UnreachableRedis()
+    monkeypatch.setattr(auth_utils, "_redis", client)
+    monkeypatch.setattr(auth_utils, "redis_breaker", CircuitBreaker(failure_threshold=2, reset_timeout=5.0))
+    monkeypatch.setattr(auth_utils, "local_store", LocalTTLStore())
+
+    async def run():
+        return [await RateLimiter.check_rate_limit("rate_limit:{test}", 3, 60) for _ in range(5)]
+
+    # Per-process limit still applies while Redis is down
+    assert asyncio.run(run()) == [True, True, True, False, False]
+    # Two failures opened the circuit; the rest never touched the socket
+    assert client.attempts == 2
+    assert auth_utils.redis_breaker.state == OPEN
@@ -0,0 +1,106 @@
+# tests/test_refresh.py
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+import auth_utils
+import main
+from auth_utils import JWTManager, SecurityUtils
+from database import Base, User, get_engine, get_sessionmaker
+
+PASSWORD = "Corr3ct-Horse-Battery!"
+
+
+def _client(ip: str) -> httpx.AsyncClient:
+    transport = httpx.ASGITransport(app=main.app, client=(ip, 40000))
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+async def _create_user() -> str:
+    email = f"refresh-{uuid.uuid4().hex[:8]}@example.com"
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with get_sessionmaker()() as db:
+        db.add(User(email=email, username=f"refresh_{uuid.uuid4().hex[:8]}", is_verified=True,
+                    hashed_password=SecurityUtils.hash_password(PASSWORD)))
+        await db.commit()
+    return email
+
+
+async def _post_login(ip: str, email: str) -> httpx.Response:
+    async with _client(ip) as client:
+        return await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+
+
+async def _login(ip: str) -> dict:
+    response = await _post_login(ip, await _create_user())
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_refresh_rotates_and_revokes_the_old_token():
+    async def run():
+        async with main.app.router.lifespan_context(main.app):
+            issued = await _login("198.51.100.41")
+            async with _client("198.51.100.41") as client:
+                first = await client.post("/auth/refresh", json={"refresh_token": issued["refresh_token"]})
+                replay = await client.post("/auth/refresh", json={"refresh_token": issued["refresh_token"]})
+                second = await client.post("/auth/refresh", json={"refresh_token": first.json()["refresh_token"]})
+            return issued, first, replay, second
+
+    issued, first, replay, second = asyncio.run(run())
+    assert first.status_code == 200
+    assert first.json()["access_token"]
+    assert first.json()["refresh_token"] != issued["refresh_token"]
+    assert replay.status_code == 401
+    assert replay.json()["error_code"] == "INVALID_REFRESH_TOKEN"
+    assert second.status_code == 200
+
+
+def test_concurrent_reuse_of_a_refresh_token_succeeds_once():
+    async def run():
+        async with main.app.router.lifespan_context(main.app):
+            issued = await _login("198.51.100.42")
+            async with _client("198.51.100.42") as client:
+                body = {"refresh_token": issued["refresh_token"]}
+                return await asyncio.gather(*(client.post("/auth/refresh", json=body) for _ in range(4)))
+
+    responses = asyncio.run(run())
+    assert sorted(r.status_code for r in responses) == [200, 401, 401, 401]
+
+
+def test_garbage_refresh_token_is_rejected():
+    async def run():
+        async with main.app.router.lifespan_context(main.app):
+            async with _client("198.51.100.43") as client:
+                return await client.post("/auth/refresh", json={"refresh_token": "not-a-jwt"})
+
+    assert asyncio.run(run()).status_code == 401
+
+
+class _FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2026, 1, 1, tzinfo=tz or timezone.utc)
+
+
+def test_refresh_tokens_minted_in_the_same_second_differ(monkeypatch):
+    monkeypatch.setattr(auth_utils, "datetime", _FrozenDatetime)
+    data = {"sub": str(uuid.uuid4()), "email": "same@example.com"}
+    first, second = JWTManager.create_refresh_token(data), JWTManager.create_refresh_token(data)
+    assert first != second
+
+
+def test_back_to_back_logins_store_distinct_refresh_tokens(monkeypatch):
+    async def run():
+        async with main.app.router.lifespan_context(main.app):
+            email = await _create_user()
+            monkeypatch.setattr(auth_utils, "datetime", _FrozenDatetime)
+            # Assert outside the lifespan: the second INSERT would fail if the tokens collided
+            return await _post_login("198.51.100.44", email), await _post_login("198.51.100.45", email)
+
+    first, second = asyncio.run(run())
+    assert first.status_code == second.status_code == 200
+    assert first.json()["refresh_token"] != second.json()["refresh_token"]
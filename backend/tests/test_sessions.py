@@ -0,0 +1,38 @@
+# tests/test_sessions.py
+import asyncio
+import json
+import uuid
+from datetime import datetime, timezone
+
+from auth_utils import RedisKeys, SessionManager, redis_client
+from database import settings
+
+
+def _legacy_session(user_id: str) -> str:
+    """Store a pre-upgrade session: untagged id, JSON value, not in any user index"""
+    session_id = uuid.uuid4().hex
+    value = json.dumps({"user_id": user_id, "created_at": datetime.now(timezone.utc).isoformat(), "device_info": "old"})
+    asyncio.run(redis_client.setex(RedisKeys.session(session_id), 600, value))
+    return session_id
+
+
+def test_delete_all_user_sessions_removes_unmigrated_legacy_sessions(monkeypatch):
+    monkeypatch.setattr(settings, "session_legacy_scan", True)
+    user_id, other_id = str(uuid.uuid4()), str(uuid.uuid4())
+    legacy = _legacy_session(user_id)
+    other_legacy = _legacy_session(other_id)
+    tagged = asyncio.run(SessionManager.create_session(user_id, "new"))
+
+    assert asyncio.run(SessionManager.delete_all_user_sessions(user_id)) == 2
+
+    assert asyncio.run(SessionManager.get_session(legacy)) is None
+    assert asyncio.run(SessionManager.get_session(tagged)) is None
+    assert asyncio.run(SessionManager.get_session(other_legacy))["user_id"] == other_id
+
+
+def test_legacy_scan_is_off_by_default():
+    user_id = str(uuid.uuid4())
+    legacy = _legacy_session(user_id)
+    asyncio.run(SessionManager.delete_all_user_sessions(user_id))
+    # Only reachable through the deploy-day scan
+    assert asyncio.run(redis_client.get(RedisKeys.session(legacy))) is not None
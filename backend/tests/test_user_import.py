@@ -0,0 +1,98 @@
+# tests/test_user_import.py
+import asyncio
+import uuid
+
+from sqlalchemy import select
+
+from auth_utils import SecurityUtils
+from database import Base, User, dispose_engine, get_engine, get_sessionmaker
+from user_import import UserImporter, parse_records
+
+# A stored hash is imported as-is, so these tests never touch the hashing process pool
+PASSWORD_HASH = SecurityUtils.hash_password("Imp0rted-Passw0rd!")
+# Argon2 parameters are comma-separated, so the cell is quoted
+HASH_CELL = f'"{PASSWORD_HASH}"'
+
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def _import(text: str, chunk_size: int = 1 << 16) -> dict:
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with get_sessionmaker()() as db:
+        report = await UserImporter(db, batch_size=100).run(_chunks(text.encode(), chunk_size), "csv")
+    return report.to_dict()
+
+
+def _run(coro):
+    """asyncio.run, then release the aiosqlite connection thread (the app's lifespan does this elsewhere)"""
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await dispose_engine()
+    return asyncio.run(wrapper())
+
+
+def test_conflicts_and_in_input_duplicates_are_reported_per_row():
+    tag = uuid.uuid4().hex[:8]
+    taken_email, taken_username = f"taken-{tag}@example.com", f"taken_{tag}"
+    csv_text = "\n".join([
+        "email,username,password_hash",
+        f"{taken_email},fresh_a_{tag},{HASH_CELL}",  # line 2: email exists
+        f"fresh-b-{tag}@example.com,{taken_username},{HASH_CELL}",  # line 3: username exists
+        f"fresh-c-{tag}@example.com,fresh_c_{tag},{HASH_CELL}",  # line 4: inserted
+        f"fresh-c-{tag}@example.com,fresh_d_{tag},{HASH_CELL}",  # line 5: same email as line 4
+        "",
+    ])
+
+    async def run():
+        async with get_engine().begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with get_sessionmaker()() as db:
+            db.add(User(email=taken_email, username=taken_username, hashed_password=PASSWORD_HASH))
+            await db.commit()
+        return await _import(csv_text)
+
+    report = _run(run())
+    assert report["received"] == 4
+    assert report["inserted"] == 1
+    assert report["conflicts"] == 3
+    assert report["invalid"] == 0
+    assert sorted((e["line"], e["reason"]) for e in report["errors"]) == [
+        (2, "email_exists"), (3, "username_exists"), (5, "duplicate_in_input"),
+    ]
+
+
+def test_quoted_fields_may_span_lines_and_chunks():
+    tag = uuid.uuid4().hex[:8]
+    email = f"multi-{tag}@example.com"
+    csv_text = (
+        "email,username,first_name,password_hash\r\n"
+        f'{email},multi_{tag},"Ann\r\nMarie, ""Jr""",{HASH_CELL}\r\n'
+        f"bad-{tag},bad_{tag},,{HASH_CELL}\r\n"
+    )
+
+    async def run():
+        # 5-byte chunks split the quoted field, the CRLFs and the UTF-8 stream at arbitrary points
+        report = await _import(csv_text, chunk_size=5)
+        async with get_sessionmaker()() as db:
+            stored = (await db.execute(select(User.first_name).where(User.email == email))).scalar_one()
+        return report, stored
+
+    report, first_name = _run(run())
+    assert report["inserted"] == 1
+    assert first_name == 'Ann\nMarie, "Jr"'
+    # The invalid row is reported at its own line, after the two physical lines of the quoted record
+    assert [(e["line"], e["email"]) for e in report["errors"]] == [(4, f"bad-{tag}")]
+
+
+def test_unterminated_quote_is_reported_at_its_first_line():
+    async def run():
+        text = b'email,username\na@example.com,"open\nstill open\n'
+        return [record async for record in parse_records(_chunks(text, 4), "csv")]
+
+    assert asyncio.run(run()) == [(2, None, "unterminated quoted field")]
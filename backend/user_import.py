@@ -0,0 +1,403 @@
+# user_import.py
+"""
+Bulk user import from CSV or NDJSON.
+
+Rows are parsed as the input streams in, validated one by one and inserted
+in batches with INSERT ... ON CONFLICT DO NOTHING RETURNING, so existing
+accounts are reported per row instead of failing the batch. Each row
+carries either `password_hash` (Argon2 or bcrypt, stored as-is and upgraded
+on the user's next login) or `password` (hashed in a process pool, never on
+the event loop). Imported plaintext passwords skip the strength policy:
+rejecting them would lock migrated users out. Verification emails go
+through the throttled outbox.
+
+Columns: email, username, first_name, last_name, password | password_hash,
+is_verified (optional; verified accounts get no email).
+
+    python user_import.py users.csv
+    python user_import.py users.ndjson --no-email --batch-size 2000
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from pydantic import BaseModel, EmailStr, Field, ValidationError, field_validator, model_validator
+from sqlalchemy import insert, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth_utils import ARGON2_PREFIXES, BCRYPT_PREFIXES, SecurityUtils
+from database import EmailVerification, User, settings
+from email_service import email_outbox, email_service
+from metrics import registry
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+import_rows = registry.counter(
+    "user_import_rows_total", "Rows processed by the bulk user import", ("outcome",)
+)
+
+_hash_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_hash_pool() -> ProcessPoolExecutor:
+    """Process pool for plaintext passwords (built on first use)"""
+    global _hash_pool
+    if _hash_pool is None:
+        workers = settings.import_hash_workers
+        if workers <= 0:
+            try:
+                workers = len(os.sched_getaffinity(0))
+            except AttributeError:  # not available on macOS/Windows
+                workers = os.cpu_count() or 1
+        # spawn: forking a process that runs an event loop and logging threads is not safe
+        _hash_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _hash_pool
+
+
+def shutdown_hash_pool() -> None:
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+
+def detect_format(content_type: str = "", filename: str = "") -> Optional[str]:
+    if "csv" in content_type or filename.endswith(".csv"):
+        return "csv"
+    if "ndjson" in content_type or "jsonl" in content_type or filename.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return None
+
+
+class ImportRecord(BaseModel):
+    email: EmailStr = Field(max_length=255)
+    username: str = Field(max_length=50)
+    first_name: Optional[str] = Field(default=None, max_length=100)
+    last_name: Optional[str] = Field(default=None, max_length=100)
+    password: Optional[str] = None
+    password_hash: Optional[str] = Field(default=None, max_length=255)
+    is_verified: bool = False
+
+    @field_validator('first_name', 'last_name', 'password', 'password_hash', mode='before')
+    @classmethod
+    def empty_str_to_none(cls, v):
+        """CSV has no null; treat empty cells as missing"""
+        return None if v == "" else v
+
+    @field_validator('is_verified', mode='before')
+    @classmethod
+    def empty_str_to_false(cls, v):
+        return False if v in ("", None) else v
+
+    @field_validator('username')
+    @classmethod
+    def validate_username(cls, v: str) -> str:
+        if not v or len(v.strip()) < 3:
+            raise ValueError('Username must be at least 3 characters')
+        if not v.replace('_', '').isalnum():
+            raise ValueError('Username can only contain letters, numbers, and underscores')
+        return v.lower().strip()
+
+    @field_validator('password_hash')
+    @classmethod
+    def validate_password_hash(cls, v: Optional[str]) -> Optional[str]:
+        if v is not None and not v.startswith(ARGON2_PREFIXES + BCRYPT_PREFIXES):
+            raise ValueError('Unsupported password hash; expected Argon2 or bcrypt')
+        return v
+
+    @model_validator(mode='after')
+    def one_password_source(self):
+        if (self.password is None) == (self.password_hash is None):
+            raise ValueError('Exactly one of password and password_hash is required')
+        return self
+
+
+class ImportReport:
+    """Running totals; per-row errors are kept up to `max_errors`"""
+
+    def __init__(self, max_errors: int):
+        self.max_errors = max_errors
+        self.received = 0
+        self.inserted = 0
+        self.conflicts = 0
+        self.invalid = 0
+        self.hashed = 0
+        self.passthrough = 0
+        self.emails_queued = 0
+        self.emails_dropped = 0
+        self.errors: list[dict] = []
+
+    def reject(self, line: int, email: Optional[str], reason: str, conflict: bool = False) -> None:
+        if conflict:
+            self.conflicts += 1
+        else:
+            self.invalid += 1
+        import_rows.inc(outcome="conflict" if conflict else "invalid")
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "email": email, "reason": reason})
+
+    def to_dict(self) -> dict:
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "conflicts": self.conflicts,
+            "invalid": self.invalid,
+            "passwords": {"hashed": self.hashed, "passthrough": self.passthrough},
+            "verification_emails": {"queued": self.emails_queued, "dropped": self.emails_dropped},
+            "errors": self.errors,
+            "errors_truncated": self.conflicts + self.invalid > len(self.errors),
+        }
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+async def parse_records(chunks: AsyncIterator[bytes], fmt: str) -> AsyncIterator[tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (line number, fields, error) per record; exactly one of fields/error is set"""
+    line_no = 0
+    if fmt == "ndjson":
+        async for line in _lines(chunks):
+            line_no += 1
+            if not line.strip():
+                continue
+            try:
+                fields = json.loads(line)
+            except ValueError:
+                yield line_no, None, "invalid JSON"
+                continue
+            if isinstance(fields, dict):
+                yield line_no, fields, None
+            else:
+                yield line_no, None, "expected a JSON object"
+        return
+
+    header = None
+    pending, start = "", 0
+    async for line in _lines(chunks):
+        line_no += 1
+        if not pending:
+            start = line_no
+        pending = f"{pending}\n{line}" if pending else line
+        # A quoted field may span lines: wait until the quotes balance
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+        row = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip().lower() for name in row]
+            continue
+        if len(row) != len(header):
+            yield start, None, f"expected {len(header)} columns, got {len(row)}"
+            continue
+        yield start, dict(zip(header, row)), None
+    if pending:
+        yield start, None, "unterminated quoted field"
+
+
+class UserImporter:
+    """Imports into `db`, committing once per batch"""
+
+    def __init__(self, db: AsyncSession, batch_size: int = None,
+                 send_verification: Optional[Callable[[str, str], Awaitable]] = None):
+        self.db = db
+        self.batch_size = batch_size or settings.import_batch_size
+        self.send_verification = send_verification
+        self.report = ImportReport(settings.import_max_reported_errors)
+
+    async def run(self, chunks: AsyncIterator[bytes], fmt: str) -> ImportReport:
+        """Hash batch n+1 while batch n is being inserted"""
+        batch: list[tuple[int, ImportRecord]] = []
+        pending: Optional[asyncio.Task] = None
+        try:
+            async for line, fields, error in parse_records(chunks, fmt):
+                self.report.received += 1
+                if error is not None:
+                    self.report.reject(line, None, error)
+                    continue
+                try:
+                    batch.append((line, ImportRecord.model_validate(fields)))
+                except ValidationError as e:
+                    first = e.errors()[0]
+                    field = ".".join(str(part) for part in first["loc"])
+                    self.report.reject(line, fields.get("email"), f"{field}: {first['msg']}" if field else first["msg"])
+                    continue
+                if len(batch) >= self.batch_size:
+                    rows = await self._prepare(batch)
+                    if pending is not None:
+                        await pending
+                    pending = asyncio.create_task(self._insert(rows))
+                    batch = []
+            if batch:
+                rows = await self._prepare(batch)
+                if pending is not None:
+                    await pending
+                pending = asyncio.create_task(self._insert(rows))
+            if pending is not None:
+                await pending
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+        return self.report
+
+    async def _prepare(self, batch: list[tuple[int, ImportRecord]]) -> list[tuple[int, dict]]:
+        """Drop in-batch duplicates and hash plaintext passwords in the process pool"""
+        seen_emails, seen_usernames = set(), set()
+        unique = []
+        for line, record in batch:
+            if record.email in seen_emails or record.username in seen_usernames:
+                self.report.reject(line, record.email, "duplicate_in_input", conflict=True)
+                continue
+            seen_emails.add(record.email)
+            seen_usernames.add(record.username)
+            unique.append((line, record))
+
+        loop = asyncio.get_running_loop()
+        plaintext = [record for _, record in unique if record.password is not None]
+        hashes = iter(await asyncio.gather(*(
+            loop.run_in_executor(get_hash_pool(), SecurityUtils.hash_password, record.password)
+            for record in plaintext
+        )))
+        self.report.hashed += len(plaintext)
+        self.report.passthrough += len(unique) - len(plaintext)
+
+        now = datetime.now(timezone.utc)
+        rows = []
+        for line, record in unique:
+            rows.append((line, {
+                "id": uuid.uuid4(),
+                "email": record.email,
+                "username": record.username,
+                "hashed_password": record.password_hash or next(hashes),
+                "first_name": record.first_name,
+                "last_name": record.last_name,
+                "is_active": True,
+                "is_verified": record.is_verified,
+                "is_superuser": False,
+                "is_2fa_enabled": False,
+                "created_at": now,
+                "updated_at": now,
+            }))
+        return rows
+
+    async def _insert(self, rows: list[tuple[int, dict]]) -> None:
+        db = self.db
+        dialect = db.bind.dialect.name
+        table_insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(dialect)
+        if table_insert is None:
+            raise RuntimeError(f"Bulk import needs INSERT ... ON CONFLICT, not available on {dialect}")
+
+        result = await db.execute(
+            table_insert(User.__table__).on_conflict_do_nothing().returning(User.__table__.c.email),
+            [row for _, row in rows]
+        )
+        inserted = set(result.scalars())
+
+        skipped = [(line, row) for line, row in rows if row["email"] not in inserted]
+        if skipped:
+            existing = await db.execute(
+                select(User.email).where(or_(
+                    User.email.in_([row["email"] for _, row in skipped]),
+                    User.username.in_([row["username"] for _, row in skipped])
+                ))
+            )
+            existing_emails = set(existing.scalars())
+            for line, row in skipped:
+                reason = "email_exists" if row["email"] in existing_emails else "username_exists"
+                self.report.reject(line, row["email"], reason, conflict=True)
+
+        emails = []
+        if self.send_verification is not None:
+            # Tokens must outlive the outbox backlog, or the last emails arrive already expired
+            expires_at = datetime.now(timezone.utc) + timedelta(
+                hours=settings.email_verification_expire_hours, seconds=email_outbox.backlog_seconds()
+            )
+            verifications = []
+            for _, row in rows:
+                if row["email"] in inserted and not row["is_verified"]:
+                    token = SecurityUtils.generate_secure_token()
+                    verifications.append({"id": uuid.uuid4(), "user_id": row["id"], "token": token,
+                                          "expires_at": expires_at, "is_used": False})
+                    emails.append((row["email"], token))
+            if verifications:
+                await db.execute(insert(EmailVerification.__table__), verifications)
+        await db.commit()
+
+        self.report.inserted += len(inserted)
+        import_rows.inc(len(inserted), outcome="inserted")
+        for email, token in emails:
+            if email_outbox.submit(lambda email=email, token=token: self.send_verification(email, token)):
+                self.report.emails_queued += 1
+            else:
+                self.report.emails_dropped += 1
+
+
+async def _read_file(path: str, chunk_size: int = 1 << 20) -> AsyncIterator[bytes]:
+    fh = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while chunk := await asyncio.to_thread(fh.read, chunk_size):
+            yield chunk
+    finally:
+        if fh is not sys.stdin.buffer:
+            fh.close()
+
+
+async def _run_cli(args) -> dict:
+    import database
+
+    if args.url:
+        settings.database_url = args.url
+    try:
+        async with database.get_sessionmaker()() as db:
+            importer = UserImporter(
+                db, batch_size=args.batch_size,
+                send_verification=None if args.no_email else email_service.send_verification_token
+            )
+            report = await importer.run(_read_file(args.path), args.format)
+        if email_outbox.queue.qsize():
+            print(f"Sending {email_outbox.queue.qsize()} queued verification emails...", file=sys.stderr)
+        await email_outbox.close(timeout=None)
+    finally:
+        shutdown_hash_pool()
+        await database.dispose_engine()
+    return report.to_dict()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="CSV or NDJSON file, or - for stdin")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=settings.import_batch_size)
+    parser.add_argument("--no-email", action="store_true", help="do not send verification emails")
+    parser.add_argument("--url", help="database URL (default: DATABASE_URL)")
+    args = parser.parse_args()
+    args.format = args.format or detect_format(filename=args.path)
+    if args.format is None:
+        parser.error("cannot tell the format from the file name; pass --format")
+
+    print(json.dumps(asyncio.run(_run_cli(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
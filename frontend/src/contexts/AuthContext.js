@@ -135,8 +135,10 @@ api.interceptors.response.use(
             refresh_token: refreshToken,
           });
 
-          const { access_token } = response.data;
+          // Refresh tokens are single-use: keep the rotated one for the next refresh
+          const { access_token, refresh_token } = response.data;
           localStorage.setItem('access_token', access_token);
+          localStorage.setItem('refresh_token', refresh_token);
           console.log('✅ Token refreshed successfully');
 
           // Retry original request
@@ -1,21 +1,53 @@
-
 # test_auth.py
 """
-Test script for the authentication system
+Load generator for the authentication API.
+
+Runs the ASGI app in-process (no network, no uvicorn) against whatever
+DATABASE_URL / REDIS_URL point at - normally local stand-ins - with a
+weighted mix of scenarios spread over N virtual users:
+
+    python test-auth.py --concurrency 50 --duration 30 --ramp linear --ramp-seconds 10 \\
+        --mix register=1,login=3,login_2fa=1,me=10,refresh=2,health=1
+
+``--hermetic`` needs neither: it runs on a throw-away SQLite file
+(aiosqlite, WAL) and the in-process memory:// Redis.
+
+Prints a JSON report with throughput, p50/p95/p99/p999 latency and error
+rates per scenario. ``--smoke --base-url http://localhost:8000`` runs the
+original single register -> login -> /auth/me -> /health pass against a
+live server instead.
 """
+import argparse
 import asyncio
-import httpx
 import json
+import math
+import os
+import random
+import secrets
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+PASSWORD = "LoadTest-Passw0rd!"
+DEFAULT_MIX = "register=1,login=3,login_2fa=1,me=10,refresh=2,health=1"
+TOKEN_POOL_SIZE = 1000
+
 
-BASE_URL = "http://localhost:8000"
+# ================================
+# SMOKE TEST (live server)
+# ================================
 
-async def test_authentication_flow():
-    """Test the complete authentication flow"""
-    async with httpx.AsyncClient() as client:
+async def smoke(base_url: str) -> None:
+    """Single sequential register -> login -> /auth/me -> /health pass"""
+    async with httpx.AsyncClient(base_url=base_url) as client:
         print("🧪 Testing Authentication System")
         print("=" * 40)
 
-        # Test user registration
         print("1. Testing user registration...")
         register_data = {
             "email": "test@example.com",
@@ -24,54 +56,368 @@ async def test_authentication_flow():
             "first_name": "Test",
             "last_name": "User"
         }
-
-        response = await client.post(f"{BASE_URL}/auth/register", json=register_data)
-        if response.status_code == 201:
+        response = await client.post("/auth/register", json=register_data)
+        if response.status_code == 200:
             print("✅ User registration successful")
         else:
             print(f"❌ User registration failed: {response.text}")
             return
 
-        # Test login (should fail because email not verified)
         print("\n2. Testing login before email verification...")
-        login_data = {
-            "email": "test@example.com",
-            "password": "TestPassword123!"
-        }
-
-        response = await client.post(f"{BASE_URL}/auth/login", json=login_data)
+        response = await client.post("/auth/login", json={"email": "test@example.com", "password": "TestPassword123!"})
         if response.status_code == 200:
             print("✅ Login successful")
-            token_data = response.json()
-            access_token = token_data["access_token"]
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
 
-            # Test authenticated endpoint
             print("\n3. Testing authenticated endpoint...")
-            headers = {"Authorization": f"Bearer {access_token}"}
-            response = await client.get(f"{BASE_URL}/auth/me", headers=headers)
-
+            response = await client.get("/auth/me", headers=headers)
             if response.status_code == 200:
-                user_data = response.json()
-                print(f"✅ User data retrieved: {user_data['email']}")
+                print(f"✅ User data retrieved: {response.json()['email']}")
             else:
                 print(f"❌ Failed to get user data: {response.text}")
         else:
             print(f"⚠️  Login failed (expected if email not verified): {response.text}")
 
-        # Test health check
         print("\n4. Testing health check...")
-        response = await client.get(f"{BASE_URL}/health")
+        response = await client.get("/health")
         if response.status_code == 200:
             print("✅ Health check passed")
         else:
             print(f"❌ Health check failed: {response.text}")
 
-def main():
-    """Run the test"""
-    try:
-        asyncio.run(test_authentication_flow())
-    except Exception as e:
-        print(f"❌ Test failed with error: {e}")
+
+# ================================
+# LOAD TEST (in-process)
+# ================================
+
+def parse_mix(spec: str) -> dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def start_delay(index: int, concurrency: int, profile: str, ramp_seconds: float, steps: int) -> float:
+    """When virtual user ``index`` starts under the chosen ramp profile"""
+    if profile == "constant" or ramp_seconds <= 0:
+        return 0.0
+    if profile == "linear":
+        return ramp_seconds * index / concurrency
+    # step: users join in ``steps`` equal batches
+    return ramp_seconds * math.floor(index * steps / concurrency) / steps
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))]
+
+
+class ClientAddressShim:
+    """Give each request a client IP from a pool so per-IP rate limits behave like real traffic"""
+
+    def __init__(self, app, pool_size: int):
+        self.app = app
+        self.pool_size = max(1, pool_size)
+        self.counter = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.counter += 1
+            n = self.counter % self.pool_size
+            scope["client"] = (f"10.{n >> 16 & 255}.{n >> 8 & 255}.{n & 255}", 40000 + n % 20000)
+        await self.app(scope, receive, send)
+
+
+class LoadState:
+    """Seeded accounts, tokens and per-scenario samples shared by all virtual users"""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.users: list[str] = []
+        self.users_2fa: list[tuple[str, str]] = []  # (email, totp secret)
+        self.access_tokens: list[str] = []
+        self.refresh_tokens: list[str] = []
+        self.used_totp: set[tuple[str, int]] = set()
+        self.registered = 0
+        self.recording = False
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, Counter] = defaultdict(Counter)
+        self.errors: Counter = Counter()
+        self.skipped: Counter = Counter()
+
+    def record(self, scenario: str, elapsed: float, status_code: int, ok: bool) -> None:
+        if not self.recording:
+            return
+        self.samples[scenario].append(elapsed)
+        self.statuses[scenario][status_code] += 1
+        if not ok:
+            self.errors[scenario] += 1
+
+    def remember_token(self, token: str) -> None:
+        if len(self.access_tokens) >= TOKEN_POOL_SIZE:
+            self.access_tokens[random.randrange(TOKEN_POOL_SIZE)] = token
+        else:
+            self.access_tokens.append(token)
+
+    def next_totp(self) -> tuple[str, str] | None:
+        """A (user, code) whose timestep has not been spent yet - the server rejects replays"""
+        import pyotp
+
+        now = time.time()
+        current = int(now // 30)
+        for email, secret in random.sample(self.users_2fa, len(self.users_2fa)):
+            # Current step first; the previous one may fall out of the window mid-request
+            for counter in (current, current + 1, current - 1):
+                if (email, counter) not in self.used_totp:
+                    self.used_totp.add((email, counter))
+                    return email, pyotp.TOTP(secret).at(counter * 30)
+        return None
+
+
+async def seed(state: LoadState, users: int, users_2fa: int) -> None:
+    """Create verified accounts directly in the database; one Argon2 hash shared by all"""
+    from database import Base, RefreshToken, User, get_engine, get_sessionmaker
+    from auth_utils import JWTManager, SecurityUtils, TwoFactorAuth
+
+    async with get_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    hashed = SecurityUtils.hash_password(PASSWORD)
+    expires = datetime.now(timezone.utc) + timedelta(days=1)
+    async with get_sessionmaker()() as db:
+        for i in range(users + users_2fa):
+            with_2fa = i >= users
+            email = f"load-{state.run_id}-{i}@example.com"
+            secret = TwoFactorAuth.generate_secret() if with_2fa else None
+            user = User(
+                email=email, username=f"load_{state.run_id}_{i}", hashed_password=hashed,
+                is_active=True, is_verified=True, is_2fa_enabled=with_2fa, totp_secret=secret
+            )
+            db.add(user)
+            await db.flush()
+            token_data = {"sub": str(user.id), "email": email}
+            if with_2fa:
+                state.users_2fa.append((email, secret))
+                continue
+            state.users.append(email)
+            state.access_tokens.append(JWTManager.create_access_token(token_data))
+            refresh_token = JWTManager.create_refresh_token(token_data)
+            db.add(RefreshToken(user_id=user.id, token=refresh_token, expires_at=expires))
+            state.refresh_tokens.append(refresh_token)
+        await db.commit()
+
+
+async def scenario_register(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    state.registered += 1
+    n = f"{state.run_id}_{state.registered}_{secrets.token_hex(2)}"
+    return await client.post("/auth/register", json={
+        "email": f"reg-{n}@example.com".replace("_", "-"),
+        "username": f"reg_{n}",
+        "password": PASSWORD,
+        "first_name": "Load",
+        "last_name": "Test"
+    })
+
+
+async def scenario_login(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    response = await client.post("/auth/login", json={"email": random.choice(state.users), "password": PASSWORD})
+    if response.status_code == 200 and response.json().get("access_token"):
+        state.remember_token(response.json()["access_token"])
+    return response
+
+
+async def scenario_login_2fa(client: httpx.AsyncClient, state: LoadState) -> httpx.Response | None:
+    picked = state.next_totp()
+    if picked is None:
+        return None
+    email, code = picked
+    return await client.post("/auth/login", json={"email": email, "password": PASSWORD, "totp_code": code})
+
+
+async def scenario_me(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    token = random.choice(state.access_tokens)
+    return await client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+
+
+async def scenario_refresh(client: httpx.AsyncClient, state: LoadState) -> httpx.Response | None:
+    if not state.refresh_tokens:
+        return None
+    # Refresh tokens rotate on use: take one out of the pool so no other virtual user spends it
+    tokens = state.refresh_tokens
+    index = random.randrange(len(tokens))
+    tokens[index], tokens[-1] = tokens[-1], tokens[index]
+    token = tokens.pop()
+    response = await client.post("/auth/refresh", json={"refresh_token": token})
+    if response.status_code == 200:
+        tokens.append(response.json()["refresh_token"])
+    return response
+
+
+async def scenario_health(client: httpx.AsyncClient, state: LoadState) -> httpx.Response:
+    return await client.get("/health")
+
+
+SCENARIOS = {
+    "register": scenario_register,
+    "login": scenario_login,
+    "login_2fa": scenario_login_2fa,
+    "me": scenario_me,
+    "refresh": scenario_refresh,
+    "health": scenario_health,
+}
+
+
+def is_success(scenario: str, response: httpx.Response) -> bool:
+    if response.status_code != 200:
+        return False
+    if scenario.startswith("login"):
+        return bool(response.json().get("success"))
+    return True
+
+
+async def virtual_user(client: httpx.AsyncClient, state: LoadState, mix: dict[str, float],
+                       delay: float, deadline: float, think: float) -> None:
+    await asyncio.sleep(delay)
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        scenario = random.choices(names, weights)[0]
+        start = time.perf_counter()
+        response = await SCENARIOS[scenario](client, state)
+        elapsed = time.perf_counter() - start
+        if response is None:
+            state.skipped[scenario] += 1
+            await asyncio.sleep(0.05)
+            continue
+        state.record(scenario, elapsed, response.status_code, is_success(scenario, response))
+        if think:
+            await asyncio.sleep(random.expovariate(1 / think))
+
+
+def build_report(state: LoadState, args, measured: float) -> dict:
+    scenarios = {}
+    for name in sorted(state.samples):
+        latencies = sorted(state.samples[name])
+        count = len(latencies)
+        scenarios[name] = {
+            "requests": count,
+            "throughput_rps": round(count / measured, 2),
+            "error_rate": round(state.errors[name] / count, 4),
+            "status_codes": {str(code): n for code, n in sorted(state.statuses[name].items())},
+            "skipped": state.skipped[name],
+            "latency_ms": {
+                label: round(percentile(latencies, q) * 1000, 2)
+                for label, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("p999", 0.999))
+            } | {"max": round(latencies[-1] * 1000, 2)}
+        }
+    total = sum(len(values) for values in state.samples.values())
+    return {
+        "config": {
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "ramp": args.ramp,
+            "ramp_seconds": args.ramp_seconds,
+            "mix": parse_mix(args.mix),
+            "client_ips": args.client_ips,
+            "database": args.database_dialect,
+            "redis": args.redis_backend,
+        },
+        "total": {
+            "requests": total,
+            "throughput_rps": round(total / measured, 2),
+            "error_rate": round(sum(state.errors.values()) / total, 4) if total else 0.0,
+        },
+        "scenarios": scenarios,
+    }
+
+
+async def run_load(args) -> dict:
+    if args.hermetic:
+        # Must be in the environment before settings are loaded
+        workdir = tempfile.mkdtemp(prefix="echowerk-load-")
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir}/loadtest.db"
+        os.environ["REDIS_URL"] = os.environ.get("LOAD_REDIS_URL", "memory://")
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(BACKEND_DIR)
+    import main
+    from email_service import email_service
+
+    async def smtp_stand_in(*_args, **_kwargs) -> bool:
+        await asyncio.sleep(args.smtp_latency_ms / 1000)
+        return True
+
+    # Nothing leaves the process: verification emails just cost the configured latency
+    email_service.send_email = smtp_stand_in
+
+    state = LoadState(secrets.token_hex(3))
+    mix = parse_mix(args.mix)
+    transport = httpx.ASGITransport(app=ClientAddressShim(main.app, args.client_ips))
+
+    from database import get_engine, settings
+    args.database_dialect = get_engine().dialect.name
+    args.redis_backend = settings.redis_url.split("://", 1)[0]
+
+    async with main.app.router.lifespan_context(main.app):
+        await seed(state, args.users, args.users_2fa)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            begin = time.monotonic()
+            deadline = begin + args.warmup + args.duration
+            tasks = [
+                asyncio.create_task(virtual_user(
+                    client, state, mix,
+                    start_delay(i, args.concurrency, args.ramp, args.ramp_seconds, args.steps),
+                    deadline, args.think_ms / 1000
+                ))
+                for i in range(args.concurrency)
+            ]
+            await asyncio.sleep(args.warmup)
+            state.recording = True
+            measure_start = time.monotonic()
+            await asyncio.gather(*tasks)
+            measured = time.monotonic() - measure_start
+
+    return build_report(state, args, measured)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--smoke", action="store_true", help="run the sequential smoke test against --base-url")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--hermetic", action="store_true", help="temporary SQLite database and memory:// Redis")
+    parser.add_argument("--concurrency", type=int, default=20, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds run before recording starts")
+    parser.add_argument("--ramp", choices=("constant", "linear", "step"), default="constant")
+    parser.add_argument("--ramp-seconds", type=float, default=0.0)
+    parser.add_argument("--steps", type=int, default=4, help="batches for --ramp step")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario=weight,...")
+    parser.add_argument("--users", type=int, default=50, help="seeded accounts without 2FA")
+    parser.add_argument("--users-2fa", type=int, default=20, help="seeded accounts with 2FA")
+    parser.add_argument("--client-ips", type=int, default=65536, help="distinct client IPs (1 = one rate-limit bucket)")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean think time between requests")
+    parser.add_argument("--smtp-latency-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, help="random seed for a repeatable scenario sequence")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.smoke:
+        asyncio.run(smoke(args.base_url))
+        return
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    output = os.path.abspath(args.output) if args.output else None
+    report = asyncio.run(run_load(args))
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w") as fh:
+            json.dump(report, fh, indent=2)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()